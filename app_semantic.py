@@ -1,7 +1,10 @@
 import streamlit as st
-import networkx as nx
 import pandas as pd
-from lineage_builder import build_lineage
+from config import RENDER_MAX_NODES, RENDER_NODE_LIMIT, SEMANTIC_LEVEL_MODE
+from lineage_cache import get_semantic_lineage, invalidate_semantic_lineage
+from reachability import get_reachability_index
+from layout_cache import get_layout_cache, render_svg
+from render_budget import budget_graph
 from graphviz import Digraph
 
 
@@ -14,20 +17,25 @@ def run():
     st.markdown("## 📊 Semantic Model – Full Impact Lineage Explorer")
 
     # --------------------------------------------------
-    # BUILD LINEAGE (CACHED)
+    # BUILD LINEAGE (SHARED BY ALL SESSIONS)
     # --------------------------------------------------
 
-    @st.cache_data(show_spinner=True)
-    def load_lineage():
-        return build_lineage()
+    # One read-only model per process (mapped from another worker's build
+    # when LINEAGE_SHARED_DIR is set): a new session neither copies nor
+    # unpickles it
+    if st.button("🔄 Reload Model"):
+        invalidate_semantic_lineage()
 
-    df_lineage, G = load_lineage()
+    with st.spinner("Loading semantic lineage..."):
+        lineage = get_semantic_lineage()
+
+    G, lineage_version = lineage.graph, lineage.version
 
     if G.number_of_nodes() == 0:
         st.warning("No lineage data found.")
         return
 
-    all_nodes = sorted(G.nodes)
+    all_nodes = lineage.nodes
 
     selected_node = st.selectbox(
         "🎯 Select Column / Measure / Table",
@@ -38,47 +46,35 @@ def run():
     # FULL IMPACT SUBGRAPH
     # --------------------------------------------------
 
-    upstream = nx.ancestors(G, selected_node)
-    downstream = nx.descendants(G, selected_node)
+    # Closures are read from the reachability index labels, built once per
+    # lineage version, so switching nodes or views never runs a BFS
+    reachability = get_reachability_index(G, lineage_version)
+
+    upstream = reachability.upstream(selected_node)
+    downstream = reachability.downstream(selected_node)
 
-    impact_nodes = set(upstream) | set(downstream) | {selected_node}
+    impact_nodes = upstream | downstream | {selected_node}
     subgraph = G.subgraph(impact_nodes)
 
     # --------------------------------------------------
     # LEVEL COMPUTATION (For Table View)
     # --------------------------------------------------
 
-    def build_flow_table(graph, selected):
-
-        flow_rows = []
-
-        upstream_levels = {}
-        queue = [(selected, 0)]
-        visited = set()
-
-        while queue:
-            node, level = queue.pop(0)
-            if node in visited:
-                continue
-            visited.add(node)
-            upstream_levels[node] = level
-
-            for predecessor in graph.predecessors(node):
-                queue.append((predecessor, level - 1))
+    level_mode = st.radio(
+        "Level By",
+        ["shortest", "longest"],
+        index=0 if SEMANTIC_LEVEL_MODE == "shortest" else 1,
+        horizontal=True
+    )
 
-        downstream_levels = {}
-        queue = [(selected, 0)]
-        visited = set()
+    def build_flow_table(graph, selected, mode):
 
-        while queue:
-            node, level = queue.pop(0)
-            if node in visited:
-                continue
-            visited.add(node)
-            downstream_levels[node] = level
+        # Levels come from one single-visit traversal per direction and are
+        # memoized on the index, so view switches reuse them
+        upstream_levels = reachability.levels(selected, "upstream", mode)
+        downstream_levels = reachability.levels(selected, "downstream", mode)
 
-            for successor in graph.successors(node):
-                queue.append((successor, level + 1))
+        flow_rows = []
 
         for source, target, data in graph.edges(data=True):
 
@@ -97,12 +93,12 @@ def run():
                 "Transformation": data.get("transformation", "")
             })
 
-        df_flow = pd.DataFrame(flow_rows)
-        df_flow = df_flow.sort_values(["Level", "Source"])
+        df_flow = pd.DataFrame(flow_rows, columns=["Level", "Source", "Target", "DependencyType", "Transformation"])
+        df_flow = df_flow.sort_values(["Level", "Source", "Target"], kind="stable")
 
         return df_flow
 
-    df_flow = build_flow_table(subgraph, selected_node)
+    df_flow = build_flow_table(subgraph, selected_node, level_mode)
 
     # --------------------------------------------------
     # KPI SUMMARY
@@ -153,6 +149,42 @@ def run():
 
         st.markdown("### 🌳 Enterprise Lineage Tree (Interactive)")
 
+        # Hub nodes can reach thousands of dependents; only the part around
+        # the selected node that fits the budget goes to Graphviz, the rest
+        # is collapsed per table and expanded one hop at a time
+        budget_col, expand_col, reset_col = st.columns([3, 1, 1])
+
+        max_nodes = budget_col.slider(
+            "Node Budget",
+            min_value=20,
+            max_value=RENDER_NODE_LIMIT,
+            value=RENDER_MAX_NODES,
+            step=10
+        )
+
+        radius_state = st.session_state.get("semantic_radius")
+        radius = radius_state[1] if radius_state and radius_state[0] == selected_node else None
+
+        if expand_col.button("➕ Expand One Hop"):
+            current = radius if radius is not None else budget_graph(
+                subgraph, selected_node, max_nodes=max_nodes
+            ).radius
+            radius = current + 1
+
+        if reset_col.button("🔄 Reset View"):
+            radius = None
+
+        st.session_state["semantic_radius"] = (selected_node, radius)
+
+        view = budget_graph(subgraph, selected_node, radius=radius, max_nodes=max_nodes)
+
+        if view.hidden_nodes or view.hidden_edges:
+            st.caption(
+                f"Showing {view.radius} of {view.reachable_radius} hops: "
+                f"{view.hidden_nodes} nodes collapsed into groups, "
+                f"{view.hidden_edges} edges beyond the budget hidden."
+            )
+
         dot = Digraph(format="svg")
         dot.attr(rankdir="LR")
         dot.attr(bgcolor="white")
@@ -179,75 +211,94 @@ def run():
             "Column Reference": "#1976D2",
             "Measure Reference": "#F57C00",
             "RELATED Relationship": "#D32F2F",
+            "USERELATIONSHIP Relationship": "#C2185B",
             "Model Relationship": "#7B1FA2",
             "Source Mapping": "#388E3C"
         }
 
-        for node in subgraph.nodes:
+        for node, info in view.nodes.items():
             if node == selected_node:
-                dot.node(node, label=node, fillcolor="#000000", fontcolor="white")
+                dot.node(node, label=info["label"], fillcolor="#000000", fontcolor="white")
+            elif info["group"]:
+                dot.node(node, label=info["label"], fillcolor="#ECEFF1", fontcolor="#455A64",
+                         style="filled,rounded,dashed")
             else:
-                dot.node(node, label=node, fillcolor="#E3F2FD", fontcolor="black")
+                dot.node(node, label=info["label"], fillcolor="#E3F2FD", fontcolor="black")
 
-        for source, target, data in subgraph.edges(data=True):
+        for (source, target), info in view.edges.items():
 
-            dep_type = data.get("dependency", "")
-            transformation = data.get("transformation", "")
+            dep_type = info["dependencies"].most_common(1)[0][0]
             edge_color = color_map.get(dep_type, "#90A4AE")
 
-            label_text = dep_type
-            if transformation:
-                label_text += "\\n" + transformation[:60]
-
-            dot.edge(source, target, label=label_text, color=edge_color)
-
-        svg = dot.pipe().decode("utf-8")
-
-        interactive_html = f"""
-        <div style="margin-bottom:10px;">
-            <button onclick="zoomIn()">➕ Zoom</button>
-            <button onclick="zoomOut()">➖ Zoom</button>
-            <button onclick="resetZoom()">🔄 Reset</button>
-        </div>
-
-        <div id="wrapper" style="
-            width:100%;
-            height:800px;
-            overflow:auto;
-            background:white;
-            border:1px solid #ddd;
-            border-radius:12px;
-        ">
-            <div id="zoom-container">
-                {svg}
+            if info["count"] > 1:
+                label_text = "\\n".join(
+                    f"{dependency} ×{count}" for dependency, count in info["dependencies"].most_common()
+                )
+            else:
+                label_text = dep_type
+                if info["transformation"]:
+                    label_text += "\\n" + info["transformation"][:60]
+
+            dot.edge(source, target, label=label_text, color=edge_color,
+                     penwidth=str(min(1 + info["count"] ** 0.5, 6)))
+
+        svg = render_svg(dot)
+
+        if svg is None:
+            # No Graphviz binary on this host: the browser lays it out
+            st.graphviz_chart(dot)
+        else:
+            layout_stats = get_layout_cache().stats()
+            st.caption(
+                f"Layout cache: {layout_stats['memory_hits']} memory hits, "
+                f"{layout_stats['disk_hits']} disk hits, {layout_stats['misses']} misses"
+            )
+
+            interactive_html = f"""
+            <div style="margin-bottom:10px;">
+                <button onclick="zoomIn()">➕ Zoom</button>
+                <button onclick="zoomOut()">➖ Zoom</button>
+                <button onclick="resetZoom()">🔄 Reset</button>
             </div>
-        </div>
-
-        <script>
-        (function() {{
-            let scale = 1;
-            const container = document.getElementById("zoom-container");
-
-            window.zoomIn = function() {{
-                scale += 0.1;
-                container.style.transform = "scale(" + scale + ")";
-            }}
-
-            window.zoomOut = function() {{
-                scale -= 0.1;
-                if (scale < 0.3) scale = 0.3;
-                container.style.transform = "scale(" + scale + ")";
-            }}
-
-            window.resetZoom = function() {{
-                scale = 1;
-                container.style.transform = "scale(1)";
-            }}
-        }})();
-        </script>
-        """
-
-        st.components.v1.html(interactive_html, height=900)
+
+            <div id="wrapper" style="
+                width:100%;
+                height:800px;
+                overflow:auto;
+                background:white;
+                border:1px solid #ddd;
+                border-radius:12px;
+            ">
+                <div id="zoom-container">
+                    {svg}
+                </div>
+            </div>
+
+            <script>
+            (function() {{
+                let scale = 1;
+                const container = document.getElementById("zoom-container");
+
+                window.zoomIn = function() {{
+                    scale += 0.1;
+                    container.style.transform = "scale(" + scale + ")";
+                }}
+
+                window.zoomOut = function() {{
+                    scale -= 0.1;
+                    if (scale < 0.3) scale = 0.3;
+                    container.style.transform = "scale(" + scale + ")";
+                }}
+
+                window.resetZoom = function() {{
+                    scale = 1;
+                    container.style.transform = "scale(1)";
+                }}
+            }})();
+            </script>
+            """
+
+            st.components.v1.html(interactive_html, height=900)
 
     # --------------------------------------------------
     # MODULE FOOTER
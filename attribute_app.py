@@ -1,9 +1,13 @@
 import streamlit as st
 import pandas as pd
+import networkx as nx
 from graphviz import Digraph
 
-from db_connection import get_connection
+from config import RENDER_MAX_NODES, RENDER_NODE_LIMIT, SNAPSHOT_MAX_AGE_SECONDS
+from db_connection import get_pool
 from lineage_service import get_full_column_lineage
+from layout_cache import get_layout_cache, render_svg
+from render_budget import budget_graph
 
 
 # -------------------------------------------------
@@ -19,11 +23,11 @@ st.markdown("Trace column transformations across procedures, tables, and views."
 
 
 # -------------------------------------------------
-# CACHE DATABASE CONNECTION
+# POOLED DATABASE CONNECTION
 # -------------------------------------------------
-@st.cache_resource
-def get_cached_connection():
-    return get_connection()
+@st.cache_data(show_spinner=False, ttl=SNAPSHOT_MAX_AGE_SECONDS)
+def load_column_lineage(schema, table, column):
+    return get_pool().run(get_full_column_lineage, schema, table, column)
 
 
 # -------------------------------------------------
@@ -45,6 +49,8 @@ with st.form("lineage_form"):
 # -------------------------------------------------
 # PROCESS
 # -------------------------------------------------
+# The query is kept across reruns so the diagram controls below do not
+# discard the result
 if submitted:
 
     table_input = table_input.strip().upper()
@@ -58,15 +64,17 @@ if submitted:
         st.error("Please use format: SCHEMA.TABLE")
         st.stop()
 
-    schema, table = table_input.split(".", 1)
+    st.session_state["lineage_query"] = (*table_input.split(".", 1), column_input)
+    st.session_state["lineage_radius"] = None
+
+if "lineage_query" in st.session_state:
+
+    schema, table, column_input = st.session_state["lineage_query"]
 
     try:
         with st.spinner("Generating lineage..."):
 
-            conn = get_cached_connection()
-
-            result_df = get_full_column_lineage(
-                conn,
+            result_df = load_column_lineage(
                 schema,
                 table,
                 column_input
@@ -79,9 +87,8 @@ if submitted:
         st.success("Lineage found ✅")
 
         # -------------------------------------------------
-        # CLEAN & SERIAL NUMBER
+        # SERIAL NUMBER
         # -------------------------------------------------
-        result_df = result_df.drop_duplicates()
         result_df.insert(0, "S.No", range(1, len(result_df) + 1))
 
         # -------------------------------------------------
@@ -108,118 +115,107 @@ if submitted:
         # -------------------------------------------------
         st.subheader("📊 End-to-End Lineage Flow")
 
-        dot = Digraph(engine="dot")
-        dot.attr(rankdir="LR")
-        dot.attr(nodesep="0.8")
-        dot.attr(ranksep="1")
-
         source_node = f"{schema}.{table}"
 
-        # Source Node
-        dot.node(
-            source_node,
-            f"{source_node}\n({column_input})",
-            shape="box",
-            style="filled",
-            fillcolor="#4CAF50"
+        object_types = {source_node: "SOURCE"}
+        flow = nx.DiGraph()
+        flow.add_node(source_node)
+
+        # Each row links the object it was found in to the object it
+        # flows into, hop by hop from the source column
+        type_labels = {
+            "SQL_STORED_PROCEDURE": "PROCEDURE",
+            "TABLE": "TABLE",
+            "VIEW": "VIEW",
+        }
+
+        for parent, child, object_type in zip(
+            result_df["Parent_Object"], result_df["Object_Name"], result_df["Object_Type"]
+        ):
+            object_types.setdefault(child, type_labels.get(object_type, object_type))
+            object_types.setdefault(parent, "TABLE")
+            flow.add_edge(parent, child)
+
+        # -----------------------------
+        # RENDER BUDGET
+        # -----------------------------
+        # Hub columns fan out to hundreds of objects; beyond the budget
+        # objects are collapsed per type and expanded one hop at a time
+        budget_col, expand_col, reset_col = st.columns([3, 1, 1])
+
+        max_nodes = budget_col.slider(
+            "Node Budget",
+            min_value=20,
+            max_value=RENDER_NODE_LIMIT,
+            value=RENDER_MAX_NODES,
+            step=10
         )
 
-        added_nodes = set([source_node])
-        added_edges = set()
+        radius = st.session_state.get("lineage_radius")
 
-        procedures = result_df[
-            result_df["Object_Type"] == "SQL_STORED_PROCEDURE"
-        ]["Object_Name"].unique()
+        if expand_col.button("➕ Expand One Hop"):
+            current = radius if radius is not None else budget_graph(
+                flow, source_node, group_of=object_types.get, max_nodes=max_nodes
+            ).radius
+            radius = current + 1
 
-        tables = result_df[
-            result_df["Object_Type"] == "TABLE"
-        ]["Object_Name"].unique()
+        if reset_col.button("🔄 Reset View"):
+            radius = None
 
-        views = result_df[
-            result_df["Object_Type"] == "VIEW"
-        ]["Object_Name"].unique()
+        st.session_state["lineage_radius"] = radius
 
-        # -----------------------------
-        # ADD PROCEDURES
-        # -----------------------------
-        for proc in procedures:
-
-            if proc not in added_nodes:
-                dot.node(
-                    proc,
-                    f"{proc}\n[PROCEDURE]",
-                    shape="box",
-                    style="filled",
-                    fillcolor="#E67E22"
-                )
-                added_nodes.add(proc)
-
-            edge = (source_node, proc)
-            if edge not in added_edges:
-                dot.edge(source_node, proc)
-                added_edges.add(edge)
+        view = budget_graph(
+            flow, source_node, radius=radius, group_of=object_types.get, max_nodes=max_nodes
+        )
 
-        # -----------------------------
-        # ADD TABLES
-        # -----------------------------
-        for tbl in tables:
-
-            if tbl not in added_nodes:
-                dot.node(
-                    tbl,
-                    f"{tbl}\n[TABLE]",
-                    shape="box",
-                    style="filled",
-                    fillcolor="#17A589"
-                )
-                added_nodes.add(tbl)
-
-            connected = False
-
-            for proc in procedures:
-                edge = (proc, tbl)
-                if edge not in added_edges:
-                    dot.edge(proc, tbl)
-                    added_edges.add(edge)
-                    connected = True
-
-            if not connected:
-                edge = (source_node, tbl)
-                if edge not in added_edges:
-                    dot.edge(source_node, tbl)
-                    added_edges.add(edge)
+        if view.hidden_nodes or view.hidden_edges:
+            st.caption(
+                f"Showing {view.radius} of {view.reachable_radius} hops: "
+                f"{view.hidden_nodes} objects collapsed by type, "
+                f"{view.hidden_edges} edges beyond the budget hidden."
+            )
 
-        # -----------------------------
-        # ADD VIEWS
-        # -----------------------------
-        for vw in views:
-
-            if vw not in added_nodes:
-                dot.node(
-                    vw,
-                    f"{vw}\n[VIEW]",
-                    shape="box",
-                    style="filled",
-                    fillcolor="#2E86C1"
-                )
-                added_nodes.add(vw)
-
-            connected = False
-
-            for tbl in tables:
-                edge = (tbl, vw)
-                if edge not in added_edges:
-                    dot.edge(tbl, vw)
-                    added_edges.add(edge)
-                    connected = True
-
-            if not connected:
-                edge = (source_node, vw)
-                if edge not in added_edges:
-                    dot.edge(source_node, vw)
-                    added_edges.add(edge)
-
-        st.graphviz_chart(dot)
+        type_colors = {
+            "PROCEDURE": "#E67E22",
+            "TABLE": "#17A589",
+            "VIEW": "#2E86C1",
+        }
+
+        dot = Digraph(engine="dot")
+        dot.attr(rankdir="LR")
+        dot.attr(nodesep="0.8")
+        dot.attr(ranksep="1")
+
+        for node, info in view.nodes.items():
+
+            if node == source_node:
+                # Source Node
+                dot.node(node, f"{node}\n({column_input})", shape="box", style="filled", fillcolor="#4CAF50")
+            elif info["group"]:
+                dot.node(node, info["label"], shape="box", style="filled,dashed", fillcolor="#ECEFF1")
+            else:
+                object_type = object_types[node]
+                dot.node(node, f"{node}\n[{object_type}]", shape="box", style="filled",
+                         fillcolor=type_colors.get(object_type, "#BDC3C7"))
+
+        for (source, target), info in view.edges.items():
+            if info["count"] > 1:
+                dot.edge(source, target, label=f"×{info['count']}")
+            else:
+                dot.edge(source, target)
+
+        svg = render_svg(dot)
+
+        if svg is None:
+            # No Graphviz binary on this host: the browser lays it out
+            st.graphviz_chart(dot)
+        else:
+            layout_stats = get_layout_cache().stats()
+            st.caption(
+                f"Layout cache: {layout_stats['memory_hits']} memory hits, "
+                f"{layout_stats['disk_hits']} disk hits, {layout_stats['misses']} misses"
+            )
+            st.image(svg[svg.find("<svg"):])
 
         st.markdown("---")
 
@@ -0,0 +1,128 @@
+"""
+DAX reference extraction on a synthetic model: the previous backtracking
+regex against the linear lexer, cold and memoized.
+
+    python benchmarks/dax_lexer_benchmark.py --measures 10000 --complexity 3
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dax_lexer  # noqa: E402
+from synthetic_model import synthetic_model  # noqa: E402
+
+
+REGEX_PATTERN = r'([\w\s]*)\[(.*?)\]'
+
+
+def regex_references(expression):
+    """
+    The previous extract_dependencies(): (table, name) per match.
+    """
+
+    return [(table.strip(), name.strip()) for table, name in re.findall(REGEX_PATTERN, expression or "")]
+
+
+def fixture_references(expression):
+    """
+    (table, name) of every 'Table'[Column] and [Measure] in a synthetic
+    expression, which has no strings or comments: the expected answer.
+    """
+
+    return [(table, name) for table, name in re.findall(r"(?:'([^']*)')?\[([^\]]*)\]", expression)]
+
+
+def documented(expression, rng_index):
+    """
+    Measures as they look in real models: VAR blocks, comments and long
+    descriptive strings around the references.
+    """
+
+    return (
+        f"// Measure {rng_index}: reviewed by finance, see [Definitions] page\n"
+        f"VAR Result = {expression}\n"
+        f"VAR Label = \"Net amount for the selected period and region [{rng_index}]\"\n"
+        f"RETURN IF ( ISBLANK ( Result ), BLANK (), Result ) /* was [Old Measure] */"
+    )
+
+
+def _timed(func, expressions, repeat=3):
+    # Best of `repeat` runs, so a scheduler hiccup does not decide the race
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        results = [func(expression) for expression in expressions]
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return results, best
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--measures", type=int, default=10000)
+    parser.add_argument("--complexity", type=int, default=3)
+    args = parser.parse_args()
+
+    measures_per_table = 20
+    frames = synthetic_model(
+        tables=max(1, args.measures // measures_per_table),
+        measures_per_table=measures_per_table,
+        calculated_per_table=0,
+        complexity=args.complexity,
+    )
+    plain = frames["measures"]["Expression"].tolist()
+
+    # The documented variants wrap the same references in comments and
+    # strings holding decoys: both must yield the plain expression's ones
+    expected = [fixture_references(expression) for expression in plain]
+
+    print(f"{'expressions':<12} {'count':>6} {'regex s':>8} {'lexer s':>8} {'memoized s':>11} "
+          f"{'refs':>7} {'regex right':>12} {'lexer right':>12} {'quoted tables misread':>22}")
+
+    for label, expressions in (
+        ("plain", plain),
+        ("documented", [documented(e, n) for n, e in enumerate(plain)]),
+    ):
+        regex_refs, regex_seconds = _timed(regex_references, expressions)
+        lexer_refs, lexer_seconds = _timed(dax_lexer.scan_references, expressions)
+
+        # Second pass hits the per-expression memo, as on every rebuild
+        dax_lexer.clear_cache()
+        _timed(dax_lexer.dax_references, expressions)
+        _, memo_seconds = _timed(dax_lexer.dax_references, expressions)
+
+        # Expressions whose references come out exactly as written
+        regex_right = sum(refs == want for refs, want in zip(regex_refs, expected))
+        lexer_right = sum(
+            [(ref.table, ref.name) for ref in refs] == want for refs, want in zip(lexer_refs, expected)
+        )
+
+        misread = sum(
+            1
+            for expression, refs in zip(expressions, regex_refs)
+            for table, name in refs
+            if not table and f"'[{name}]" in expression
+        )
+
+        print(f"{label:<12} {len(expressions):>6} {regex_seconds:>8.3f} {lexer_seconds:>8.3f} {memo_seconds:>11.4f} "
+              f"{sum(map(len, expected)):>7} {regex_right:>12} {lexer_right:>12} {misread:>22}")
+
+    # Long expressions: when a run of words is not followed by '[' the regex
+    # retries [\w\s]* from every position in the run, so its cost grows with
+    # the square of the run length
+    print(f"\n{'words':>8} {'regex s':>8} {'lexer s':>8}")
+    for words in (500, 1000, 2000):
+        expression = "VAR x = " + " ".join(f"w{n}" for n in range(words)) + " + 1 RETURN x + [Total]"
+        _, regex_seconds = _timed(regex_references, [expression])
+        _, lexer_seconds = _timed(dax_lexer.scan_references, [expression])
+        print(f"{words:>8} {regex_seconds:>8.3f} {lexer_seconds:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Columnar semantic lineage build against the original row-by-row build
+(DAX references read by its regex), on a synthetic TMSCHEMA model. The
+columnar output must be identical to a row-by-row build reading the same
+references through the lexer. Edges where it differs from the regex build
+are counted (a misread reference changes one edge on each side), and each
+reference the regex reads differently is attributed to a cause.
+
+    python benchmarks/lineage_builder_benchmark.py --tables 50 200 --measures 20
+"""
+
+import argparse
+import collections
+import os
+import re
+import sys
+import time
+
+import networkx as nx
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dax_lexer import reference_dependency, scan_references  # noqa: E402
+from lineage_builder import (  # noqa: E402
+    build_lineage_from_frames,
+    extract_m_sources,
+    get_name_column,
+)
+from synthetic_model import synthetic_model  # noqa: E402
+
+
+# --------------------------------------------------
+# PREVIOUS ROW-BY-ROW BUILD (BASELINE)
+# --------------------------------------------------
+
+def regex_dependencies(expression, calculated):
+    """
+    The original extract_dependencies(): (table, name, dependency type) per
+    match of its regex, column references first.
+    """
+
+    matches = re.findall(r'([\w\s]*)\[(.*?)\]', expression) if expression else []
+    related = calculated and "RELATED" in expression.upper()
+
+    return (
+        [(table.strip(), name.strip(), "RELATED Relationship" if related else "Column Reference")
+         for table, name in matches if table.strip()]
+        + [("", name.strip(), "Measure Reference") for table, name in matches if not table.strip()]
+    )
+
+
+def lexer_dependencies(expression, calculated):
+    """
+    The same through dax_lexer, as build_lineage_from_frames reads them.
+    """
+
+    refs = scan_references(expression)
+
+    return (
+        [(ref.table, ref.name, reference_dependency(ref)) for ref in refs if ref.table]
+        + [("", ref.name, "Measure Reference") for ref in refs if not ref.table]
+    )
+
+
+def rowwise_lineage(frames, dependencies=regex_dependencies):
+
+    df_tables, df_columns = frames["tables"], frames["columns"]
+    df_measures, df_partitions = frames["measures"], frames["partitions"]
+
+    table_lookup = dict(zip(df_tables["ID"], df_tables[get_name_column(df_tables)]))
+
+    for df in (df_columns, df_measures, df_partitions):
+        df["TableName"] = df["TableID"].map(table_lookup)
+
+    df_measures["Expression"] = df_measures["Expression"].fillna("")
+    df_columns["Expression"] = df_columns["Expression"].fillna("")
+
+    measure_name_col = get_name_column(df_measures)
+    column_name_col = get_name_column(df_columns)
+
+    measure_lookup = {}
+    for _, row in df_measures.iterrows():
+        measure_lookup[row[measure_name_col]] = row["TableName"]
+
+    rows = []
+
+    def expression_rows(df, name_col, calculated):
+        for _, row in df.iterrows():
+            expr, current = row["Expression"], row["TableName"]
+            target = f"{current}.{row[name_col]}"
+            for table, name, dependency in dependencies(expr, calculated):
+                source = table or measure_lookup.get(name, current)
+                rows.append({"Source": f"{source}.{name}", "Target": target,
+                             "Transformation": expr, "DependencyType": dependency})
+
+    expression_rows(df_measures, measure_name_col, False)
+    expression_rows(df_columns[df_columns["Expression"] != ""], column_name_col, True)
+
+    for _, row in frames["relationships"].iterrows():
+        rows.append({"Source": table_lookup[row["FromTableID"]], "Target": table_lookup[row["ToTableID"]],
+                     "Transformation": "Model Relationship", "DependencyType": "Model Relationship"})
+
+    for _, row in df_partitions.iterrows():
+        m_expression = row.get("Expression", "") or row.get("QueryDefinition", "")
+        for src in extract_m_sources(m_expression):
+            rows.append({"Source": f"SQL.{src}", "Target": row["TableName"],
+                         "Transformation": "Power Query Source", "DependencyType": "Source Mapping"})
+
+    df_lineage = pd.DataFrame(rows)
+
+    G = nx.DiGraph()
+    for _, row in df_lineage.iterrows():
+        G.add_edge(row["Source"], row["Target"],
+                   transformation=row.get("Transformation", ""), dependency=row.get("DependencyType", ""))
+
+    return df_lineage, G
+
+
+def regex_differences(frames):
+    """
+    Why the regex build differs: every DAX reference the regex reads
+    differently from the lexer, by cause. 'unexplained' must stay 0.
+    """
+
+    causes = collections.Counter()
+
+    expressions = [(expr, False) for expr in frames["measures"]["Expression"].fillna("")]
+    expressions += [(expr, True) for expr in frames["columns"]["Expression"].dropna() if expr]
+
+    for expr, calculated in expressions:
+
+        by_name = collections.defaultdict(list)
+        for table, name, dependency in regex_dependencies(expr, calculated):
+            by_name[name].append((table, dependency))
+
+        for table, name, dependency in lexer_dependencies(expr, calculated):
+
+            if not by_name[name]:
+                causes["missed by the regex"] += 1
+                continue
+
+            regex_table, regex_dependency = by_name[name].pop(0)
+
+            if not regex_table and f"'{table}'" in expr:
+                # 'Table'[Column]: [\w\s]* stops at the quote, so the
+                # column is read as a measure of the expression's own table
+                causes["'Quoted Table' read as a measure"] += 1
+            elif regex_table != table:
+                causes["unexplained"] += 1
+            elif regex_dependency != dependency:
+                # The regex marks every column of a calculated column
+                # mentioning RELATED as a relationship
+                causes["RELATED applied to the whole expression"] += 1
+
+        extra = sum(len(rest) for rest in by_name.values())
+        if extra:
+            # References inside strings and comments
+            causes["read inside a string or comment"] += extra
+
+    causes.setdefault("unexplained", 0)
+
+    return causes
+
+
+# --------------------------------------------------
+# RUN
+# --------------------------------------------------
+
+def _timed(func, frames, *args):
+    copies = {kind: df.copy() for kind, df in frames.items()}
+    started = time.perf_counter()
+    result = func(copies, *args)
+    return result, time.perf_counter() - started
+
+
+def _edges(df):
+    return set(df[["Source", "Target", "DependencyType"]].itertuples(index=False))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tables", type=int, nargs="+", default=[20, 100, 400])
+    parser.add_argument("--columns", type=int, default=20)
+    parser.add_argument("--measures", type=int, default=20)
+    parser.add_argument("--complexity", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'tables':>6} {'measures':>9} {'edges':>8} {'row-by-row s':>13} {'columnar s':>11} {'speedup':>8} "
+          f"{'identical':>9} {'differ from regex':>18}")
+
+    for tables in args.tables:
+
+        frames = synthetic_model(tables, args.columns, args.measures, complexity=args.complexity)
+
+        (regex_df, _), old_seconds = _timed(rowwise_lineage, frames)
+        (new_df, new_graph), new_seconds = _timed(build_lineage_from_frames, frames)
+        (lexer_df, lexer_graph), _ = _timed(rowwise_lineage, frames, lexer_dependencies)
+
+        identical = (
+            lexer_df.equals(new_df)
+            and list(lexer_graph.nodes) == list(new_graph.nodes)
+            and list(lexer_graph.edges(data=True)) == list(new_graph.edges(data=True))
+        )
+
+        # Edges the regex misread: 'Quoted Tables', comments, strings, and
+        # RELATED applied to every reference of a calculated column
+        differing = len(_edges(regex_df) ^ _edges(new_df))
+
+        print(f"{tables:>6} {len(frames['measures']):>9} {len(new_df):>8} {old_seconds:>13.2f} "
+              f"{new_seconds:>11.2f} {old_seconds / new_seconds:>7.1f}x {str(identical):>9} {differing:>18}")
+
+        for cause, count in sorted(regex_differences(frames).items()):
+            print(f"{'':>6} {count:>9} references: {cause}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Reachability index on a synthetic semantic model: build time and label
+size, upstream/downstream queries against a BFS per query, and edge
+updates against a rebuild.
+
+    python benchmarks/reachability_benchmark.py --tables 200 1000 --complexity 3
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lineage_builder import build_lineage_from_frames  # noqa: E402
+from lineage_graph import LineageGraph, ancestors, descendants  # noqa: E402
+from reachability import ReachabilityIndex  # noqa: E402
+from synthetic_model import synthetic_model  # noqa: E402
+
+
+def _timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def _matches(index, G, nodes):
+    """
+    Whether sets and counts equal ancestors() / descendants() on `nodes`.
+    """
+
+    for node in nodes:
+        up, down = ancestors(G, node), descendants(G, node)
+        if index.upstream(node) != up or index.downstream(node) != down:
+            return False
+        if index.upstream_count(node) != len(up) or index.downstream_count(node) != len(down):
+            return False
+
+    return True
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tables", type=int, nargs="+", default=[200, 1000])
+    parser.add_argument("--complexity", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--changed", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'nodes':>7} {'edges':>7} {'build s':>8} {'intervals':>10} {'labels MB':>10} {'bitsets MB':>11} "
+          f"{'bfs ms':>7} {'sets ms':>8} {'counts us':>10} {'update s':>9} {'rebuild s':>10} {'match':>6}")
+
+    for tables in args.tables:
+
+        frames = synthetic_model(tables, 20, 20, complexity=args.complexity)
+        df_lineage, G = build_lineage_from_frames(frames)
+
+        index, build_seconds = _timed(ReachabilityIndex, G)
+
+        intervals = sum(len(flat) // 2 for _, flat in index._packed.values())
+        label_bytes = sum(ptr.nbytes + flat.nbytes for ptr, flat in index._packed.values())
+
+        # One bit per node and component, in both directions
+        bitset_bytes = 2 * len(G) * len(G) / 8
+
+        nodes = random.Random(0).sample(list(G.nodes), min(args.queries, len(G)))
+
+        _, bfs_seconds = _timed(lambda: [(ancestors(G, n), descendants(G, n)) for n in nodes])
+        index.clear()
+        _, set_seconds = _timed(lambda: [(index.upstream(n), index.downstream(n)) for n in nodes])
+        _, count_seconds = _timed(lambda: [(index.upstream_count(n), index.downstream_count(n)) for n in nodes])
+
+        # A new version with the last edges dropped: patched in place, then
+        # indexed from scratch
+        kept = df_lineage.iloc[:-args.changed]
+        changed = LineageGraph.from_edges(
+            kept["Source"], kept["Target"], kept["Transformation"], kept["DependencyType"]
+        )
+        _, update_seconds = _timed(index.sync, changed)
+        _, rebuild_seconds = _timed(ReachabilityIndex, changed)
+
+        match = _matches(index, changed, [n for n in nodes if n in changed][:100])
+        index.sync(G)
+        match = match and _matches(index, G, nodes[:100])
+
+        print(f"{len(G):>7} {G.number_of_edges():>7} {build_seconds:>8.2f} {intervals:>10} "
+              f"{label_bytes / 1e6:>10.1f} {bitset_bytes / 1e6:>11.1f} "
+              f"{bfs_seconds / len(nodes) * 1000:>7.2f} {set_seconds / len(nodes) * 1000:>8.3f} "
+              f"{count_seconds / len(nodes) * 1e6:>10.1f} {update_seconds:>9.2f} {rebuild_seconds:>10.2f} {str(match):>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,154 @@
+import os
+
 SERVER = '***.sql.azuresynapse.net'
-DATABASE = 'xyz'
\ No newline at end of file
+DATABASE = 'xyz'
+
+# --------------------------------------------------
+# CONNECTION POOL
+# --------------------------------------------------
+
+DB_POOL_SIZE = int(os.environ.get("LINEAGE_DB_POOL_SIZE", 4))
+DB_POOL_ACQUIRE_TIMEOUT_SECONDS = 30
+# Connections idle longer than this are pinged before they are reused
+DB_POOL_PING_AFTER_SECONDS = 60
+DB_CONNECT_RETRIES = 3
+DB_RETRY_BACKOFF_SECONDS = 0.5
+DB_QUERY_TIMEOUT_SECONDS = 300
+# Path of an offline SQLite catalog to use instead of the server
+DB_OFFLINE_CATALOG = os.environ.get("LINEAGE_DB_OFFLINE", "")
+
+# --------------------------------------------------
+# LOCAL CACHES
+# --------------------------------------------------
+
+CACHE_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".lineage_cache")
+
+PARSE_CACHE_DIR = os.path.join(CACHE_ROOT, "parse")
+PARSE_CACHE_SIZE = 256
+PARSE_CACHE_DISK_ENTRIES = 5000
+
+# --------------------------------------------------
+# METADATA SNAPSHOT
+# --------------------------------------------------
+
+SNAPSHOT_DIR = os.path.join(CACHE_ROOT, "snapshots")
+SNAPSHOT_MAX_AGE_SECONDS = 900
+SNAPSHOT_FETCH_BATCH = 500
+# Modules read from the snapshot (and parsed) per chunk
+MODULE_READ_CHUNK = 500
+# Hops followed downstream by the column lineage search
+LINEAGE_MAX_DEPTH = int(os.environ.get("LINEAGE_MAX_DEPTH", 6))
+# Resolved (table, column) hops kept in memory across searches
+LINEAGE_HOP_MEMO_SIZE = 2048
+
+# --------------------------------------------------
+# POWER BI SEMANTIC MODEL (XMLA)
+# --------------------------------------------------
+
+ADOMD_DLL_PATH = r"C:\Program Files\Microsoft.NET\ADOMD.NET\160\Microsoft.AnalysisServices.AdomdClient.dll"
+
+PBI_CONNECTION_STRING = """
+Provider=MSOLAP;
+Data Source=powerbi://api.powerbi.com/v1.0/myorg/Lease%20Activity;
+Initial Catalog=Lease Activity;
+"""
+
+# Where TMSCHEMA rowsets are read from: empty for the live model above, a
+# directory of TMSCHEMA_*.parquet / .json snapshots, or a synthetic model
+# such as "synthetic:tables=200,measures_per_table=20,complexity=3"
+PBI_MODEL_SOURCE = os.environ.get("LINEAGE_PBI_SOURCE", "")
+
+# Distinct DAX expressions whose lexed references are kept in memory
+DAX_CACHE_SIZE = 65536
+
+# Above this share of changed rows a TMSCHEMA rowset is re-read in full
+# instead of row by row
+SEMANTIC_SYNC_FULL_FETCH_RATIO = 0.25
+
+# Level of a node in the impact table: "shortest" (fewest hops from the
+# selected node) or "longest" (most hops, so every path reads left to right)
+SEMANTIC_LEVEL_MODE = os.environ.get("LINEAGE_LEVEL_MODE", "shortest")
+
+# Upstream / downstream closures and levels kept per selected node
+REACHABILITY_MEMO_SIZE = 128
+
+# Above this share of changed edges a new graph version rebuilds the
+# reachability index instead of patching it
+REACHABILITY_REBUILD_RATIO = 0.1
+
+# --------------------------------------------------
+# CATALOG FETCH
+# --------------------------------------------------
+
+# Catalog queries run side by side (one per TMSCHEMA rowset, or per batch
+# of changed rows); fetched batches waiting for the parser are capped
+FETCH_WORKERS = 5
+FETCH_QUEUE_BATCHES = 4
+
+# --------------------------------------------------
+# GRAPH RENDERING
+# --------------------------------------------------
+
+# Graphs larger than this are collapsed around the selected node before
+# they reach Graphviz; the node budget can be raised up to the hard limit
+RENDER_MAX_NODES = 150
+RENDER_MAX_EDGES = 400
+RENDER_NODE_LIMIT = 1000
+
+# Laid-out SVGs, keyed by a fingerprint of the rendered graph
+LAYOUT_CACHE_DIR = os.path.join(CACHE_ROOT, "layout")
+LAYOUT_CACHE_SIZE = 64
+LAYOUT_CACHE_DISK_ENTRIES = 2000
+
+# --------------------------------------------------
+# PARALLEL EXTRACTION
+# --------------------------------------------------
+
+EXTRACT_WORKERS = int(os.environ.get("LINEAGE_EXTRACT_WORKERS", os.cpu_count() or 1))
+EXTRACT_CHUNKS_PER_WORKER = 4
+EXTRACT_MODULE_TIMEOUT_SECONDS = 60
+# Below this many modules the pool start-up costs more than it saves
+EXTRACT_PARALLEL_MIN_MODULES = 8
+
+# --------------------------------------------------
+# STATEMENT BUDGETS
+# --------------------------------------------------
+
+STATEMENT_TIMEOUT_SECONDS = 10
+STATEMENT_MAX_CHARS = 200_000
+# Statements slower than this are listed in the diagnostics even when they parse
+STATEMENT_SLOW_SECONDS = 1.0
+
+# Extracted lineage kept in memory per (object, definition hash), and the
+# lineage / diagnostics tables of recent object selections
+LINEAGE_MEMO_SIZE = 20000
+LINEAGE_TABLE_MEMO_SIZE = 32
+
+# --------------------------------------------------
+# HEADLESS BATCH RUNS
+# --------------------------------------------------
+
+# Where lineage_batch.py writes edge files and its run summary
+BATCH_OUTPUT_DIR = os.environ.get("LINEAGE_BATCH_OUTPUT", "lineage_output")
+
+# --------------------------------------------------
+# LINEAGE STORE (PARQUET)
+# --------------------------------------------------
+
+# Edges of every engine, partitioned by engine / snapshot / source schema;
+# needs the optional pyarrow package
+LINEAGE_STORE_DIR = os.environ.get("LINEAGE_STORE_DIR", os.path.join(CACHE_ROOT, "lineage_store"))
+LINEAGE_STORE_ROW_GROUP = 100_000
+# Snapshots kept per engine when the store is pruned
+LINEAGE_STORE_KEEP_SNAPSHOTS = 14
+
+# --------------------------------------------------
+# SHARED LINEAGE CACHE
+# --------------------------------------------------
+
+# Loaded lineage models are shared read-only by every session of a
+# process and reloaded after this many seconds or on explicit invalidation
+LINEAGE_CACHE_TTL_SECONDS = int(os.environ.get("LINEAGE_CACHE_TTL", SNAPSHOT_MAX_AGE_SECONDS))
+# When set, a built semantic graph is published here as memory-mapped
+# arrays, so other worker processes map it instead of rebuilding it
+LINEAGE_SHARED_DIR = os.environ.get("LINEAGE_SHARED_DIR", "")
@@ -0,0 +1,226 @@
+import collections
+import functools
+import re
+
+from config import DAX_CACHE_SIZE
+
+
+# --------------------------------------------------
+# TOKENS
+# --------------------------------------------------
+
+_NAME = r"[^\W\d]\w*(?:\.\w+)*"
+_QUOTED = r"'(?:[^']|'')*(?:'|\Z)"
+_BRACKET = r"\[(?:[^\]]|\]\])*(?:\]|\Z)"
+
+# Comments and strings are consumed whole so nothing inside them is read
+_SKIPPED = r'(?://|--)[^\n]*|/\*.*?(?:\*/|\Z)|"(?:[^"]|"")*(?:"|\Z)'
+
+
+def _gap(stops, lookahead):
+    """
+    Text up to the next token, skipping everything that cannot start one
+    (`stops` are extra token characters); the group is the run of name
+    characters right before a token in `lookahead`, if any.
+    """
+
+    return (
+        rf"(?:[^'\"\[/\-\w.{stops}]++|[\w.]++(?!\s*+[{lookahead}])|-(?!-)|/(?![/*]))*+"
+        r"(?:([\w.]++)\s*+)?"
+    )
+
+
+# Each match is one token (a comment or string, a 'Quoted Table', a
+# [bracket], and in NESTED_PATTERN a parenthesis) plus the gap after it, so
+# the regex engine walks the text between tokens itself and Python only
+# sees the tokens; a quoted table is captured only when a [bracket] follows.
+# Every repetition is possessive and unterminated strings, names and
+# comments run to the end of the text: one left-to-right pass handles any
+# expression in linear time.
+_TOKEN = rf"{_SKIPPED}|({_QUOTED})(?=\s*+\[)|{_QUOTED}|({_BRACKET})"
+
+_FLAT_GAP = _gap("", r"\[")
+FLAT_GAP = re.compile(_FLAT_GAP, re.S)
+FLAT_PATTERN = re.compile(rf"(?:{_TOKEN}){_FLAT_GAP}", re.S)
+
+# Parentheses only matter around context functions
+_NESTED_GAP = _gap("()", r"\[(")
+NESTED_GAP = re.compile(_NESTED_GAP, re.S)
+NESTED_PATTERN = re.compile(rf"(?:{_TOKEN}|([()])){_NESTED_GAP}", re.S)
+
+# Name at the end of a run like "1.5x" or "a..b", as a left-to-right
+# tokenizer would split it
+_TRAILING_NAME = re.compile(rf"(?<!\w)({_NAME})$")
+
+# Identifiers that never name a table, even right before a [bracket]
+KEYWORDS = {
+    "VAR", "RETURN", "IN", "NOT", "AND", "OR", "TRUE", "FALSE", "DEFINE",
+    "EVALUATE", "MEASURE", "ORDER", "BY", "ASC", "DESC", "START", "AT",
+}
+
+RELATIONSHIP_FUNCTIONS = {
+    "RELATED": "RELATED Relationship",
+    "RELATEDTABLE": "RELATED Relationship",
+    "USERELATIONSHIP": "USERELATIONSHIP Relationship",
+}
+
+# Functions recorded around a reference: the relationship functions and
+# the ones that change its filter context
+CONTEXT_FUNCTIONS = set(RELATIONSHIP_FUNCTIONS) | {"CALCULATE", "CALCULATETABLE"}
+
+DaxReference = collections.namedtuple("DaxReference", ["table", "name", "functions"])
+
+
+def _unquote(text, closing):
+    # 'Lease Facts' -> Lease Facts, [Net ]]Amount] -> Net ]Amount
+    inner = text[1:-1] if len(text) > 1 and text.endswith(closing) else text[1:]
+    return inner.replace(closing * 2, closing) if closing * 2 in inner else inner
+
+
+def _name_before(name, quoted):
+    """
+    Name a token is attached to: the name run right before it, or a
+    'Quoted Table' separated from it by whitespace only.
+    """
+
+    if name:
+        if name.isidentifier():
+            return name
+        match = _TRAILING_NAME.search(name)
+        return match.group(1) if match else ""
+
+    return quoted
+
+
+def _reference(name, bracket, functions):
+
+    if not name or name.upper() in KEYWORDS:
+        # [Measure], or RETURN [Measure]
+        table = ""
+    elif name[0] == "'":
+        table = _unquote(name, "'").strip()
+    else:
+        table = name
+
+    return DaxReference(table, _unquote(bracket, "]").strip(), functions)
+
+
+# --------------------------------------------------
+# REFERENCES
+# --------------------------------------------------
+
+def scan_references(expression):
+    """
+    Table[Column] and [Measure] references of a DAX expression, in order of
+    appearance, each with the context functions (RELATED, RELATEDTABLE,
+    USERELATIONSHIP, CALCULATE, CALCULATETABLE) it is nested in, outermost
+    first. Strings and comments are skipped; 'Quoted Tables' are unquoted;
+    names followed by '(' are functions, not tables.
+    """
+
+    if not expression or "[" not in expression:
+        return ()
+
+    references = []
+
+    # Without a context function no parenthesis needs tracking
+    upper = expression.upper()
+    if "RELAT" not in upper and "CALCULATE" not in upper:
+
+        gap = FLAT_GAP.match(expression)
+        name = gap.group(1) or ""
+        quoted = ""
+
+        for next_quoted, bracket, next_name in FLAT_PATTERN.findall(expression, gap.end()):
+
+            if not bracket:
+                pass
+
+            # [Measure] and Table[Column] inline: the common case
+            elif not quoted and bracket[-1] == "]" and "]]" not in bracket and (
+                    not name or name.isidentifier() and name.upper() not in KEYWORDS):
+                references.append(DaxReference(name, bracket[1:-1].strip(), ()))
+
+            else:
+                references.append(_reference(_name_before(name, quoted), bracket, ()))
+
+            quoted, name = next_quoted, next_name
+
+        return tuple(references)
+
+    calls = []          # context function (or None) per open parenthesis
+    functions = ()      # names in `calls`, outermost first
+
+    gap = NESTED_GAP.match(expression)
+    name = gap.group(1) or ""
+    quoted = ""
+
+    for next_quoted, bracket, paren, next_name in NESTED_PATTERN.findall(expression, gap.end()):
+
+        if bracket:
+            references.append(_reference(_name_before(name, quoted), bracket, functions))
+
+        elif paren == "(":
+            function = _name_before(name, "").upper()
+            if function in CONTEXT_FUNCTIONS:
+                calls.append(function)
+                functions = tuple(call for call in calls if call)
+            else:
+                calls.append(None)
+
+        elif paren and calls:
+            if calls.pop():
+                functions = tuple(call for call in calls if call)
+
+        quoted, name = next_quoted, next_name
+
+    return tuple(references)
+
+
+@functools.lru_cache(maxsize=DAX_CACHE_SIZE)
+def _cached_references(expression):
+    return scan_references(expression)
+
+
+def dax_references(expression):
+    """
+    Memoized scan_references(): models repeat the same expression across
+    measures, calculated columns and refreshes, so each distinct text is
+    lexed once per process.
+    """
+
+    if not expression:
+        return ()
+
+    return _cached_references(expression)
+
+
+def prime_references(expressions):
+    """
+    Lex a batch of expressions into the memo ahead of use, e.g. while the
+    rest of the model is still being fetched.
+    """
+
+    for expression in set(expressions):
+        if isinstance(expression, str) and expression:
+            _cached_references(expression)
+
+
+def reference_dependency(reference, default="Column Reference"):
+    """
+    DependencyType of a column reference from the functions around it.
+    """
+
+    for function in reversed(reference.functions):
+        if function in RELATIONSHIP_FUNCTIONS:
+            return RELATIONSHIP_FUNCTIONS[function]
+
+    return default
+
+
+def cache_info():
+    return _cached_references.cache_info()
+
+
+def clear_cache():
+    _cached_references.cache_clear()
@@ -1,11 +1,304 @@
-import pyodbc
-from config import SERVER, DATABASE
+import contextlib
+import sqlite3
+import threading
+import time
 
-def get_connection():
-    conn = pyodbc.connect(
+from config import (
+    SERVER,
+    DATABASE,
+    DB_OFFLINE_CATALOG,
+    DB_POOL_SIZE,
+    DB_POOL_ACQUIRE_TIMEOUT_SECONDS,
+    DB_POOL_PING_AFTER_SECONDS,
+    DB_CONNECT_RETRIES,
+    DB_RETRY_BACKOFF_SECONDS,
+    DB_QUERY_TIMEOUT_SECONDS,
+)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# --------------------------------------------------
+# CONNECTIONS
+# --------------------------------------------------
+
+def get_connection(server=SERVER, database=DATABASE):
+    """
+    One new Synapse connection. With LINEAGE_DB_OFFLINE set, the offline
+    SQLite catalog at that path stands in for the server.
+    """
+
+    if DB_OFFLINE_CATALOG:
+        from metadata_snapshot import connect_offline_catalog
+        return connect_offline_catalog(DB_OFFLINE_CATALOG)
+
+    import pyodbc
+
+    return pyodbc.connect(
         f"DRIVER={{ODBC Driver 18 for SQL Server}};"
-        f"SERVER={SERVER};"
-        f"DATABASE={DATABASE};"
+        f"SERVER={server};"
+        f"DATABASE={database};"
         "Authentication=ActiveDirectoryInteractive;"
+        "Encrypt=yes;"
     )
-    return conn
\ No newline at end of file
+
+
+def is_transient(error):
+    """
+    Whether an error means the connection failed rather than the query:
+    ODBC connection errors (SQLSTATE 08xxx), deadlock victims and a busy
+    SQLite stand-in are worth a retry on a fresh connection.
+    """
+
+    if isinstance(error, ConnectionError):
+        return True
+
+    if isinstance(error, sqlite3.OperationalError):
+        return "locked" in str(error) or "busy" in str(error)
+
+    state = str(error.args[0]) if getattr(error, "args", None) else ""
+
+    return state.startswith("08") or state == "40001"
+
+
+def set_query_timeout(conn, seconds):
+    """
+    Cancel statements running longer than `seconds`: ODBC's per-statement
+    timeout, or for SQLite a deadline on the checkout.
+    """
+
+    if not seconds:
+        return
+
+    if isinstance(conn, sqlite3.Connection):
+        deadline = time.monotonic() + seconds
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+    elif hasattr(conn, "timeout"):
+        conn.timeout = int(seconds)
+
+
+# --------------------------------------------------
+# POOL
+# --------------------------------------------------
+
+class ConnectionPool:
+    """
+    At most `max_size` connections made by `connect()`, shared by every
+    session and thread. A connection idle for longer than `ping_after`
+    seconds is checked with `ping_query` before it is handed out again.
+    Connections failing the check, or a query with a transient error, are
+    closed and replaced.
+    """
+
+    def __init__(self, connect, max_size=DB_POOL_SIZE, ping_query="SELECT 1",
+                 ping_after=DB_POOL_PING_AFTER_SECONDS, acquire_timeout=DB_POOL_ACQUIRE_TIMEOUT_SECONDS,
+                 retries=DB_CONNECT_RETRIES, backoff=DB_RETRY_BACKOFF_SECONDS,
+                 query_timeout=DB_QUERY_TIMEOUT_SECONDS):
+        self._connect = connect
+        self.max_size = max_size
+        self.ping_query = ping_query
+        self.ping_after = ping_after
+        self.acquire_timeout = acquire_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.query_timeout = query_timeout
+
+        self._idle = []         # (connection, last released), most recent last
+        self._size = 0
+        self._cond = threading.Condition()
+
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.waits = 0
+
+    def _sleep(self, attempt):
+        time.sleep(self.backoff * 2 ** attempt)
+
+    def _open(self):
+
+        for attempt in range(self.retries + 1):
+            try:
+                conn = self._connect()
+                self.created += 1
+                return conn
+            except Exception:
+                if attempt == self.retries:
+                    raise
+                self._sleep(attempt)
+
+    def _alive(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute(self.ping_query)
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+        with self._cond:
+            self._size -= 1
+            self.discarded += 1
+            self._cond.notify()
+
+    def acquire(self, timeout=None):
+        """
+        A connection for the caller's exclusive use; give it back with
+        release(). Waits up to `timeout` seconds when the pool is at
+        max_size, then raises PoolTimeout.
+        """
+
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f"No connection free within {timeout}s (pool size {self.max_size})"
+                        )
+                    self.waits += 1
+                    self._cond.wait(remaining)
+
+                if self._idle:
+                    conn, released = self._idle.pop()
+                else:
+                    conn, released = None, None
+                    self._size += 1
+
+            if conn is None:
+                try:
+                    conn = self._open()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                break
+
+            if time.monotonic() - released <= self.ping_after or self._alive(conn):
+                self.reused += 1
+                break
+
+            self._discard(conn)
+
+        set_query_timeout(conn, self.query_timeout)
+
+        return conn
+
+    def release(self, conn, broken=False):
+        """
+        Return a connection. Open transactions are rolled back; broken
+        connections are closed instead of pooled.
+        """
+
+        if not broken:
+            try:
+                if isinstance(conn, sqlite3.Connection):
+                    conn.set_progress_handler(None, 0)
+                if hasattr(conn, "rollback"):
+                    conn.rollback()
+            except Exception:
+                broken = True
+
+        if broken:
+            self._discard(conn)
+            return
+
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+
+        conn = self.acquire(timeout)
+
+        # Interrupted callers (KeyboardInterrupt, SystemExit, a Streamlit
+        # stop) may leave a statement half-read: their connection is
+        # discarded, but its slot is always given back
+        broken = True
+
+        try:
+            yield conn
+        except Exception as e:
+            broken = is_transient(e)
+            raise
+        else:
+            broken = False
+        finally:
+            self.release(conn, broken=broken)
+
+    def run(self, func, *args, **kwargs):
+        """
+        func(conn, *args, **kwargs) on a pooled connection, retried with
+        exponential backoff on a fresh connection after transient errors.
+        """
+
+        for attempt in range(self.retries + 1):
+            try:
+                with self.connection() as conn:
+                    return func(conn, *args, **kwargs)
+            except Exception as e:
+                if attempt == self.retries or not is_transient(e):
+                    raise
+                self._sleep(attempt)
+
+    def close(self):
+
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "created": self.created,
+                "reused": self.reused,
+                "discarded": self.discarded,
+                "waits": self.waits,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(server=SERVER, database=DATABASE, connect=None, **options):
+    """
+    Process-wide pool per server/database, created on first use. `connect`
+    overrides the connection factory (e.g. an offline catalog in tests).
+    """
+
+    key = (server, database)
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(
+                connect or (lambda: get_connection(server, database)), **options
+            )
+
+    return pool
@@ -0,0 +1,286 @@
+import hashlib
+import os
+import re
+import sys
+
+import pandas as pd
+
+from config import (
+    ADOMD_DLL_PATH,
+    FETCH_WORKERS,
+    PBI_CONNECTION_STRING,
+    PBI_MODEL_SOURCE,
+    SEMANTIC_SYNC_FULL_FETCH_RATIO,
+)
+from db_connection import ConnectionPool
+from fetch_pipeline import fetch_concurrently
+
+
+TMSCHEMA_ROWSETS = {
+    "tables": "TMSCHEMA_TABLES",
+    "columns": "TMSCHEMA_COLUMNS",
+    "measures": "TMSCHEMA_MEASURES",
+    "partitions": "TMSCHEMA_PARTITIONS",
+    "relationships": "TMSCHEMA_RELATIONSHIPS",
+}
+
+KEY_COLUMNS = ["ID", "ModifiedTime"]
+
+FILE_FORMATS = (".parquet", ".json")
+
+
+# --------------------------------------------------
+# LOAD ADOMD.NET
+# --------------------------------------------------
+
+def connect_model(conn_str=PBI_CONNECTION_STRING):
+
+    import clr
+
+    dll_folder = os.path.dirname(ADOMD_DLL_PATH)
+
+    sys.path.append(dll_folder)
+    os.environ["PATH"] = dll_folder + ";" + os.environ["PATH"]
+
+    clr.AddReference(ADOMD_DLL_PATH)
+
+    from pyadomd import Pyadomd
+
+    return Pyadomd(conn_str)
+
+
+_model_pools = {}
+
+
+def get_model_pool(conn_str=PBI_CONNECTION_STRING):
+    """
+    Process-wide pool of open XMLA connections per connection string.
+    """
+
+    pool = _model_pools.get(conn_str)
+
+    if pool is None:
+
+        def connect():
+            conn = connect_model(conn_str)
+            conn.open()
+            return conn
+
+        pool = _model_pools.setdefault(
+            conn_str,
+            ConnectionPool(connect, ping_query="SELECT [ID] FROM $SYSTEM.TMSCHEMA_MODEL")
+        )
+
+    return pool
+
+
+def run_query(conn, query):
+    with conn.cursor().execute(query) as cur:
+        rows = cur.fetchall()
+        cols = [col[0] for col in cur.description]
+    return pd.DataFrame(rows, columns=cols)
+
+
+# --------------------------------------------------
+# SOURCES
+# --------------------------------------------------
+
+class DmvSource:
+    """
+    Where TMSCHEMA rowsets come from. Subclasses implement read(kind);
+    key and row lookups default to filtering a full read. Sources that can
+    serve several reads at once set `concurrent`.
+    """
+
+    name = "model"
+    concurrent = True
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read(self, kind):
+        raise NotImplementedError
+
+    def read_keys(self, kind):
+        return self.read(kind)[KEY_COLUMNS]
+
+    def read_rows(self, kind, ids, total=None):
+        df = self.read(kind)
+        return df[df["ID"].isin(ids)]
+
+    def fetch(self, jobs):
+        """
+        Run {key: (method name, *args)} reads, concurrently when the source
+        allows, yielding (key, result) as each one completes.
+        """
+
+        return fetch_concurrently(
+            {key: (getattr(self, method), *args) for key, (method, *args) in jobs.items()},
+            max_workers=FETCH_WORKERS if self.concurrent else 1
+        )
+
+    def iter_model(self, kinds=tuple(TMSCHEMA_ROWSETS)):
+        return self.fetch({kind: ("read", kind) for kind in kinds})
+
+    def read_model(self):
+        return dict(self.iter_model())
+
+
+class AdomdSource(DmvSource):
+    """
+    Live model over XMLA through ADOMD.NET (Windows only). Every query
+    borrows a connection from the model's pool, so rowsets are read side by
+    side. An already created connection can be passed in instead of a
+    connection string; its queries then run one at a time.
+    """
+
+    def __init__(self, conn_str=PBI_CONNECTION_STRING, conn=None):
+
+        self.conn_str = conn_str
+        self.conn = conn
+        self.concurrent = conn is None
+
+        match = re.search(r"Initial Catalog\s*=\s*([^;]+)", conn_str, flags=re.IGNORECASE)
+        self.name = match.group(1).strip() if match else hashlib.sha256(
+            conn_str.encode("utf-8")
+        ).hexdigest()[:16]
+
+    def query(self, query):
+
+        if self.conn is not None:
+            return run_query(self.conn, query)
+
+        with get_model_pool(self.conn_str).connection() as conn:
+            return run_query(conn, query)
+
+    def read(self, kind):
+        return self.query(f"SELECT * FROM $SYSTEM.{TMSCHEMA_ROWSETS[kind]}")
+
+    def read_keys(self, kind):
+        return self.query(f"SELECT [ID], [ModifiedTime] FROM $SYSTEM.{TMSCHEMA_ROWSETS[kind]}")
+
+    def read_rows(self, kind, ids, total=None):
+
+        # Above this share of changed rows one full read beats row-by-row
+        if total is None or len(ids) > SEMANTIC_SYNC_FULL_FETCH_RATIO * total:
+            return super().read_rows(kind, ids)
+
+        rows = dict(self.fetch({
+            object_id: ("query", f"SELECT * FROM $SYSTEM.{TMSCHEMA_ROWSETS[kind]} WHERE [ID] = {int(object_id)}")
+            for object_id in ids
+        }))
+
+        return pd.concat([rows[object_id] for object_id in ids], ignore_index=True)
+
+
+class FileSource(DmvSource):
+    """
+    TMSCHEMA snapshots on disk: one TMSCHEMA_<ROWSET>.parquet (needs
+    pyarrow) or .json (records) file per rowset in `directory`.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.name = os.path.basename(os.path.normpath(directory))
+        self._frames = {}
+
+    def rowset_file(self, kind):
+
+        for extension in FILE_FORMATS:
+            path = os.path.join(self.directory, TMSCHEMA_ROWSETS[kind] + extension)
+            if os.path.exists(path):
+                return path
+
+        raise FileNotFoundError(
+            f"No {TMSCHEMA_ROWSETS[kind]}.parquet or .json in {self.directory}"
+        )
+
+    def read(self, kind):
+
+        path = self.rowset_file(kind)
+        modified = os.path.getmtime(path)
+
+        cached = self._frames.get(kind)
+        if cached is not None and cached[0] == (path, modified):
+            return cached[1].copy()
+
+        if path.endswith(".parquet"):
+            df = pd.read_parquet(path)
+        else:
+            df = pd.read_json(path, orient="records", dtype=False, convert_dates=["ModifiedTime"])
+
+        self._frames[kind] = ((path, modified), df)
+
+        return df.copy()
+
+
+class FrameSource(DmvSource):
+    """
+    Rowsets already in memory, such as a synthetic model.
+    """
+
+    def __init__(self, frames, name="frames"):
+        self.frames = frames
+        self.name = name
+
+    def read(self, kind):
+        return self.frames[kind].copy()
+
+
+def write_model_files(frames, directory, file_format="json"):
+    """
+    Save TMSCHEMA frames (from any source) as a FileSource directory.
+    """
+
+    os.makedirs(directory, exist_ok=True)
+
+    for kind, rowset in TMSCHEMA_ROWSETS.items():
+
+        path = os.path.join(directory, f"{rowset}.{file_format}")
+
+        if file_format == "parquet":
+            frames[kind].to_parquet(path, index=False)
+        elif file_format == "json":
+            frames[kind].to_json(path, orient="records", date_format="iso")
+        else:
+            raise ValueError(f"Unsupported format: {file_format}")
+
+    return directory
+
+
+def get_model_source(spec=PBI_MODEL_SOURCE):
+    """
+    Resolve a source spec: empty for the live model in
+    PBI_CONNECTION_STRING, a directory of TMSCHEMA files, or
+    'synthetic:tables=200,measures_per_table=20,complexity=3'.
+    """
+
+    if not spec:
+        return AdomdSource(PBI_CONNECTION_STRING)
+
+    if spec.startswith("synthetic"):
+        from synthetic_model import synthetic_model
+
+        _, _, options = spec.partition(":")
+        params = {
+            key.strip(): int(value)
+            for key, _, value in (option.partition("=") for option in options.split(",") if option)
+        }
+
+        suffix = "_".join(f"{key}{value}" for key, value in sorted(params.items()))
+        return FrameSource(synthetic_model(**params), name=f"synthetic_{suffix}" if suffix else "synthetic")
+
+    if os.path.isdir(spec):
+        return FileSource(spec)
+
+    return AdomdSource(spec)
@@ -0,0 +1,106 @@
+import concurrent.futures
+import queue
+import threading
+
+from config import FETCH_WORKERS, FETCH_QUEUE_BATCHES
+
+
+# --------------------------------------------------
+# CONCURRENT CATALOG QUERIES
+# --------------------------------------------------
+
+def fetch_concurrently(jobs, max_workers=FETCH_WORKERS):
+    """
+    Run independent catalog reads, {key: (func, *args)}, on a thread pool
+    and yield (key, result) in completion order, so the caller can start
+    on the first result while the slower queries are still running.
+    With max_workers=1 (a source that cannot share its connection) the
+    jobs run one after another in the caller's thread.
+    """
+
+    jobs = dict(jobs)
+
+    if max_workers <= 1 or len(jobs) <= 1:
+        for key, (func, *args) in jobs.items():
+            yield key, func(*args)
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=min(max_workers, len(jobs)),
+        thread_name_prefix="catalog-fetch"
+    ) as executor:
+
+        futures = {executor.submit(func, *args): key for key, (func, *args) in jobs.items()}
+
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+# --------------------------------------------------
+# PRODUCER / CONSUMER OVERLAP
+# --------------------------------------------------
+
+_DONE = object()
+
+
+def run_streaming(produce, consume, max_batches=FETCH_QUEUE_BATCHES):
+    """
+    Overlap a fetch with the work on what it fetched. produce(on_batch)
+    runs on a background thread and hands each batch to on_batch as it
+    arrives; consume(batch) runs on the calling thread meanwhile. At most
+    `max_batches` batches wait in between, so a slow consumer throttles
+    the fetch instead of buffering the whole result set.
+
+    Returns produce()'s result; an exception on either side is re-raised
+    here after the other side has stopped.
+    """
+
+    batches = queue.Queue(maxsize=max_batches)
+    outcome = {}
+    stop = threading.Event()
+
+    def on_batch(batch):
+        while not stop.is_set():
+            try:
+                batches.put(batch, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise RuntimeError("consumer stopped")
+
+    def producer():
+        try:
+            outcome["result"] = produce(on_batch)
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            while True:
+                try:
+                    batches.put(_DONE, timeout=0.1)
+                    break
+                except queue.Full:
+                    if stop.is_set():
+                        break
+
+    thread = threading.Thread(target=producer, name="catalog-stream", daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            batch = batches.get()
+            if batch is _DONE:
+                break
+            consume(batch)
+    finally:
+        stop.set()
+        thread.join()
+
+    # A consumer error has already propagated from the loop above
+    if "error" in outcome:
+        raise outcome["error"]
+
+    return outcome.get("result")
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from config import LAYOUT_CACHE_DIR, LAYOUT_CACHE_DISK_ENTRIES, LAYOUT_CACHE_SIZE
+
+
+LAYOUT_FORMAT = "svg"
+
+
+# --------------------------------------------------
+# CACHE KEY
+# --------------------------------------------------
+
+def layout_fingerprint(dot, engine=None):
+    """
+    Stable key for the layout of a graphviz graph: graph, node and edge
+    defaults, the set of node and edge statements (with their attributes)
+    and the engine. Statement order does not matter, so the same subgraph
+    built in a different order hits the same entry.
+    """
+
+    payload = json.dumps(
+        [
+            engine or dot.engine,
+            LAYOUT_FORMAT,
+            type(dot).__name__,
+            sorted(dot.graph_attr.items()),
+            sorted(dot.node_attr.items()),
+            sorted(dot.edge_attr.items()),
+            sorted(line.strip() for line in dot.body),
+        ],
+        ensure_ascii=False,
+    )
+
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# --------------------------------------------------
+# TWO-LEVEL CACHE (MEMORY LRU + DISK LRU)
+# --------------------------------------------------
+
+class LayoutCache:
+    """
+    Laid-out SVGs in an in-process LRU backed by files on disk, shared by
+    every session and process on the machine. The disk tier keeps the
+    `max_disk_entries` most recently used files; a hit refreshes the file's
+    mtime, so eviction goes by last use.
+    """
+
+    def __init__(self, cache_dir=LAYOUT_CACHE_DIR, max_entries=LAYOUT_CACHE_SIZE,
+                 max_disk_entries=LAYOUT_CACHE_DISK_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.{LAYOUT_FORMAT}")
+
+    def _remember(self, key, svg):
+        with self._lock:
+            self._memory[key] = svg
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                svg = f.read()
+            os.utime(path)
+            return svg
+        except OSError:
+            return None
+
+    def _write_disk(self, key, svg):
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(svg)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self._evict_disk()
+
+    def _evict_disk(self):
+
+        try:
+            entries = [
+                entry for entry in os.scandir(self.cache_dir)
+                if entry.name.endswith(f".{LAYOUT_FORMAT}")
+            ]
+        except OSError:
+            return
+
+        excess = len(entries) - self.max_disk_entries
+        if excess <= 0:
+            return
+
+        def last_used(entry):
+            try:
+                return entry.stat().st_mtime
+            except OSError:
+                return 0
+
+        for entry in sorted(entries, key=last_used)[:excess]:
+            try:
+                os.remove(entry.path)
+                self.evictions += 1
+            except OSError:
+                pass
+
+    def get(self, key):
+        with self._lock:
+            svg = self._memory.get(key)
+            if svg is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return svg
+
+        svg = self._read_disk(key)
+        if svg is not None:
+            self.disk_hits += 1
+            self._remember(key, svg)
+            return svg
+
+        self.misses += 1
+        return None
+
+    def put(self, key, svg):
+        self._remember(key, svg)
+        self._write_disk(key, svg)
+
+    def stats(self):
+        return {
+            "memory_hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_entries": len(self._memory),
+            "disk_evictions": self.evictions,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+
+
+_cache = LayoutCache()
+
+
+def get_layout_cache():
+    return _cache
+
+
+# --------------------------------------------------
+# CACHED RENDER ENTRY POINT
+# --------------------------------------------------
+
+def render_svg(dot, engine=None, cache=None):
+    """
+    SVG for a graphviz Digraph, laid out once per fingerprint. Reruns, view
+    switches and links opened by other sessions reuse the stored layout.
+
+    Returns None when the Graphviz binaries are not installed on this
+    host; callers then hand the graph to the browser (st.graphviz_chart).
+    """
+
+    from graphviz import ExecutableNotFound
+
+    cache = cache or _cache
+    engine = engine or dot.engine
+    key = layout_fingerprint(dot, engine)
+
+    svg = cache.get(key)
+
+    if svg is None:
+        try:
+            svg = dot.pipe(format=LAYOUT_FORMAT, engine=engine).decode("utf-8")
+        except ExecutableNotFound:
+            return None
+        cache.put(key, svg)
+
+    return svg
@@ -0,0 +1,392 @@
+"""
+Headless batch runs of the three lineage engines, for scheduled
+precomputation and benchmarks:
+
+    python lineage_batch.py                                  # every engine, whole catalog
+    python lineage_batch.py procedures --objects TFM.VW_BLDG_METRICS
+    python lineage_batch.py attributes --columns ODS.SALES.AMOUNT --max-depth 4
+    python lineage_batch.py semantic --model-source synthetic:tables=200
+
+Each engine writes one edge file to the output directory; timings and
+rows/sec are printed and saved in batch_summary.json. With --store the
+warehouse and semantic edges are also kept as a new snapshot in the
+Parquet lineage store (needs pyarrow).
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from config import SERVER, DATABASE, BATCH_OUTPUT_DIR, LINEAGE_MAX_DEPTH, PBI_MODEL_SOURCE
+
+
+ENGINES = ("procedures", "attributes", "semantic")
+
+OUTPUT_FORMATS = ("csv", "json", "parquet")
+
+
+# --------------------------------------------------
+# INPUTS
+# --------------------------------------------------
+
+def read_list(values=None, path=None):
+    """
+    Names given on the command line plus those in a file (one per line,
+    '#' starts a comment).
+    """
+
+    names = list(values or [])
+
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    names.append(line)
+
+    return names
+
+
+def select_modules(store_path, objects=None):
+    """
+    Object IDs of the views and procedures named NAME or SCHEMA.NAME (any
+    case), or of all of them when `objects` is empty. Raises LookupError
+    when a requested object is not in the snapshot.
+    """
+
+    from metadata_snapshot import load_modules
+
+    objects = list(objects or [])
+
+    df = load_modules(
+        store_path,
+        types=("V", "P"),
+        names=sorted({name.rpartition(".")[2] for name in objects}) or None,
+        with_definition=False
+    )
+
+    if not objects:
+        return df["object_id"].tolist()
+
+    short_names = df["object_name"].str.upper()
+    full_names = (df["schema_name"] + "." + df["object_name"]).str.upper()
+
+    wanted = {name.upper() for name in objects}
+    df = df[short_names.isin(wanted) | full_names.isin(wanted)]
+
+    found = set(short_names[df.index]) | set(full_names[df.index])
+    missing = [name for name in objects if name.upper() not in found]
+    if missing:
+        raise LookupError(f"Views / procedures not found: {', '.join(missing)}")
+
+    return df["object_id"].tolist()
+
+
+# --------------------------------------------------
+# ENGINES
+# --------------------------------------------------
+
+def run_procedures(pool, store_path, objects=None):
+    """
+    Procedures & Views engine: materialize the named modules (or the whole
+    warehouse) and return their column lineage rows.
+    """
+
+    from metadata_snapshot import ensure_snapshot
+    from lineage_materializer import load_module_lineage, materialize_lineage, materialize_while_syncing
+
+    if objects:
+        pool.run(ensure_snapshot, store_path)
+        object_ids = select_modules(store_path, objects)
+        materialize_lineage(store_path, object_ids=object_ids)
+    else:
+        pool.run(materialize_while_syncing, store_path)
+        object_ids = select_modules(store_path)
+
+    return load_module_lineage(object_ids, store_path)
+
+
+def run_attributes(pool, store_path, columns=None, max_depth=LINEAGE_MAX_DEPTH):
+    """
+    Attribute engine: full downstream lineage of every SCHEMA.TABLE.COLUMN
+    in `columns`, or of every landing-table column the materialized
+    warehouse lineage reads from.
+    """
+
+    from lineage_materializer import materialize_while_syncing, source_columns
+    from lineage_service import get_full_column_lineage
+
+    if columns:
+        starts = []
+        for name in columns:
+            table, dot, column = name.upper().rpartition(".")
+            if not dot or "." not in table:
+                raise ValueError(f"Expected SCHEMA.TABLE.COLUMN, got {name!r}")
+            starts.append((table, column))
+    else:
+        pool.run(materialize_while_syncing, store_path)
+        starts = source_columns(store_path)
+
+    frames = []
+
+    for table, column in starts:
+        schema, _, table_name = table.partition(".")
+        df = pool.run(get_full_column_lineage, schema, table_name, column, max_depth, store_path)
+        if not df.empty:
+            frames.append(df)
+
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def run_semantic(source_spec=PBI_MODEL_SOURCE, nodes=None, incremental=True):
+    """
+    Semantic Model engine: every lineage edge of the model, or only the
+    edges in the upstream / downstream impact of `nodes`.
+    """
+
+    from dmv_source import get_model_source
+    from lineage_builder import build_lineage
+    from reachability import ReachabilityIndex
+
+    df_lineage, G = build_lineage(incremental, source=get_model_source(source_spec))
+
+    if not nodes or df_lineage.empty:
+        return df_lineage
+
+    missing = [node for node in nodes if node not in G]
+    if missing:
+        raise ValueError(f"Not in the semantic model: {', '.join(missing)}")
+
+    index = ReachabilityIndex(G)
+    impact = set(nodes)
+
+    for node in nodes:
+        impact |= index.impact(node)
+
+    return df_lineage[df_lineage["Source"].isin(impact) & df_lineage["Target"].isin(impact)]
+
+
+# --------------------------------------------------
+# OUTPUT
+# --------------------------------------------------
+
+def _require_pyarrow(purpose):
+    """
+    Fail with a plain message when the optional pyarrow package is missing.
+    """
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise RuntimeError(f"pyarrow not installed: {purpose} needs it (pip install pyarrow)") from None
+
+
+def write_edges(df, directory, engine, file_format="csv"):
+
+    if file_format == "parquet":
+        _require_pyarrow("--format parquet")
+
+    os.makedirs(directory, exist_ok=True)
+
+    path = os.path.join(directory, f"{engine}_edges.{file_format}")
+
+    if file_format == "csv":
+        df.to_csv(path, index=False)
+    elif file_format == "json":
+        df.to_json(path, orient="records", lines=True, date_format="iso")
+    elif file_format == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        raise ValueError(f"Unsupported format: {file_format}")
+
+    return path
+
+
+def store_edges(engine, df, store_path, objects=None, nodes=None):
+    """
+    Keep an engine's edges as a new lineage store snapshot. The attribute
+    engine's searches are derived from the warehouse edges and not stored.
+    Runs limited to `objects` / `nodes` are stored as subset snapshots,
+    which never replace the latest full one. Returns (snapshot id, rows)
+    or None.
+    """
+
+    _require_pyarrow("the lineage store (--store)")
+
+    from lineage_store import get_lineage_store, procedure_edges, semantic_edges
+
+    store = get_lineage_store()
+
+    if engine == "procedures":
+        from lineage_materializer import iter_column_edges
+        object_ids = select_modules(store_path, objects) if objects else None
+        frames = (procedure_edges(edges) for edges in iter_column_edges(store_path, object_ids))
+        subset = bool(objects)
+    elif engine == "semantic":
+        frames = [semantic_edges(df)] if not df.empty else []
+        subset = bool(nodes)
+    else:
+        return None
+
+    stored = store.write(frames, engine, subset=subset)
+    store.prune(engine)
+
+    return stored
+
+
+def timed_run(engine, compute, directory, file_format, store=None):
+    """
+    Run one engine and write its edges, then hand them to store(engine,
+    df) when given. Returns a summary dict; a failing engine is reported
+    in it instead of stopping the batch.
+    """
+
+    started = time.perf_counter()
+
+    try:
+        df = compute()
+        seconds = time.perf_counter() - started
+        path = write_edges(df, directory, engine, file_format)
+    except Exception as e:
+        return {
+            "engine": engine,
+            "status": "failed",
+            "error": f"{type(e).__name__}: {e}",
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+    result = {
+        "engine": engine,
+        "status": "ok",
+        "rows": len(df),
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(len(df) / seconds, 1) if seconds > 0 else None,
+        "output": path,
+    }
+
+    if store is not None:
+        started = time.perf_counter()
+        try:
+            stored = store(engine, df)
+        except Exception as e:
+            result.update(status="failed", error=f"lineage store: {type(e).__name__}: {e}")
+            stored = None
+        if stored:
+            result["store_snapshot"], result["store_rows"] = stored
+            result["store_seconds"] = round(time.perf_counter() - started, 3)
+
+    return result
+
+
+def print_summary(results, out=sys.stdout):
+
+    for result in results:
+        if result["status"] == "ok":
+            print(
+                f"{result['engine']:<12} {result['rows']:>10,} rows {result['seconds']:>9.2f}s "
+                f"{result['rows_per_second'] or 0:>12,.0f} rows/s  {result['output']}",
+                file=out
+            )
+            if "store_snapshot" in result:
+                print(
+                    f"{'':<12} {result['store_rows']:>10,} edges stored in {result['store_seconds']:.2f}s "
+                    f"(snapshot {result['store_snapshot']})",
+                    file=out
+                )
+        else:
+            print(f"{result['engine']:<12} FAILED after {result['seconds']:.2f}s: {result['error']}", file=out)
+
+
+# --------------------------------------------------
+# ENTRY POINT
+# --------------------------------------------------
+
+def parse_args(argv=None):
+
+    parser = argparse.ArgumentParser(description="Compute lineage without the UI and write edge files.")
+    parser.add_argument("engines", nargs="*", choices=ENGINES + ("all",), default="all",
+                        help="engines to run (default: all)")
+    parser.add_argument("--server", default=SERVER)
+    parser.add_argument("--database", default=DATABASE)
+    parser.add_argument("--offline-catalog", help="SQLite offline catalog to read instead of the server")
+    parser.add_argument("--objects", nargs="+", help="views / procedures, NAME or SCHEMA.NAME (default: all)")
+    parser.add_argument("--objects-file", help="file with one view / procedure per line")
+    parser.add_argument("--columns", nargs="+", help="SCHEMA.TABLE.COLUMN starts for the attribute engine")
+    parser.add_argument("--columns-file", help="file with one SCHEMA.TABLE.COLUMN per line")
+    parser.add_argument("--max-depth", type=int, default=LINEAGE_MAX_DEPTH)
+    parser.add_argument("--model-source", default=PBI_MODEL_SOURCE,
+                        help="semantic model: empty for the live model, a TMSCHEMA directory or synthetic:...")
+    parser.add_argument("--nodes", nargs="+", help="semantic nodes (Table.Column / measure) to limit the impact to")
+    parser.add_argument("--full-rebuild", action="store_true",
+                        help="rebuild semantic lineage from every TMSCHEMA row instead of syncing changes")
+    parser.add_argument("--output", default=BATCH_OUTPUT_DIR)
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="csv")
+    parser.add_argument("--store", action="store_true",
+                        help="also keep the edges as a snapshot in the Parquet lineage store")
+
+    args = parser.parse_args(argv)
+
+    if "all" in args.engines:
+        args.engines = list(ENGINES)
+
+    # Fail before any engine runs rather than after computing its edges
+    try:
+        if args.format == "parquet":
+            _require_pyarrow("--format parquet")
+        if args.store:
+            _require_pyarrow("the lineage store (--store)")
+    except RuntimeError as e:
+        parser.error(str(e))
+
+    return args
+
+
+def main(argv=None):
+
+    args = parse_args(argv)
+
+    from db_connection import get_pool
+    from metadata_snapshot import connect_offline_catalog, snapshot_path
+
+    connect = (lambda: connect_offline_catalog(args.offline_catalog)) if args.offline_catalog else None
+    pool = get_pool(args.server, args.database, connect=connect)
+    store_path = snapshot_path(args.server, args.database)
+
+    objects = read_list(args.objects, args.objects_file)
+    columns = read_list(args.columns, args.columns_file)
+
+    computations = {
+        "procedures": lambda: run_procedures(pool, store_path, objects),
+        "attributes": lambda: run_attributes(pool, store_path, columns, args.max_depth),
+        "semantic": lambda: run_semantic(args.model_source, args.nodes, not args.full_rebuild),
+    }
+
+    started_at = datetime.now().isoformat(timespec="seconds")
+
+    try:
+        results = [
+            timed_run(engine, computations[engine], args.output, args.format,
+                      (lambda engine, df: store_edges(engine, df, store_path, objects, args.nodes))
+                      if args.store else None)
+            for engine in ENGINES if engine in args.engines
+        ]
+    finally:
+        pool.close()
+
+    print_summary(results)
+
+    os.makedirs(args.output, exist_ok=True)
+    with open(os.path.join(args.output, "batch_summary.json"), "w", encoding="utf-8") as f:
+        json.dump({"started_at": started_at, "server": args.server, "database": args.database,
+                   "results": results}, f, indent=2)
+
+    return 0 if all(result["status"] == "ok" for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,60 +1,53 @@
-def build_lineage():
+import re
 
-    import sys
-    import os
-    import clr
-    import re
-    import pandas as pd
-    import networkx as nx
+import pandas as pd
 
-    # --------------------------------------------------
-    # LOAD ADOMD.NET
-    # --------------------------------------------------
+from dax_lexer import dax_references, prime_references, reference_dependency
+from dmv_source import get_model_source
+from lineage_graph import LineageGraph
 
-    dll_path = r"C:\Program Files\Microsoft.NET\ADOMD.NET\160\Microsoft.AnalysisServices.AdomdClient.dll"
-    dll_folder = os.path.dirname(dll_path)
 
-    sys.path.append(dll_folder)
-    os.environ["PATH"] = dll_folder + ";" + os.environ["PATH"]
+# --------------------------------------------------
+# LOAD TMSCHEMA ROWSETS
+# --------------------------------------------------
 
-    clr.AddReference(dll_path)
+def fetch_model(source=None):
+    """
+    Read every TMSCHEMA rowset the lineage needs from a DMV source
+    (the configured one by default). Rowsets are fetched side by side and
+    DAX expressions are lexed as soon as their rowset arrives.
+    """
 
-    from pyadomd import Pyadomd
+    frames = {}
 
-    # --------------------------------------------------
-    # CONNECTION STRING
-    # --------------------------------------------------
+    with source or get_model_source() as model_source:
+        for kind, df in model_source.iter_model():
+            if "Expression" in df and kind in ("measures", "columns"):
+                prime_references(df["Expression"])
+            frames[kind] = df
 
-    conn_str = """
-    Provider=MSOLAP;
-    Data Source=powerbi://api.powerbi.com/v1.0/myorg/Lease%20Activity;
-    Initial Catalog=Lease Activity;
-    """
+    return frames
 
-    with Pyadomd(conn_str) as conn:
 
-        def run_query(query):
-            with conn.cursor().execute(query) as cur:
-                rows = cur.fetchall()
-                cols = [col[0] for col in cur.description]
-            return pd.DataFrame(rows, columns=cols)
+# --------------------------------------------------
+# HELPERS
+# --------------------------------------------------
 
-        df_tables = run_query("SELECT * FROM $SYSTEM.TMSCHEMA_TABLES")
-        df_columns = run_query("SELECT * FROM $SYSTEM.TMSCHEMA_COLUMNS")
-        df_measures = run_query("SELECT * FROM $SYSTEM.TMSCHEMA_MEASURES")
-        df_partitions = run_query("SELECT * FROM $SYSTEM.TMSCHEMA_PARTITIONS")
-        df_relationships = run_query("SELECT * FROM $SYSTEM.TMSCHEMA_RELATIONSHIPS")
+def get_name_column(df):
+    return "Name" if "Name" in df.columns else "ExplicitName"
 
-    # --------------------------------------------------
-    # HELPERS
-    # --------------------------------------------------
 
-    def get_name_column(df):
-        return "Name" if "Name" in df.columns else "ExplicitName"
+def prepare_model(frames):
+    """
+    Resolve table names and lookups shared by every lineage rule.
+    """
+
+    df_tables = frames["tables"]
+    df_columns = frames["columns"]
+    df_measures = frames["measures"]
+    df_partitions = frames["partitions"]
 
     table_name_col = get_name_column(df_tables)
-    column_name_col = get_name_column(df_columns)
-    measure_name_col = get_name_column(df_measures)
 
     table_lookup = dict(zip(df_tables["ID"], df_tables[table_name_col]))
 
@@ -65,198 +58,300 @@ def build_lineage():
     df_measures["Expression"] = df_measures["Expression"].fillna("")
     df_columns["Expression"] = df_columns["Expression"].fillna("")
 
-    lineage_rows = []
-
-    # --------------------------------------------------
-    # MEASURE LOOKUP
-    # --------------------------------------------------
+    measure_name_col = get_name_column(df_measures)
 
-    measure_lookup = {
-        row[measure_name_col]: row["TableName"]
-        for _, row in df_measures.iterrows()
+    return {
+        "table_lookup": table_lookup,
+        "column_name_col": get_name_column(df_columns),
+        "measure_name_col": measure_name_col,
+        "measure_lookup": dict(zip(df_measures[measure_name_col], df_measures["TableName"])),
     }
 
-    # --------------------------------------------------
-    # DAX DEPENDENCY PARSER
-    # --------------------------------------------------
 
-    def extract_dependencies(expression):
+# --------------------------------------------------
+# DAX DEPENDENCY PARSER
+# --------------------------------------------------
 
-        if not expression:
-            return [], []
+def extract_dependencies(expression):
 
-        pattern = r'([\w\s]*)\[(.*?)\]'
-        matches = re.findall(pattern, expression)
+    column_refs = []
+    measure_refs = []
 
-        column_refs = []
-        measure_refs = []
+    for reference in dax_references(expression):
+        if reference.table:
+            column_refs.append((reference.table, reference.name))
+        else:
+            measure_refs.append(reference.name)
 
-        for table, name in matches:
-            if table.strip():
-                column_refs.append((table.strip(), name.strip()))
-            else:
-                measure_refs.append(name.strip())
+    return column_refs, measure_refs
 
-        return column_refs, measure_refs
 
-    # --------------------------------------------------
-    # MEASURE LINEAGE
-    # --------------------------------------------------
+# --------------------------------------------------
+# ROBUST M SOURCE EXTRACTION
+# --------------------------------------------------
 
-    for _, row in df_measures.iterrows():
+def extract_m_sources(m_code):
 
-        expr = row["Expression"]
-        measure_name = row[measure_name_col]
-        current_table = row["TableName"]
+    if not m_code:
+        return []
 
-        col_refs, measure_refs = extract_dependencies(expr)
+    sources = []
 
-        for table, column in col_refs:
-            resolved_table = table if table else current_table
+    # If JSON wrapped
+    json_query_pattern = r'"Query"\s*:\s*"([^"]+)"'
+    json_match = re.search(json_query_pattern, m_code, flags=re.IGNORECASE | re.DOTALL)
+    if json_match:
+        m_code = json_match.group(1)
 
-            lineage_rows.append({
-                "Source": f"{resolved_table}.{column}",
-                "Target": f"{current_table}.{measure_name}",
-                "Transformation": expr,
-                "DependencyType": "Column Reference"
-            })
+    # NativeQuery SQL
+    native_query_pattern = r'Value\.NativeQuery\([^,]+,\s*"([^"]+)"'
+    native_match = re.search(native_query_pattern, m_code, flags=re.IGNORECASE | re.DOTALL)
 
-        for measure in measure_refs:
-            source_table = measure_lookup.get(measure, current_table)
+    if native_match:
+        sql = native_match.group(1)
+        from_pattern = r'FROM\s+([\[\]\w\.]+)'
+        from_match = re.search(from_pattern, sql, flags=re.IGNORECASE)
+        if from_match:
+            table = from_match.group(1).replace("[", "").replace("]", "")
+            return [table]
 
-            lineage_rows.append({
-                "Source": f"{source_table}.{measure}",
-                "Target": f"{current_table}.{measure_name}",
-                "Transformation": expr,
-                "DependencyType": "Measure Reference"
-            })
+    # Sql.Database navigation
+    nav_pattern = r'\[Schema="([^"]+)",\s*Item="([^"]+)"\]'
+    nav_matches = re.findall(nav_pattern, m_code)
 
-    # --------------------------------------------------
-    # CALCULATED COLUMN LINEAGE
-    # --------------------------------------------------
+    for schema, item in nav_matches:
+        sources.append(f"{schema}.{item}")
 
-    calc_columns = df_columns[df_columns["Expression"] != ""]
+    # Fallback simple Item=
+    fallback_pattern = r'Item="([^"]+)"'
+    fallback_matches = re.findall(fallback_pattern, m_code)
 
-    for _, row in calc_columns.iterrows():
+    for item in fallback_matches:
+        sources.append(item)
 
-        expr = row["Expression"]
-        calc_name = row[column_name_col]
-        current_table = row["TableName"]
+    return list(set(sources))
 
-        col_refs, measure_refs = extract_dependencies(expr)
 
-        for table, column in col_refs:
-            resolved_table = table if table else current_table
+# --------------------------------------------------
+# LINEAGE RULES (COLUMNAR)
+# --------------------------------------------------
 
-            dep_type = "RELATED Relationship" if "RELATED" in expr.upper() else "Column Reference"
+EDGE_COLUMNS = ["Source", "Target", "Transformation", "DependencyType"]
 
-            lineage_rows.append({
-                "Source": f"{resolved_table}.{column}",
-                "Target": f"{current_table}.{calc_name}",
-                "Transformation": expr,
-                "DependencyType": dep_type
-            })
+# Bump when the rules below derive different edges, so stored edges are rebuilt
+RULES_VERSION = 2
 
-        for measure in measure_refs:
-            source_table = measure_lookup.get(measure, current_table)
 
-            lineage_rows.append({
-                "Source": f"{source_table}.{measure}",
-                "Target": f"{current_table}.{calc_name}",
-                "Transformation": expr,
-                "DependencyType": "Measure Reference"
-            })
+def reference_frame(expressions):
+    """
+    One row per Table[Column] / [Measure] reference in a Series of DAX
+    expressions: Position (row position in `expressions`), Table, Name,
+    IsMeasure and the column reference's Dependency, ordered like
+    extract_dependencies() (columns, then measures).
+    """
 
-    # --------------------------------------------------
-    # MODEL RELATIONSHIPS
-    # --------------------------------------------------
+    rows = []
 
-    for _, row in df_relationships.iterrows():
+    for position, expression in enumerate(expressions):
 
-        from_table = table_lookup[row["FromTableID"]]
-        to_table = table_lookup[row["ToTableID"]]
+        references = dax_references(expression)
+
+        rows.extend(
+            (position, ref.table, ref.name, False, reference_dependency(ref))
+            for ref in references if ref.table
+        )
+        rows.extend(
+            (position, "", ref.name, True, "Measure Reference")
+            for ref in references if not ref.table
+        )
 
-        lineage_rows.append({
-            "Source": from_table,
-            "Target": to_table,
-            "Transformation": "Model Relationship",
-            "DependencyType": "Model Relationship"
+    return pd.DataFrame(
+        rows, columns=["Position", "Table", "Name", "IsMeasure", "Dependency"]
+    ).astype({"Position": "int64", "IsMeasure": "bool"})
+
+
+def _measure_tables(frames, model):
+    # Last definition wins, as in the measure_lookup dict
+    return (
+        pd.DataFrame({
+            "Name": frames["measures"][model["measure_name_col"]],
+            "SourceTable": frames["measures"]["TableName"],
         })
+        .drop_duplicates("Name", keep="last")
+    )
 
-    # --------------------------------------------------
-    # ROBUST M SOURCE EXTRACTION
-    # --------------------------------------------------
 
-    def extract_m_sources(m_code):
+def expression_edges(df, name_col, measure_tables):
+    """
+    Edges of measures or calculated columns: every column reference and
+    measure reference in their DAX expression. Column references inside
+    RELATED / USERELATIONSHIP are typed as relationships.
+    """
 
-        if not m_code:
-            return []
+    df = df.reset_index(drop=True)
+    refs = reference_frame(df["Expression"])
+    position = refs["Position"].to_numpy()
 
-        sources = []
+    current_table = df["TableName"].astype(str).to_numpy()[position]
+    expression = df["Expression"].to_numpy()[position]
 
-        # If JSON wrapped
-        json_query_pattern = r'"Query"\s*:\s*"([^"]+)"'
-        json_match = re.search(json_query_pattern, m_code, flags=re.IGNORECASE | re.DOTALL)
-        if json_match:
-            m_code = json_match.group(1)
+    refs = refs.merge(measure_tables, on="Name", how="left", indicator=True)
+    is_measure = refs["IsMeasure"].to_numpy()
 
-        # NativeQuery SQL
-        native_query_pattern = r'Value\.NativeQuery\([^,]+,\s*"([^"]+)"'
-        native_match = re.search(native_query_pattern, m_code, flags=re.IGNORECASE | re.DOTALL)
+    # [Measure] resolves to the table defining it, else the current table
+    measure_table = pd.Series(current_table).where(
+        refs["_merge"].to_numpy() != "both",
+        refs["SourceTable"].astype(str)
+    )
+    source_table = pd.Series(refs["Table"].to_numpy()).where(~is_measure, measure_table)
 
-        if native_match:
-            sql = native_match.group(1)
-            from_pattern = r'FROM\s+([\[\]\w\.]+)'
-            from_match = re.search(from_pattern, sql, flags=re.IGNORECASE)
-            if from_match:
-                table = from_match.group(1).replace("[", "").replace("]", "")
-                return [table]
+    return pd.DataFrame({
+        "ID": df["ID"].to_numpy()[position],
+        "Source": source_table + "." + refs["Name"].astype(str).to_numpy(),
+        "Target": current_table + "." + df[name_col].astype(str).to_numpy()[position],
+        "Transformation": expression,
+        "DependencyType": refs["Dependency"].to_numpy(),
+    })
 
-        # Sql.Database navigation
-        nav_pattern = r'\[Schema="([^"]+)",\s*Item="([^"]+)"\]'
-        nav_matches = re.findall(nav_pattern, m_code)
 
-        for schema, item in nav_matches:
-            sources.append(f"{schema}.{item}")
+def relationship_frame_edges(df_relationships, model):
 
-        # Fallback simple Item=
-        fallback_pattern = r'Item="([^"]+)"'
-        fallback_matches = re.findall(fallback_pattern, m_code)
+    table_lookup = pd.Series(model["table_lookup"], dtype="object")
 
-        for item in fallback_matches:
-            sources.append(item)
+    missing = ~df_relationships["FromTableID"].isin(table_lookup.index) | \
+        ~df_relationships["ToTableID"].isin(table_lookup.index)
+    if missing.any():
+        row = df_relationships[missing].iloc[0]
+        raise KeyError(row["FromTableID"] if row["FromTableID"] not in table_lookup.index else row["ToTableID"])
 
-        return list(set(sources))
+    return pd.DataFrame({
+        "ID": df_relationships["ID"].to_numpy(),
+        "Source": df_relationships["FromTableID"].map(table_lookup).to_numpy(),
+        "Target": df_relationships["ToTableID"].map(table_lookup).to_numpy(),
+        "Transformation": "Model Relationship",
+        "DependencyType": "Model Relationship",
+    })
 
-    for _, row in df_partitions.iterrows():
 
-        table_name = row["TableName"]
-        m_expression = row.get("Expression", "") or row.get("QueryDefinition", "")
+def partition_frame_edges(df_partitions, model):
 
-        base_sources = extract_m_sources(m_expression)
+    empty = pd.Series("", index=df_partitions.index)
 
-        for src in base_sources:
-            lineage_rows.append({
-                "Source": f"SQL.{src}",
-                "Target": table_name,
-                "Transformation": "Power Query Source",
-                "DependencyType": "Source Mapping"
-            })
+    m_expressions = [
+        expression or query
+        for expression, query in zip(
+            df_partitions.get("Expression", empty),
+            df_partitions.get("QueryDefinition", empty)
+        )
+    ]
 
-    # --------------------------------------------------
-    # BUILD GRAPH
-    # --------------------------------------------------
+    sources = pd.DataFrame({
+        "ID": df_partitions["ID"].to_numpy(),
+        "Target": df_partitions["TableName"].to_numpy(),
+        "Source": [extract_m_sources(m) for m in m_expressions],
+    }).explode("Source").dropna(subset=["Source"])
 
-    df_lineage = pd.DataFrame(lineage_rows)
+    return pd.DataFrame({
+        "ID": sources["ID"].to_numpy(),
+        "Source": "SQL." + sources["Source"].astype(str).to_numpy(),
+        "Target": sources["Target"].to_numpy(),
+        "Transformation": "Power Query Source",
+        "DependencyType": "Source Mapping",
+    })
 
-    G = nx.DiGraph()
 
-    for _, row in df_lineage.iterrows():
-        G.add_edge(
-            row["Source"],
-            row["Target"],
-            transformation=row.get("Transformation", ""),
-            dependency=row.get("DependencyType", "")
-        )
+def derive_lineage(frames, model, only=None):
+    """
+    Every lineage edge as a frame of kind, ID, Source, Target,
+    Transformation and DependencyType, in the order measures, calculated
+    columns, relationships, partitions (and TMSCHEMA row order within each).
+    `only` optionally restricts each kind to a set of TMSCHEMA IDs.
+    """
+
+    df_columns = frames["columns"]
+    measure_tables = _measure_tables(frames, model)
+
+    sources = [
+        ("measures", frames["measures"],
+         lambda df: expression_edges(df, model["measure_name_col"], measure_tables)),
+        ("columns", df_columns[df_columns["Expression"] != ""],
+         lambda df: expression_edges(df, model["column_name_col"], measure_tables)),
+        ("relationships", frames["relationships"],
+         lambda df: relationship_frame_edges(df, model)),
+        ("partitions", frames["partitions"],
+         lambda df: partition_frame_edges(df, model)),
+    ]
+
+    edges = []
+
+    for kind, df, rule in sources:
+
+        if only is not None:
+            df = df[df["ID"].isin(only.get(kind, ()))]
+
+        if df.empty:
+            continue
+
+        kind_edges = rule(df)
+        kind_edges.insert(0, "kind", kind)
+        edges.append(kind_edges)
+
+    if not edges:
+        return pd.DataFrame(columns=["kind", "ID"] + EDGE_COLUMNS)
+
+    return pd.concat(edges, ignore_index=True)
+
+
+# --------------------------------------------------
+# BUILD GRAPH
+# --------------------------------------------------
+
+def build_graph(df_lineage):
+    """
+    Interned LineageGraph of the lineage rows: node names and edge
+    transformations are stored once, edges as integer arrays.
+    """
+
+    if df_lineage.empty:
+        return LineageGraph.empty()
+
+    empty = pd.Series("", index=df_lineage.index)
+
+    return LineageGraph.from_edges(
+        df_lineage["Source"].to_numpy(),
+        df_lineage["Target"].to_numpy(),
+        df_lineage.get("Transformation", empty).to_numpy(),
+        df_lineage.get("DependencyType", empty).to_numpy(),
+    )
+
+
+def build_lineage_from_frames(frames):
+
+    model = prepare_model(frames)
+
+    edges = derive_lineage(frames, model)
+
+    df_lineage = edges[EDGE_COLUMNS] if not edges.empty else pd.DataFrame()
+
+    return df_lineage, build_graph(df_lineage)
+
+
+def build_lineage(incremental=True, source=None):
+    """
+    Semantic model lineage as (df_lineage, G).
+
+    By default the TMSCHEMA rows and their derived edges are kept in the
+    local semantic snapshot and only changed rows are re-fetched.
+    """
+
+    source = source or get_model_source()
+
+    if incremental:
+        from semantic_snapshot import sync_semantic_model, load_semantic_lineage, semantic_snapshot_path
+
+        sync_semantic_model(source)
+        df_lineage = load_semantic_lineage(semantic_snapshot_path(source.name))
+
+        return df_lineage, build_graph(df_lineage)
 
-    return df_lineage, G
\ No newline at end of file
+    return build_lineage_from_frames(fetch_model(source))
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+import pandas as pd
+
+from config import LINEAGE_CACHE_TTL_SECONDS, LINEAGE_SHARED_DIR, PBI_CONNECTION_STRING, PBI_MODEL_SOURCE
+
+
+# --------------------------------------------------
+# PROCESS-WIDE CACHE
+# --------------------------------------------------
+
+class SharedLineageCache:
+    """
+    Named values shared by every session of the process, loaded once per
+    `ttl` seconds. Callers get the same object, not a copy, and must treat
+    it as read-only.
+
+    Each name loads under its own lock, so concurrent sessions wait for one
+    load instead of running their own. Once a value has expired, sessions
+    keep getting the old one while a single session reloads it.
+    """
+
+    def __init__(self, ttl=LINEAGE_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._entries = {}      # name -> (value, loaded at)
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def _name_lock(self, name):
+        with self._lock:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name, loader, ttl=None):
+
+        ttl = self.ttl if ttl is None else ttl
+        entry = self._entries.get(name)
+
+        if entry is not None and time.time() - entry[1] <= ttl:
+            self.hits += 1
+            return entry[0]
+
+        lock = self._name_lock(name)
+
+        # Expired: serve the old value while another session reloads it
+        if entry is not None and not lock.acquire(blocking=False):
+            self.hits += 1
+            return entry[0]
+
+        if entry is None:
+            lock.acquire()
+
+        try:
+            entry = self._entries.get(name)
+            if entry is not None and time.time() - entry[1] <= ttl:
+                self.hits += 1
+                return entry[0]
+
+            value = loader()
+            self._entries[name] = (value, time.time())
+            self.loads += 1
+
+            return value
+
+        finally:
+            lock.release()
+
+    def invalidate(self, name=None):
+        """
+        Drop one value (or all); the next get() loads it again.
+        """
+
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    def stats(self):
+        now = time.time()
+        return {
+            "hits": self.hits,
+            "loads": self.loads,
+            "ages": {name: round(now - loaded_at, 1) for name, (_, loaded_at) in self._entries.items()},
+        }
+
+
+_cache = SharedLineageCache()
+
+
+def get_shared_cache():
+    return _cache
+
+
+# --------------------------------------------------
+# SEMANTIC LINEAGE MODEL
+# --------------------------------------------------
+
+class SemanticLineage:
+    """
+    Semantic lineage shared by all sessions: the interned graph, a version
+    for the reachability index, and the sorted node list for the picker.
+    The lineage frame is only rebuilt from the graph when asked for if the
+    model was mapped from another process.
+    """
+
+    def __init__(self, graph, version, df_lineage=None):
+        self.graph = graph
+        self.version = version
+        self.nodes = sorted(graph.nodes)
+        self._df_lineage = df_lineage
+
+    @property
+    def df_lineage(self):
+        if self._df_lineage is None:
+            self._df_lineage = self.graph.to_frame()
+        return self._df_lineage
+
+
+def lineage_version(df_lineage):
+    return int(pd.util.hash_pandas_object(df_lineage, index=False).sum())
+
+
+def _published_dir(name, shared_dir):
+    return os.path.join(shared_dir, name)
+
+
+def publish_graph(name, graph, version, shared_dir=LINEAGE_SHARED_DIR):
+    """
+    Write a graph where other worker processes can map it. The directory
+    is swapped in whole, so readers never see a partial graph.
+    """
+
+    final_dir = _published_dir(name, shared_dir)
+    work_dir = f"{final_dir}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    try:
+        graph.save(work_dir)
+
+        with open(os.path.join(work_dir, "published.json"), "w", encoding="utf-8") as f:
+            json.dump({"version": version, "published_at": time.time()}, f)
+
+        # The old directory may still be mapped by readers: move it aside
+        # first, its files stay valid until every map is closed
+        retired_dir = f"{final_dir}.{os.getpid()}.{time.time_ns()}.retired"
+        if os.path.exists(final_dir):
+            os.replace(final_dir, retired_dir)
+        os.replace(work_dir, final_dir)
+
+    except OSError:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+
+    shutil.rmtree(retired_dir, ignore_errors=True)
+
+
+def open_published_graph(name, max_age, shared_dir=LINEAGE_SHARED_DIR):
+    """
+    (graph, version) published by any process within max_age seconds, with
+    the arrays memory-mapped, or None.
+    """
+
+    from lineage_graph import LineageGraph
+
+    directory = _published_dir(name, shared_dir)
+
+    try:
+        with open(os.path.join(directory, "published.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if time.time() - meta["published_at"] > max_age:
+            return None
+        return LineageGraph.load(directory, mmap=True), meta["version"]
+    except (OSError, ValueError, KeyError, EOFError):
+        return None
+
+
+def unpublish_graph(name, shared_dir=LINEAGE_SHARED_DIR):
+    shutil.rmtree(_published_dir(name, shared_dir), ignore_errors=True)
+
+
+def semantic_name(source=None):
+    """
+    Cache entry and published directory of a model: 'semantic_' plus a
+    hash of its source spec (see dmv_source.get_model_source; default
+    PBI_MODEL_SOURCE) or of a DmvSource's directory / connection string /
+    name. The spec is hashed since a connection string may hold credentials.
+    """
+
+    if source is None:
+        source = PBI_MODEL_SOURCE
+
+    if isinstance(source, str):
+        spec = source or PBI_CONNECTION_STRING
+    else:
+        spec = getattr(source, "directory", None) or getattr(source, "conn_str", None) or source.name
+
+    return "semantic_" + hashlib.sha256(spec.encode("utf-8")).hexdigest()[:16]
+
+
+def get_semantic_lineage(source=None, ttl=None, shared_dir=LINEAGE_SHARED_DIR):
+    """
+    The process-wide SemanticLineage of a model `source` (a spec or a
+    DmvSource, default PBI_MODEL_SOURCE); each model is cached on its own.
+    With a shared directory, a graph another worker published within the
+    TTL is mapped instead of rebuilt, and a graph built here is published
+    for the others.
+    """
+
+    ttl = _cache.ttl if ttl is None else ttl
+    name = semantic_name(source)
+
+    def load():
+
+        if shared_dir:
+            published = open_published_graph(name, ttl, shared_dir)
+            if published is not None:
+                return SemanticLineage(*published)
+
+        from dmv_source import get_model_source
+        from lineage_builder import build_lineage
+
+        if source is None or isinstance(source, str):
+            model_source = get_model_source(PBI_MODEL_SOURCE if source is None else source)
+        else:
+            model_source = source
+
+        df_lineage, graph = build_lineage(source=model_source)
+        model = SemanticLineage(graph, lineage_version(df_lineage), df_lineage)
+
+        if shared_dir:
+            try:
+                publish_graph(name, graph, model.version, shared_dir)
+            except OSError:
+                pass
+
+        return model
+
+    return _cache.get(name, load, ttl)
+
+
+def invalidate_semantic_lineage(source=None, shared_dir=LINEAGE_SHARED_DIR):
+    """
+    Force the next get_semantic_lineage() of `source` to rebuild, in this
+    process and, with a shared directory, in every other worker.
+    """
+
+    name = semantic_name(source)
+
+    _cache.invalidate(name)
+
+    if shared_dir:
+        unpublish_graph(name, shared_dir)
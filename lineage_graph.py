@@ -0,0 +1,504 @@
+import json
+import os
+import pickle
+import sys
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+
+# --------------------------------------------------
+# VIEWS (NETWORKX-STYLE)
+# --------------------------------------------------
+
+class _NodeView:
+    """
+    G.nodes: iterable, sized and supports `in`, in insertion order.
+    """
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __iter__(self):
+        return iter(self._graph._names)
+
+    def __len__(self):
+        return len(self._graph._names)
+
+    def __contains__(self, node):
+        return node in self._graph
+
+    def __call__(self):
+        return self
+
+
+class _EdgeView:
+    """
+    G.edges and G.edges(data=True), in the order a networkx DiGraph built
+    from the same edges would list them.
+    """
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __iter__(self):
+        return self._graph._iter_edges(False)
+
+    def __len__(self):
+        return self._graph.number_of_edges()
+
+    def __contains__(self, edge):
+        return self._graph.has_edge(*edge)
+
+    def __call__(self, data=False):
+        return self._graph._iter_edges(data)
+
+
+class _AdjacencyView(Mapping):
+    """
+    G.succ / G.adj (successors) and G.pred (predecessors): node ->
+    {neighbour: edge data}, read-only, as networkx algorithms index them.
+    """
+
+    def __init__(self, graph, reverse=False):
+        self._graph = graph
+        self._reverse = reverse
+
+    def __getitem__(self, node):
+
+        graph = self._graph
+
+        if self._reverse:
+            return {source: graph.get_edge_data(source, node) for source in graph.predecessors(node)}
+
+        i = graph.node_id(node)
+        start, end = int(graph._out_ptr[i]), int(graph._out_ptr[i + 1])
+        targets = graph._out_idx[start:end].tolist()
+
+        return {
+            graph._names[target]: graph._edge_data(position)
+            for position, target in zip(range(start, end), targets)
+        }
+
+    def __iter__(self):
+        return iter(self._graph._names)
+
+    def __len__(self):
+        return len(self._graph._names)
+
+    def __contains__(self, node):
+        return node in self._graph
+
+
+# --------------------------------------------------
+# INTERNED GRAPH
+# --------------------------------------------------
+
+# Integer arrays of a LineageGraph, as saved to / mapped from disk
+ARRAY_ATTRIBUTES = ("_out_ptr", "_out_idx", "_rank", "_in_ptr", "_in_idx", "_transformation", "_dependency")
+
+
+class LineageGraph:
+    """
+    Read-only directed lineage graph over interned node IDs.
+
+    Node names are stored once, in a table indexed by int32 IDs. Edges are
+    kept as CSR (successors) and CSC (predecessors) int32 arrays. Edge
+    transformations and dependency types are int32 codes into string
+    pools, so a DAX expression shared by many edges is held once. The
+    graph pickles as a handful of arrays, not one dict per edge.
+
+    The networkx methods the lineage code uses (nodes, edges, successors,
+    predecessors, subgraph, has_edge, ...) are provided with the same
+    semantics, along with the read-only protocol networkx traversals rely
+    on (is_directed, neighbors, succ / pred / adj, G[node]), so
+    nx.ancestors() or nx.descendants() run on it directly. to_networkx()
+    builds a real DiGraph for anything else.
+    """
+
+    def __init__(self, names, sources, targets, transformations, transformation_pool,
+                 dependencies, dependency_pool):
+
+        self._names = list(names)
+        self._index = None
+
+        sources = np.asarray(sources, dtype=np.int32)
+        targets = np.asarray(targets, dtype=np.int32)
+        node_count = len(self._names)
+
+        # Edges arrive in insertion order, which both adjacencies keep
+        # within a node, as networkx does
+
+        # CSR: edges grouped by source
+        order = np.argsort(sources, kind="stable")
+        self._out_ptr = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=node_count), out=self._out_ptr[1:])
+        self._out_idx = targets[order]
+        self._rank = order.astype(np.int32)
+        self._transformation = np.asarray(transformations, dtype=np.int32)[order]
+        self._dependency = np.asarray(dependencies, dtype=np.int32)[order]
+
+        # CSC: edges grouped by target
+        in_order = np.argsort(targets, kind="stable")
+        self._in_ptr = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(targets, minlength=node_count), out=self._in_ptr[1:])
+        self._in_idx = sources[in_order]
+
+        self._transformation_pool = transformation_pool
+        self._dependency_pool = dependency_pool
+
+    @classmethod
+    def from_edges(cls, sources, targets, transformations, dependencies):
+        """
+        Graph of the given edge columns. Repeated (source, target) pairs
+        keep their first position and their last attributes, like
+        DiGraph.add_edges_from.
+        """
+
+        sources = np.asarray(sources, dtype=object)
+        targets = np.asarray(targets, dtype=object)
+
+        # Nodes in first-appearance order, source before target
+        endpoints = np.empty(len(sources) * 2, dtype=object)
+        endpoints[0::2] = sources
+        endpoints[1::2] = targets
+        codes, names = pd.factorize(endpoints, use_na_sentinel=False)
+        source_ids, target_ids = codes[0::2], codes[1::2]
+
+        pair = source_ids.astype(np.int64) * max(len(names), 1) + target_ids
+        _, first = np.unique(pair, return_index=True)
+        _, last_reversed = np.unique(pair[::-1], return_index=True)
+        last = len(pair) - 1 - last_reversed
+
+        position = np.argsort(first, kind="stable")
+        first, last = first[position], last[position]
+
+        transformation_codes, transformation_pool = pd.factorize(
+            np.asarray(transformations, dtype=object)[last], use_na_sentinel=False
+        )
+        dependency_codes, dependency_pool = pd.factorize(
+            np.asarray(dependencies, dtype=object)[last], use_na_sentinel=False
+        )
+
+        return cls(
+            names,
+            source_ids[first],
+            target_ids[first],
+            transformation_codes,
+            list(transformation_pool),
+            dependency_codes,
+            list(dependency_pool),
+        )
+
+    @classmethod
+    def empty(cls):
+        return cls([], [], [], [], [], [], [])
+
+    # -------------------- interning --------------------
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_index"] = None
+        return state
+
+    def _ids(self):
+        if self._index is None:
+            self._index = {name: position for position, name in enumerate(self._names)}
+        return self._index
+
+    def node_id(self, node):
+        return self._ids()[node]
+
+    def _edge_data(self, position):
+        return {
+            "transformation": self._transformation_pool[self._transformation[position]],
+            "dependency": self._dependency_pool[self._dependency[position]],
+        }
+
+    # -------------------- networkx-style reads --------------------
+
+    @property
+    def nodes(self):
+        return _NodeView(self)
+
+    @property
+    def edges(self):
+        return _EdgeView(self)
+
+    def __contains__(self, node):
+        try:
+            return node in self._ids()
+        except TypeError:
+            return False
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def number_of_nodes(self):
+        return len(self._names)
+
+    def has_node(self, node):
+        return node in self
+
+    def is_directed(self):
+        return True
+
+    def is_multigraph(self):
+        return False
+
+    @property
+    def succ(self):
+        return _AdjacencyView(self)
+
+    @property
+    def adj(self):
+        return _AdjacencyView(self)
+
+    @property
+    def pred(self):
+        return _AdjacencyView(self, reverse=True)
+
+    # Some networkx algorithms read the adjacency through these names
+    _succ = succ
+    _adj = adj
+    _pred = pred
+
+    def __getitem__(self, node):
+        return self.succ[node]
+
+    def number_of_edges(self):
+        return len(self._out_idx)
+
+    def _iter_edges(self, data):
+
+        names = self._names
+        ptr = self._out_ptr.tolist()
+        targets = self._out_idx.tolist()
+
+        for node in range(len(names)):
+            for position in range(ptr[node], ptr[node + 1]):
+                if data:
+                    yield names[node], names[targets[position]], self._edge_data(position)
+                else:
+                    yield names[node], names[targets[position]]
+
+    def successors(self, node):
+        i = self.node_id(node)
+        names = self._names
+        return iter([names[j] for j in self._out_idx[self._out_ptr[i]:self._out_ptr[i + 1]].tolist()])
+
+    def predecessors(self, node):
+        i = self.node_id(node)
+        names = self._names
+        return iter([names[j] for j in self._in_idx[self._in_ptr[i]:self._in_ptr[i + 1]].tolist()])
+
+    def neighbors(self, node):
+        return self.successors(node)
+
+    def out_degree(self, node):
+        i = self.node_id(node)
+        return int(self._out_ptr[i + 1] - self._out_ptr[i])
+
+    def in_degree(self, node):
+        i = self.node_id(node)
+        return int(self._in_ptr[i + 1] - self._in_ptr[i])
+
+    def _edge_position(self, source, target):
+
+        ids = self._ids()
+        if source not in ids or target not in ids:
+            return None
+
+        i, j = ids[source], ids[target]
+        start, end = self._out_ptr[i], self._out_ptr[i + 1]
+        hits = np.flatnonzero(self._out_idx[start:end] == j)
+
+        return int(start + hits[0]) if len(hits) else None
+
+    def has_edge(self, source, target):
+        return self._edge_position(source, target) is not None
+
+    def get_edge_data(self, source, target, default=None):
+        position = self._edge_position(source, target)
+        return default if position is None else self._edge_data(position)
+
+    # -------------------- traversal --------------------
+
+    def _reach(self, node, ptr, idx):
+
+        start = self.node_id(node)
+        seen = np.zeros(len(self._names), dtype=bool)
+        seen[start] = True
+        frontier = [start]
+        ptr = ptr.tolist()
+
+        while frontier:
+            next_frontier = []
+            for i in frontier:
+                for j in idx[ptr[i]:ptr[i + 1]].tolist():
+                    if not seen[j]:
+                        seen[j] = True
+                        next_frontier.append(j)
+            frontier = next_frontier
+
+        seen[start] = False
+
+        return {self._names[i] for i in np.flatnonzero(seen).tolist()}
+
+    def ancestors(self, node):
+        """
+        Same set as nx.ancestors(G, node).
+        """
+        return self._reach(node, self._in_ptr, self._in_idx)
+
+    def descendants(self, node):
+        """
+        Same set as nx.descendants(G, node).
+        """
+        return self._reach(node, self._out_ptr, self._out_idx)
+
+    def subgraph(self, nodes):
+        """
+        Graph induced by `nodes`, keeping this graph's node and edge order.
+        The string pools are shared, not copied.
+        """
+
+        ids = self._ids()
+
+        keep = np.zeros(len(self._names), dtype=bool)
+        keep[[ids[node] for node in nodes if node in ids]] = True
+
+        new_id = np.cumsum(keep, dtype=np.int64) - 1
+
+        edge_sources = np.repeat(np.arange(len(self._names), dtype=np.int32), np.diff(self._out_ptr))
+        kept = np.flatnonzero(keep[edge_sources] & keep[self._out_idx])
+        kept = kept[np.argsort(self._rank[kept], kind="stable")]
+
+        return LineageGraph(
+            [name for name, kept_node in zip(self._names, keep.tolist()) if kept_node],
+            new_id[edge_sources[kept]],
+            new_id[self._out_idx[kept]],
+            self._transformation[kept],
+            self._transformation_pool,
+            self._dependency[kept],
+            self._dependency_pool,
+        )
+
+    def to_frame(self):
+        """
+        Edges as a lineage frame (Source, Target, Transformation,
+        DependencyType), in edge order.
+        """
+
+        sources = np.repeat(np.arange(len(self._names)), np.diff(self._out_ptr))
+        names = np.asarray(self._names, dtype=object)
+
+        return pd.DataFrame({
+            "Source": names[sources],
+            "Target": names[self._out_idx],
+            "Transformation": np.asarray(self._transformation_pool, dtype=object)[self._transformation],
+            "DependencyType": np.asarray(self._dependency_pool, dtype=object)[self._dependency],
+        })
+
+    # -------------------- files --------------------
+
+    def save(self, directory):
+        """
+        Write the graph as one .npy file per array plus the string tables,
+        so load(mmap=True) can map the arrays instead of reading them.
+        """
+
+        os.makedirs(directory, exist_ok=True)
+
+        for name in ARRAY_ATTRIBUTES:
+            np.save(os.path.join(directory, f"{name.lstrip('_')}.npy"), getattr(self, name))
+
+        with open(os.path.join(directory, "strings.pkl"), "wb") as f:
+            pickle.dump(
+                (self._names, self._transformation_pool, self._dependency_pool),
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL
+            )
+
+        with open(os.path.join(directory, "graph.json"), "w", encoding="utf-8") as f:
+            json.dump({"nodes": self.number_of_nodes(), "edges": self.number_of_edges()}, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+        Graph written by save(). With mmap the arrays are read-only views of
+        the files: processes loading the same directory share the pages
+        through the OS page cache instead of each holding a copy.
+        """
+
+        graph = cls.__new__(cls)
+
+        for name in ARRAY_ATTRIBUTES:
+            setattr(graph, name, np.load(
+                os.path.join(directory, f"{name.lstrip('_')}.npy"),
+                mmap_mode="r" if mmap else None
+            ))
+
+        with open(os.path.join(directory, "strings.pkl"), "rb") as f:
+            graph._names, graph._transformation_pool, graph._dependency_pool = pickle.load(f)
+
+        graph._index = None
+
+        return graph
+
+    def to_networkx(self):
+
+        import networkx as nx
+
+        G = nx.DiGraph()
+        G.add_nodes_from(self._names)
+        G.add_edges_from(self._iter_edges(True))
+
+        return G
+
+    def memory_usage(self):
+        """
+        Approximate bytes held: arrays plus the distinct strings.
+        """
+
+        arrays = [getattr(self, name) for name in ARRAY_ATTRIBUTES]
+
+        strings = sum(
+            sys.getsizeof(text)
+            for pool in (self._names, self._transformation_pool, self._dependency_pool)
+            for text in pool
+        )
+
+        return sum(array.nbytes for array in arrays) + strings
+
+
+# --------------------------------------------------
+# NETWORKX-COMPATIBLE HELPERS
+# --------------------------------------------------
+
+def ancestors(G, node):
+    """
+    nx.ancestors() for a LineageGraph or any networkx graph.
+    """
+
+    if isinstance(G, LineageGraph):
+        return G.ancestors(node)
+
+    import networkx as nx
+    return nx.ancestors(G, node)
+
+
+def descendants(G, node):
+    """
+    nx.descendants() for a LineageGraph or any networkx graph.
+    """
+
+    if isinstance(G, LineageGraph):
+        return G.descendants(node)
+
+    import networkx as nx
+    return nx.descendants(G, node)
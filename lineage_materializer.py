@@ -0,0 +1,575 @@
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from config import LINEAGE_MEMO_SIZE, LINEAGE_TABLE_MEMO_SIZE, MODULE_READ_CHUNK, STATEMENT_SLOW_SECONDS
+from fetch_pipeline import run_streaming
+from metadata_snapshot import ensure_snapshot, get_state, open_snapshot
+from parallel_extract import map_modules
+from parse_cache import definition_key
+from sql_lineage import LINEAGE_COLUMNS, extract_module_report
+
+
+# --------------------------------------------------
+# EDGE TABLES (IN THE METADATA SNAPSHOT)
+# --------------------------------------------------
+
+EDGE_DDL = """
+CREATE TABLE IF NOT EXISTS module_lineage (
+    object_id      INTEGER NOT NULL,
+    seq            INTEGER NOT NULL,
+    object_name    TEXT,
+    object_type    TEXT,
+    target_table   TEXT,
+    target_column  TEXT,
+    source_columns TEXT,
+    transformation TEXT,
+    PRIMARY KEY (object_id, seq)
+);
+CREATE TABLE IF NOT EXISTS column_edges (
+    object_id     INTEGER NOT NULL,
+    seq           INTEGER NOT NULL,
+    source_table  TEXT COLLATE NOCASE,
+    source_column TEXT COLLATE NOCASE,
+    target_table  TEXT COLLATE NOCASE,
+    target_column TEXT COLLATE NOCASE
+);
+CREATE INDEX IF NOT EXISTS column_edges_by_source ON column_edges (source_table, source_column);
+CREATE INDEX IF NOT EXISTS column_edges_by_target ON column_edges (target_table, target_column);
+CREATE INDEX IF NOT EXISTS column_edges_by_object ON column_edges (object_id);
+CREATE TABLE IF NOT EXISTS lineage_state (
+    object_id   INTEGER PRIMARY KEY,
+    modify_date TEXT
+);
+CREATE TABLE IF NOT EXISTS statement_diagnostics (
+    object_id    INTEGER NOT NULL,
+    statement_no INTEGER NOT NULL,
+    keyword      TEXT,
+    status       TEXT,
+    elapsed      REAL,
+    chars        INTEGER,
+    error        TEXT,
+    snippet      TEXT,
+    PRIMARY KEY (object_id, statement_no)
+);
+"""
+
+DIAGNOSTIC_COLUMNS = ["object_name", "statement_no", "keyword", "status", "elapsed", "chars", "error", "snippet"]
+
+_materialize_lock = threading.Lock()
+
+
+def split_source(source):
+    """
+    'SCHEMA.TABLE.COLUMN' -> ('SCHEMA.TABLE', 'COLUMN'). Sources without a
+    table part (literals, unqualified columns) get an empty table.
+    """
+
+    table, dot, column = source.rpartition(".")
+
+    if not dot:
+        return "", source
+
+    return table, column
+
+
+def _open(path):
+    store = open_snapshot(path)
+    store.executescript(EDGE_DDL)
+    return store
+
+
+def _stale_modules(store, object_ids=None):
+    """
+    IDs of views and procedures whose lineage is missing or out of date.
+    """
+
+    query = """
+        SELECT m.object_id
+        FROM modules m
+        LEFT JOIN lineage_state s ON s.object_id = m.object_id
+        WHERE m.type IN ('V', 'P')
+          AND (s.object_id IS NULL OR s.modify_date IS NOT m.modify_date)
+    """
+    params = []
+
+    if object_ids is not None:
+        object_ids = sorted(object_ids)
+        if not object_ids:
+            return []
+        query += f" AND m.object_id IN ({', '.join('?' for _ in object_ids)})"
+        params.extend(object_ids)
+
+    return [row[0] for row in store.execute(query + " ORDER BY m.object_id", params)]
+
+
+def _read_modules(store, object_ids):
+    return store.execute(
+        "SELECT object_id, schema_name, object_name, type_desc, modify_date, definition "
+        f"FROM modules WHERE object_id IN ({', '.join('?' for _ in object_ids)}) ORDER BY object_id",
+        object_ids
+    ).fetchall()
+
+
+def _dropped_modules(store):
+    return [row[0] for row in store.execute("""
+        SELECT s.object_id
+        FROM lineage_state s
+        LEFT JOIN modules m ON m.object_id = s.object_id
+        WHERE m.object_id IS NULL
+    """)]
+
+
+# --------------------------------------------------
+# MATERIALIZE
+# --------------------------------------------------
+
+def _forget_module(store, object_id):
+    store.execute("DELETE FROM module_lineage WHERE object_id = ?", (object_id,))
+    store.execute("DELETE FROM column_edges WHERE object_id = ?", (object_id,))
+    store.execute("DELETE FROM statement_diagnostics WHERE object_id = ?", (object_id,))
+
+
+def write_module_lineage(store, object_id, modify_date, lineage, statements=()):
+
+    _forget_module(store, object_id)
+
+    store.executemany(
+        "INSERT INTO module_lineage "
+        "(object_id, seq, object_name, object_type, target_table, target_column, source_columns, transformation) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (object_id, seq, row["object_name"], row["object_type"], row["target_table"],
+             row["target_column"], row["source_columns"], row["transformation"])
+            for seq, row in enumerate(lineage)
+        ]
+    )
+
+    store.executemany(
+        "INSERT INTO column_edges "
+        "(object_id, seq, source_table, source_column, target_table, target_column) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (object_id, seq, *split_source(source), row["target_table"], row["target_column"])
+            for seq, row in enumerate(lineage)
+            for source in row["source_list"]
+        ]
+    )
+
+    store.executemany(
+        "INSERT INTO statement_diagnostics "
+        "(object_id, statement_no, keyword, status, elapsed, chars, error, snippet) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (object_id, statement["index"], statement["keyword"], statement["status"],
+             statement["elapsed"], statement["chars"], statement["error"], statement["snippet"])
+            for statement in statements
+        ]
+    )
+
+    store.execute(
+        "INSERT OR REPLACE INTO lineage_state (object_id, modify_date) VALUES (?, ?)",
+        (object_id, modify_date)
+    )
+
+
+def _module_failure(outcome, definition):
+    """
+    Diagnostic row for a module whose whole extraction failed or timed out.
+    """
+
+    return {
+        "index": -1,
+        "keyword": None,
+        "status": "timeout" if outcome["status"] == "timeout" else "failed",
+        "elapsed": outcome["elapsed"],
+        "chars": len(definition or ""),
+        "error": outcome["error"],
+        "snippet": None,
+    }
+
+
+# --------------------------------------------------
+# EXTRACTION MEMO
+# --------------------------------------------------
+
+class _Memo:
+    """
+    Small thread-safe LRU. Stored values are shared between callers and
+    must be treated as read-only.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+# Module reports by (object_id, schema, name, type, definition hash): a
+# module re-synced with an unchanged definition (a new modify_date only)
+# is not parsed again
+_report_memo = _Memo(LINEAGE_MEMO_SIZE)
+
+# Lineage / diagnostics tables by (snapshot, object IDs, refreshed_at)
+_table_memo = _Memo(LINEAGE_TABLE_MEMO_SIZE)
+
+
+def get_extraction_memo():
+    return _report_memo
+
+
+def _report_key(module):
+    object_id, schema_name, object_name, type_desc, _, definition = module
+    return object_id, schema_name, object_name, type_desc, definition_key(definition or "")
+
+
+def _extract_modules(modules):
+    """
+    map_modules() outcomes of extract_module_report for the given module
+    rows, parsing only the modules whose definition is not memoized.
+    """
+
+    keys = [_report_key(module) for module in modules]
+    outcomes = [None] * len(modules)
+    pending = []
+
+    for position, key in enumerate(keys):
+        report = _report_memo.get(key)
+        if report is None:
+            pending.append(position)
+        else:
+            outcomes[position] = {"status": "ok", "result": report, "error": None, "elapsed": 0.0}
+
+    parsed = map_modules(
+        extract_module_report,
+        [modules[position][1:4] + (modules[position][5],) for position in pending],
+        sizes=[len(modules[position][5] or "") for position in pending]
+    )
+
+    for position, outcome in zip(pending, parsed):
+        outcomes[position] = outcome
+        if outcome["status"] == "ok":
+            _report_memo.put(keys[position], outcome["result"])
+
+    return outcomes
+
+
+def _write_outcomes(store, modules, outcomes):
+
+    for module, outcome in zip(modules, outcomes):
+        object_id, modify_date, definition = module[0], module[4], module[5]
+
+        if outcome["status"] == "ok":
+            report = outcome["result"]
+        else:
+            report = {"lineage": [], "statements": [_module_failure(outcome, definition)]}
+
+        write_module_lineage(store, object_id, modify_date, report["lineage"], report["statements"])
+
+
+def materialize_lineage(path=None, object_ids=None):
+    """
+    Walk every view and procedure in the snapshot (or only `object_ids`)
+    whose definition changed since it was last materialized, and persist
+    its column-level lineage. Returns the number of modules processed.
+    """
+
+    with _materialize_lock:
+
+        store = _open(path)
+
+        try:
+            stale = _stale_modules(store, object_ids)
+
+            # Definitions are read, parsed and written a chunk at a time, so
+            # only one chunk of definition text is in memory and finished
+            # chunks survive an interrupted run
+            for start in range(0, len(stale), MODULE_READ_CHUNK):
+                modules = _read_modules(store, stale[start:start + MODULE_READ_CHUNK])
+                _write_outcomes(store, modules, _extract_modules(modules))
+                store.commit()
+
+            if object_ids is None:
+                for object_id in _dropped_modules(store):
+                    _forget_module(store, object_id)
+                    store.execute("DELETE FROM lineage_state WHERE object_id = ?", (object_id,))
+
+            store.commit()
+
+        finally:
+            store.close()
+
+    return len(stale)
+
+
+def materialize_while_syncing(conn, path=None):
+    """
+    Sync the snapshot from the server and materialize every view and
+    procedure it fetches, parsing each fetched batch on the process pool
+    while the next batch is still being read, so the wall-clock time is
+    close to the slower of the two instead of their sum. Modules that were
+    already in the snapshot but never materialized are handled afterwards.
+    Returns the number of modules processed.
+    """
+
+    processed = 0
+    store = _open(path)
+
+    def consume(rows):
+        nonlocal processed
+        modules = [
+            (object_id, schema_name, object_name, type_desc, modify_date, definition)
+            for object_id, schema_name, object_name, obj_type, type_desc, modify_date, definition in rows
+            if obj_type in ("V", "P")
+        ]
+        if not modules:
+            return
+
+        outcomes = _extract_modules(modules)
+
+        # Each batch is written as soon as it is parsed, so only one batch
+        # of outcomes is held and finished batches survive an interrupted sync
+        with _materialize_lock:
+            _write_outcomes(store, modules, outcomes)
+            store.commit()
+
+        processed += len(modules)
+
+    try:
+        run_streaming(
+            lambda on_batch: ensure_snapshot(conn, path, max_age=0, on_batch=on_batch),
+            consume
+        )
+    finally:
+        store.close()
+
+    return processed + materialize_lineage(path)
+
+
+# --------------------------------------------------
+# QUERIES
+# --------------------------------------------------
+
+def load_module_lineage(object_ids, path=None):
+    """
+    Materialized lineage rows for the given modules, in extraction order.
+    """
+
+    object_ids = sorted(object_ids)
+
+    if not object_ids:
+        return pd.DataFrame(columns=LINEAGE_COLUMNS)
+
+    store = _open(path)
+
+    try:
+        return pd.read_sql(
+            f"SELECT {', '.join(LINEAGE_COLUMNS)} FROM module_lineage "
+            f"WHERE object_id IN ({', '.join('?' for _ in object_ids)}) "
+            "ORDER BY object_id, seq",
+            store,
+            params=object_ids
+        )
+    finally:
+        store.close()
+
+
+def load_statement_diagnostics(object_ids, path=None, slow_seconds=STATEMENT_SLOW_SECONDS):
+    """
+    Statements of the given modules that were not parsed (failed, timed out,
+    over the size budget, unsupported) or took longer than `slow_seconds`.
+    """
+
+    object_ids = sorted(object_ids)
+
+    if not object_ids:
+        return pd.DataFrame(columns=DIAGNOSTIC_COLUMNS)
+
+    store = _open(path)
+
+    try:
+        return pd.read_sql(
+            f"""
+            SELECT m.schema_name || '.' || m.object_name AS object_name,
+                   d.statement_no, d.keyword, d.status, d.elapsed, d.chars, d.error, d.snippet
+            FROM statement_diagnostics d
+            JOIN modules m ON m.object_id = d.object_id
+            WHERE d.object_id IN ({', '.join('?' for _ in object_ids)})
+              AND (d.status NOT IN ('ok', 'skipped') OR d.elapsed >= ?)
+            ORDER BY d.object_id, d.statement_no
+            """,
+            store,
+            params=object_ids + [slow_seconds]
+        )
+    finally:
+        store.close()
+
+
+def module_lineage_tables(object_ids, path=None):
+    """
+    (lineage, diagnostics) tables for the given modules, materializing
+    the stale ones first. Kept in memory until the snapshot is refreshed,
+    so reruns that only change a filter re-filter these frames instead of
+    touching the store. The frames are shared and must not be modified.
+    """
+
+    store = open_snapshot(path)
+    try:
+        version = get_state(store, "refreshed_at")
+    finally:
+        store.close()
+
+    key = (path, frozenset(object_ids), version)
+    tables = _table_memo.get(key)
+
+    if tables is None:
+        materialize_lineage(path, object_ids=object_ids)
+        tables = (
+            load_module_lineage(object_ids, path),
+            load_statement_diagnostics(object_ids, path),
+        )
+        _table_memo.put(key, tables)
+
+    return tables
+
+
+def _query_edges(where, params, path):
+
+    store = _open(path)
+
+    try:
+        return pd.read_sql(
+            """
+            SELECT e.source_table, e.source_column, e.target_table, e.target_column,
+                   l.transformation, l.object_name, l.object_type
+            FROM column_edges e
+            JOIN module_lineage l ON l.object_id = e.object_id AND l.seq = e.seq
+            WHERE """ + where + """
+            ORDER BY e.object_id, e.seq
+            """,
+            store,
+            params=params
+        )
+    finally:
+        store.close()
+
+
+def iter_column_edges(path=None, object_ids=None, chunk_size=100_000):
+    """
+    Every materialized column edge (or those of `object_ids`), as a stream
+    of DataFrames of at most `chunk_size` rows, for exporting to the
+    lineage store without holding them all in memory.
+    """
+
+    where, params = "1 = 1", []
+
+    if object_ids is not None:
+        object_ids = sorted(object_ids)
+        if not object_ids:
+            return
+        where = f"e.object_id IN ({', '.join('?' for _ in object_ids)})"
+        params = object_ids
+
+    store = _open(path)
+
+    try:
+        cursor = store.execute(
+            """
+            SELECT e.source_table, e.source_column, e.target_table, e.target_column,
+                   l.transformation, l.object_name, l.object_type
+            FROM column_edges e
+            JOIN module_lineage l ON l.object_id = e.object_id AND l.seq = e.seq
+            WHERE """ + where + """
+            ORDER BY e.object_id, e.seq
+            """,
+            params
+        )
+        columns = [column[0] for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield pd.DataFrame(rows, columns=columns)
+    finally:
+        store.close()
+
+
+def downstream_edges(source_table, source_column=None, path=None):
+    """
+    Edges reading from a table (and optionally one of its columns).
+    """
+
+    where = "e.source_table = ?"
+    params = [source_table]
+
+    if source_column:
+        where += " AND e.source_column = ?"
+        params.append(source_column)
+
+    return _query_edges(where, params, path)
+
+
+def upstream_edges(target_table, target_column=None, path=None):
+    """
+    Edges writing into a table (and optionally one of its columns).
+    """
+
+    where = "e.target_table = ?"
+    params = [target_table]
+
+    if target_column:
+        where += " AND e.target_column = ?"
+        params.append(target_column)
+
+    return _query_edges(where, params, path)
+
+
+def source_columns(path=None, roots_only=True):
+    """
+    Distinct (source_table, source_column) pairs read by materialized
+    modules. With roots_only, only columns of tables that no module writes
+    (the landing / ODS layer), which is where column lineage searches start.
+    """
+
+    query = """
+        SELECT DISTINCT e.source_table, e.source_column
+        FROM column_edges e
+        WHERE e.source_table <> '' AND e.source_column IS NOT NULL
+    """
+
+    if roots_only:
+        query += " AND NOT EXISTS (SELECT 1 FROM column_edges t WHERE t.target_table = e.source_table)"
+
+    store = _open(path)
+
+    try:
+        return store.execute(query + " ORDER BY e.source_table, e.source_column").fetchall()
+    finally:
+        store.close()
@@ -1,131 +1,510 @@
+import threading
+from collections import OrderedDict
+
 import pandas as pd
-import sqlglot
-import re
+from sqlglot import exp
 from sqlglot.expressions import Select, Alias, Column
 
+from config import LINEAGE_HOP_MEMO_SIZE, LINEAGE_MAX_DEPTH
+from metadata_snapshot import ensure_snapshot, get_state, iter_modules, open_snapshot
+from module_index import get_module_index
+from parallel_extract import map_modules
+from statement_splitter import parse_statements
+
+
+# --------------------------------------------------
+# STATEMENT TARGETS
+# --------------------------------------------------
+
+def _table_name(table):
+
+    # #temp tables and @table variables keep their prefix
+    if isinstance(table.this, exp.Parameter):
+        return f"@{table.this.name}"
+    if table.this.args.get("temporary"):
+        return f"#{table.name}"
+
+    return f"{table.db}.{table.name}" if table.db else table.name
+
+
+def _is_temporary(name):
+    return name.startswith(("#", "@"))
 
-def extract_column_usage(sql_text, source_column):
+
+def _branch_selects(query):
     """
-    Extract column transformations where source_column is used.
+    SELECTs whose projections a query returns: the query itself, or every
+    branch of a UNION / EXCEPT / INTERSECT.
     """
 
-    lineage = []
+    if isinstance(query, exp.Subquery):
+        return _branch_selects(query.this)
 
-    try:
-        parsed = sqlglot.parse_one(sql_text, read="tsql")
+    if isinstance(query, exp.Union):
+        return _branch_selects(query.this) + _branch_selects(query.expression)
+
+    return [query] if isinstance(query, exp.Select) else []
 
-        for select in parsed.find_all(Select):
 
-            for expression in select.expressions:
+def _written_table(target):
+    """
+    (table name, column list or None) of an INSERT / CREATE target, which
+    is a Table or a Schema wrapping one with explicit columns.
+    """
 
-                # Case 1: Expression with alias
-                if isinstance(expression, Alias):
+    if isinstance(target, exp.Schema):
+        return _table_name(target.this), [column.name for column in target.expressions]
 
-                    alias_name = expression.alias
-                    inner_expr = expression.this
+    if isinstance(target, exp.Table):
+        return _table_name(target), None
 
-                    used_columns = [
-                        col.name.upper()
-                        for col in inner_expr.find_all(Column)
-                    ]
+    return None, None
 
-                    if source_column.upper() in used_columns:
-                        lineage.append({
-                            "object_column": alias_name,
-                            "transformation": inner_expr.sql()
-                        })
 
-                # Case 2: Direct column
-                elif isinstance(expression, Column):
+def _feeding_selects(parsed):
+    """
+    (select, target table, target columns) for every SELECT whose rows are
+    written somewhere: INSERT ... SELECT, SELECT ... INTO, CREATE TABLE AS
+    and the query of a CREATE VIEW. A statement that is just a query
+    yields its own SELECTs with no target.
+    """
 
-                    if expression.name.upper() == source_column.upper():
-                        lineage.append({
-                            "object_column": expression.name,
-                            "transformation": expression.sql()
-                        })
+    if isinstance(parsed, exp.Create):
+        table, columns = _written_table(parsed.this)
+        target = table if (parsed.args.get("kind") or "").upper() == "TABLE" else None
+        for select in _branch_selects(parsed.expression):
+            yield select, target, columns
+        return
 
-    except Exception:
-        pass
+    for select in _branch_selects(parsed):
+        into = select.args.get("into")
+        yield select, _table_name(into.this) if into else None, None
 
-    return lineage
+    for insert in parsed.find_all(exp.Insert):
+        if isinstance(insert.parent, exp.When):
+            continue
+        table, columns = _written_table(insert.this)
+        for select in _branch_selects(insert.expression):
+            yield select, table, columns
 
 
-def extract_insert_target(sql_text):
+def _assignments(parsed):
     """
-    Extract INSERT INTO target schema and table using regex.
+    (target table, target column, value expression) for every column set
+    by an UPDATE or by a MERGE's UPDATE / INSERT clauses.
     """
 
-    match = re.search(
-        r"INSERT\s+INTO\s+\[?(\w+)\]?\.\[?(\w+)\]?",
-        sql_text,
-        re.IGNORECASE
-    )
+    for update in parsed.find_all(exp.Update):
 
-    if match:
-        return match.group(1), match.group(2)
+        if isinstance(update.parent, exp.When):
+            continue
 
-    return None, None
+        # UPDATE t SET ... FROM dbo.TABLE t updates the aliased table
+        target = update.this
+        from_clause = update.args.get("from")
+        tables = [from_clause.this] if from_clause else []
+        tables += [join.this for join in update.args.get("joins") or []]
+
+        for table in tables:
+            if isinstance(table, exp.Table) and table.alias == target.name and not target.db:
+                target = table
+
+        for assignment in update.expressions:
+            yield _table_name(target), assignment.this.name, assignment.expression
+
+    for merge in parsed.find_all(exp.Merge):
+
+        target = _table_name(merge.this)
+
+        for when in merge.expressions:
 
+            action = when.args.get("then")
 
-def get_full_column_lineage(conn, schema, table, column):
+            if isinstance(action, exp.Update):
+                for assignment in action.expressions:
+                    yield target, assignment.this.name, assignment.expression
+
+            elif isinstance(action, exp.Insert) and isinstance(action.expression, exp.Tuple):
+                columns = action.this.expressions if isinstance(action.this, (exp.Tuple, exp.Schema)) else []
+                for column, value in zip(columns, action.expression.expressions):
+                    yield target, column.name, value
+
+
+# --------------------------------------------------
+# COLUMN RESOLUTION
+# --------------------------------------------------
+
+SCOPE_TYPES = (exp.Select, exp.Update, exp.Merge)
+
+
+def _relations(scope, ctes):
     """
-    Returns full column-level lineage for given ODS table + column
+    Alias -> relation of every table and derived table a SELECT, UPDATE or
+    MERGE reads. A relation is a table name as _table_name() writes it, a
+    CTE name or a derived table alias, upper-cased.
     """
 
-    query = f"""
-    SELECT
-        s.name AS schema_name,
-        o.name AS object_name,
-        o.type_desc,
-        m.definition
-    FROM sys.sql_modules m
-    JOIN sys.objects o ON m.object_id = o.object_id
-    JOIN sys.schemas s ON o.schema_id = s.schema_id
-    WHERE m.definition LIKE '%{table}%'
+    from_clause = scope.args.get("from")
+    items = [from_clause.this] if from_clause else []
+
+    if isinstance(scope, exp.Update):
+        items.insert(0, scope.this)
+    elif isinstance(scope, exp.Merge):
+        items = [scope.this, scope.args.get("using")]
+
+    # UPDATE ... FROM keeps its joins on the FROM table
+    joins = list(scope.args.get("joins") or [])
+    for item in items:
+        if isinstance(item, exp.Table):
+            joins += item.args.get("joins") or []
+
+    items += [join.this for join in joins]
+
+    relations = {}
+
+    for item in items:
+        if isinstance(item, exp.Table):
+            name = item.name.upper()
+            relation = name if not item.db and name in ctes else _table_name(item).upper()
+            relations[(item.alias or item.name).upper()] = relation
+        elif isinstance(item, exp.Subquery) and item.alias:
+            relations[item.alias.upper()] = item.alias.upper()
+
+    return relations
+
+
+def _column_relations(column, ctes, scopes):
+    """
+    Relations a column may belong to. Its qualifier is looked up in the
+    FROM / JOIN aliases of the nearest SELECT, UPDATE or MERGE, then of the
+    outer ones (correlated references). An unqualified column may belong to
+    any relation of the nearest scope reading one. `scopes` caches the
+    alias maps by scope.
     """
 
-    df = pd.read_sql(query, conn)
+    qualifier = column.table.upper()
+    scope = column.find_ancestor(*SCOPE_TYPES)
 
-    results = []
+    while scope is not None:
+
+        relations = scopes.get(id(scope))
+        if relations is None:
+            relations = scopes[id(scope)] = _relations(scope, ctes)
+
+        if qualifier and qualifier in relations:
+            return {relations[qualifier]}
+        if not qualifier and relations:
+            return set(relations.values())
+
+        scope = scope.find_ancestor(*SCOPE_TYPES)
+
+    # A table name used as a qualifier without being aliased
+    if column.db:
+        return {f"{column.db}.{column.table}".upper()}
+
+    return {qualifier} if qualifier else set()
+
+
+def _query_relation(select):
+    """
+    Name the rows of a nested SELECT are read under: the alias of its CTE
+    or derived table, upper-cased, or None for a scalar subquery.
+    """
+
+    node = select
+
+    while True:
+        parent = node.parent
+        if isinstance(parent, (exp.CTE, exp.Subquery)) and parent.alias:
+            return parent.alias.upper()
+        if not isinstance(parent, (exp.Union, exp.Subquery)):
+            return None
+        node = parent
+
+
+def _is_table(relation, table):
+    """
+    Whether a relation is `table` (SCHEMA.TABLE), written in full or as
+    the bare table name of the default schema.
+    """
+
+    return relation == table or ("." not in relation and relation == table.rpartition(".")[2])
+
+
+# --------------------------------------------------
+# COLUMN USAGE
+# --------------------------------------------------
+
+def extract_column_usage(sql_text, source_column, source_table=None):
+    """
+    Extract column transformations where source_column is used, each with
+    the table and column it is written to when its statement writes one
+    (INSERT ... SELECT, SELECT ... INTO, CREATE TABLE AS, UPDATE, MERGE).
+
+    Columns derived from source_column in a CTE, subquery or temporary
+    table are followed into the statements that read them. With a
+    source_table (SCHEMA.TABLE), a column only counts when its qualifier
+    resolves to that table or to a relation derived from it; a column of
+    the same name in another table is not followed.
+    """
+
+    lineage = []
 
-    for _, row in df.iterrows():
+    source = source_table.upper() if source_table else None
+    source_column = source_column.upper()
 
-        sql_text = row["definition"]
-        object_schema = row["schema_name"]
-        object_name = row["object_name"]
-        object_type = row["type_desc"]
+    # Names carrying the source column: the column itself, the aliases
+    # of nested projections computed from it, and temp table columns;
+    # with a source table, also as (relation, column) pairs
+    names = {source_column}
+    derived = set()
 
-        column_usages = extract_column_usage(sql_text, column)
+    def uses(expression, ctes, scopes):
 
-        for usage in column_usages:
+        for column in expression.find_all(Column):
 
-            # Add Procedure / View row
-            results.append({
-                "ODS_Table": f"{schema}.{table}",
-                "ODS_Column": column,
-                "Object_Name": f"{object_schema}.{object_name}",
-                "Object_Type": object_type,
-                "Object_Column": usage["object_column"],
-                "Transformation": usage["transformation"]
-            })
+            name = column.name.upper()
+            if name not in names:
+                continue
+            if source is None:
+                return True
 
-            # If procedure → also add target TABLE row
-            if object_type == "SQL_STORED_PROCEDURE":
+            for relation in _column_relations(column, ctes, scopes):
+                if (relation, name) in derived or (name == source_column and _is_table(relation, source)):
+                    return True
 
-                target_schema, target_table = extract_insert_target(sql_text)
+        return False
 
-                if target_schema and target_table:
+    def derive(relation, name):
+        names.add(name.upper())
+        if relation:
+            derived.add((relation.upper(), name.upper()))
 
-                    results.append({
-                        "ODS_Table": f"{schema}.{table}",
-                        "ODS_Column": column,
-                        "Object_Name": f"{target_schema}.{target_table}",
+    # Each statement is parsed on its own budget; failed or timed-out
+    # statements contribute nothing instead of hiding the whole module
+    for statement in parse_statements(sql_text):
+
+        for parsed in statement["expressions"]:
+
+            ctes = {cte.alias.upper() for cte in parsed.find_all(exp.CTE)}
+            scopes = {}
+
+            feeding = list(_feeding_selects(parsed))
+            feeding_ids = {id(select) for select, _, _ in feeding}
+
+            # Innermost SELECTs first, so aliases propagate outwards
+            for select in reversed(list(parsed.find_all(Select, bfs=False))):
+                if id(select) in feeding_ids:
+                    continue
+                relation = _query_relation(select)
+                for projection in select.expressions:
+                    if projection.alias_or_name and uses(projection, ctes, scopes):
+                        derive(relation, projection.alias_or_name)
+
+            usages = []
+
+            for select, target_table, target_columns in feeding:
+
+                for position, expression in enumerate(select.expressions):
+
+                    if not uses(expression, ctes, scopes):
+                        continue
+
+                    # Case 1: Expression with alias, Case 2: Direct column
+                    if isinstance(expression, Alias):
+                        object_column, transformation = expression.alias, expression.this.sql()
+                    elif isinstance(expression, Column):
+                        object_column, transformation = expression.name, expression.sql()
+                    else:
+                        object_column, transformation = None, expression.sql()
+
+                    target_column = None
+                    if target_table:
+                        if target_columns is not None:
+                            target_column = target_columns[position] if position < len(target_columns) else None
+                        else:
+                            target_column = object_column
+
+                    if object_column is None and target_column is None:
+                        continue
+
+                    usages.append((object_column or target_column, transformation, target_table, target_column))
+
+            for target_table, target_column, value in _assignments(parsed):
+                if uses(value, ctes, scopes):
+                    usages.append((target_column, value.sql(), target_table, target_column))
+
+            for object_column, transformation, target_table, target_column in usages:
+
+                # Temp tables and table variables only carry the column on
+                # to later statements of the same module
+                if target_table and _is_temporary(target_table):
+                    if target_column:
+                        derive(target_table, target_column)
+                    continue
+
+                lineage.append({
+                    "object_column": object_column,
+                    "transformation": transformation,
+                    "target_table": target_table,
+                    "target_column": target_column
+                })
+
+    return lineage
+
+
+def _column_hop(table, column, path=None):
+    """
+    One hop of column lineage: the views and procedures reading `column`
+    of `table` (SCHEMA.TABLE), as result rows, plus the (table, column)
+    pairs that lineage flows into next. Only usages whose qualifier
+    resolves to `table` (or a relation derived from it) are followed.
+    """
+
+    rows = []
+    targets = []
+    seen = set()
+
+    def add(row):
+        key = tuple(row.values())
+        if key not in seen:
+            seen.add(key)
+            rows.append(row)
+
+    table_name = table.rpartition(".")[2]
+    candidates = get_module_index(path).candidates(table_name, column)
+
+    # Candidate definitions are streamed a chunk at a time and each chunk
+    # is parsed on the process pool
+    for df in iter_modules(path, object_ids=candidates):
+
+        outcomes = map_modules(
+            extract_column_usage,
+            [(sql_text, column, table) for sql_text in df["definition"]],
+            sizes=[len(sql_text or "") for sql_text in df["definition"]]
+        )
+
+        for (_, row), outcome in zip(df.iterrows(), outcomes):
+
+            object_name = f"{row['schema_name']}.{row['object_name']}".upper()
+            object_type = row["type_desc"]
+
+            for usage in outcome["result"] or []:
+
+                # Add Procedure / View row
+                add({
+                    "Parent_Object": table,
+                    "Object_Name": object_name,
+                    "Object_Type": object_type,
+                    "Object_Column": usage["object_column"],
+                    "Transformation": usage["transformation"]
+                })
+
+                if object_type == "VIEW":
+                    targets.append((object_name, usage["object_column"].upper()))
+
+                # Statement writes a table → also add target TABLE row
+                if usage["target_table"] and usage["target_column"]:
+
+                    target = usage["target_table"].upper()
+
+                    add({
+                        "Parent_Object": object_name,
+                        "Object_Name": target,
                         "Object_Type": "TABLE",
-                        "Object_Column": usage["object_column"],
+                        "Object_Column": usage["target_column"],
                         "Transformation": usage["transformation"]
                     })
+                    targets.append((target, usage["target_column"].upper()))
+
+    return rows, targets
+
+
+_hop_memo = OrderedDict()
+_hop_memo_versions = {}
+_hop_memo_lock = threading.Lock()
+
+
+def _memoized_hop(table, column, path=None):
+    """
+    _column_hop() remembered until the snapshot is refreshed, so tables
+    shared by several lineage paths (and repeat searches) are resolved once.
+    The LINEAGE_HOP_MEMO_SIZE most recently used hops are kept.
+    """
+
+    store = open_snapshot(path)
+    try:
+        version = get_state(store, "refreshed_at")
+    finally:
+        store.close()
+
+    key = (path, table, column)
+
+    with _hop_memo_lock:
+        if version != _hop_memo_versions.get(path):
+            for stale in [k for k in _hop_memo if k[0] == path]:
+                del _hop_memo[stale]
+            _hop_memo_versions[path] = version
+        cached = _hop_memo.get(key)
+        if cached is not None:
+            _hop_memo.move_to_end(key)
+
+    if cached is None:
+        cached = _column_hop(table, column, path)
+        with _hop_memo_lock:
+            _hop_memo[key] = cached
+            _hop_memo.move_to_end(key)
+            while len(_hop_memo) > LINEAGE_HOP_MEMO_SIZE:
+                _hop_memo.popitem(last=False)
+
+    return cached
+
+
+def get_full_column_lineage(conn, schema, table, column, max_depth=LINEAGE_MAX_DEPTH, path=None):
+    """
+    Returns full column-level lineage for given ODS table + column,
+    following every target table and view column downstream, hop by hop,
+    until nothing new is reached or `max_depth` hops were taken. `path`
+    selects the metadata snapshot (default: the configured server's).
+    """
+
+    # Candidate modules come from the local metadata snapshot and its
+    # token index rather than a LIKE scan of sys.sql_modules
+    ensure_snapshot(conn, path)
+
+    start = (f"{schema}.{table}".upper(), column.upper())
+
+    frontier = [start]
+    visited = {start}
+    results = []
+    depth = 0
+
+    while frontier and depth < max_depth:
+
+        depth += 1
+        next_frontier = []
+
+        for source_table, source_column in frontier:
+
+            rows, targets = _memoized_hop(source_table, source_column, path)
+
+            for row in rows:
+                results.append({
+                    "ODS_Table": f"{schema}.{table}",
+                    "ODS_Column": column,
+                    "Hop": depth,
+                    "Source_Table": source_table,
+                    "Source_Column": source_column,
+                    **row
+                })
+
+            for target in targets:
+                if target not in visited:
+                    visited.add(target)
+                    next_frontier.append(target)
 
-    # Remove duplicates if any
-    result_df = pd.DataFrame(results).drop_duplicates()
+        frontier = next_frontier
 
-    return result_df
+    # Each (table, column) is expanded once and its rows are unique, so
+    # there is nothing to de-duplicate
+    return pd.DataFrame(results)
@@ -0,0 +1,385 @@
+import os
+import shutil
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from config import LINEAGE_STORE_DIR, LINEAGE_STORE_KEEP_SNAPSHOTS, LINEAGE_STORE_ROW_GROUP
+
+
+# --------------------------------------------------
+# EDGE LAYOUT
+# --------------------------------------------------
+
+# One row per edge, whatever engine produced it
+EDGE_COLUMNS = [
+    "source_table",
+    "source_column",
+    "target_table",
+    "target_column",
+    "object_name",
+    "object_type",
+    "transformation",
+    "dependency_type",
+]
+
+# Repeated names and transformations are stored once per column chunk
+DICTIONARY_COLUMNS = EDGE_COLUMNS
+
+# engine=<name>/snapshot=<id>/source_schema=<schema>/part-<n>.parquet
+PARTITION_COLUMNS = ["engine", "snapshot", "source_schema"]
+
+# Warehouse identifiers are case-insensitive: their edges are stored and
+# queried upper case
+UPPERCASE_ENGINES = ("procedures",)
+
+NAME_COLUMNS = ["source_table", "source_column", "target_table", "target_column", "object_name"]
+
+# Marks a snapshot holding only part of the catalog (a run limited to some
+# objects or nodes); names starting with '_' are skipped by the dataset
+SUBSET_MARKER = "_SUBSET"
+
+
+def source_schema(source_table):
+    """
+    Partition of an edge: the schema of its source table, '_' when the
+    table is not schema-qualified (semantic model tables, literals).
+    """
+
+    schema, dot, _ = (source_table or "").partition(".")
+    return schema if dot and schema else "_"
+
+
+def _source_schemas(source_tables):
+    """
+    source_schema() over an Arrow column, without a Python loop.
+    """
+
+    import pyarrow.compute as pc
+
+    schemas = pc.replace_substring_regex(source_tables, r"\..*$", "")
+    qualified = pc.and_(pc.match_substring(source_tables, "."), pc.not_equal(schemas, ""))
+
+    return pc.fill_null(pc.if_else(qualified, schemas, "_"), "_")
+
+
+def procedure_edges(df):
+    """
+    Edge rows from materialized column edges (see
+    lineage_materializer.iter_column_edges).
+    """
+
+    return pd.DataFrame({
+        "source_table": df["source_table"],
+        "source_column": df["source_column"],
+        "target_table": df["target_table"],
+        "target_column": df["target_column"],
+        "object_name": df["object_name"],
+        "object_type": df["object_type"],
+        "transformation": df["transformation"],
+        "dependency_type": "Column Lineage",
+    })
+
+
+def semantic_edges(df_lineage):
+    """
+    Edge rows from the semantic lineage frame (Source, Target,
+    Transformation, DependencyType). 'Table.Column' names are split at the
+    last dot; bare table names keep an empty column.
+    """
+
+    source = df_lineage["Source"].str.rpartition(".")
+    target = df_lineage["Target"].str.rpartition(".")
+
+    def split(parts, name):
+        qualified = parts[1] == "."
+        return parts[0].where(qualified, name), parts[2].where(qualified, "")
+
+    source_table, source_column = split(source, df_lineage["Source"])
+    target_table, target_column = split(target, df_lineage["Target"])
+
+    return pd.DataFrame({
+        "source_table": source_table,
+        "source_column": source_column,
+        "target_table": target_table,
+        "target_column": target_column,
+        "object_name": df_lineage["Target"],
+        "object_type": "SEMANTIC",
+        "transformation": df_lineage["Transformation"],
+        "dependency_type": df_lineage["DependencyType"],
+    })
+
+
+def new_snapshot_id():
+    return datetime.now().strftime("%Y%m%dT%H%M%S%f")
+
+
+# --------------------------------------------------
+# STORE
+# --------------------------------------------------
+
+class LineageStore:
+    """
+    Lineage edges in hive-partitioned Parquet files, one snapshot per
+    write, so millions of edges across snapshots stay on disk.
+
+    String columns are dictionary encoded and every batch is written
+    sorted by source table, so row-group statistics let a query by source
+    skip most of a file. Queries push their filters down to the partition
+    directories and row groups and read the remaining files through
+    memory maps; only the matching rows are materialized.
+
+    pyarrow is imported on first use: without it the rest of the
+    application runs unchanged.
+    """
+
+    def __init__(self, root=LINEAGE_STORE_DIR, row_group_size=LINEAGE_STORE_ROW_GROUP):
+        self.root = root
+        self.row_group_size = row_group_size
+        self._lock = threading.Lock()
+
+    def _engine_dir(self, engine):
+        return os.path.join(self.root, f"engine={engine}")
+
+    def _snapshot_dir(self, engine, snapshot):
+        return os.path.join(self._engine_dir(engine), f"snapshot={snapshot}")
+
+    # -------------------- write --------------------
+
+    def write(self, frames, engine, snapshot=None, subset=False):
+        """
+        Store the edges of one engine run as a new snapshot. `frames` is an
+        edge DataFrame or an iterable of them (streamed batches); each
+        batch is written as it arrives. The snapshot only becomes visible
+        once it is complete. Returns (snapshot id, rows written).
+
+        A `subset` snapshot (edges of some objects only) is kept but never
+        becomes latest(). A full snapshot without edges is refused while
+        the latest one has any, so a failed extraction cannot hide them.
+        """
+
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        if isinstance(frames, pd.DataFrame):
+            frames = [frames]
+
+        snapshot = snapshot or new_snapshot_id()
+        final_dir = self._snapshot_dir(engine, snapshot)
+        # Directories starting with '.' are skipped by dataset discovery
+        work_dir = os.path.join(self._engine_dir(engine), f".snapshot={snapshot}.{os.getpid()}.tmp")
+
+        schema = pa.schema([(column, pa.string()) for column in EDGE_COLUMNS])
+        writers = {}
+        rows = 0
+
+        try:
+            for df in frames:
+
+                if df.empty:
+                    continue
+
+                table = pa.Table.from_pandas(df[EDGE_COLUMNS], schema=schema, preserve_index=False)
+
+                if engine in UPPERCASE_ENGINES:
+                    for column in NAME_COLUMNS:
+                        position = table.schema.get_field_index(column)
+                        table = table.set_column(position, column, pc.utf8_upper(table[column]))
+
+                table = table.append_column("_partition", _source_schemas(table["source_table"]))
+                table = table.sort_by([("_partition", "ascending"), ("source_table", "ascending"),
+                                       ("source_column", "ascending")])
+
+                for partition in pc.unique(table["_partition"]).to_pylist():
+
+                    part = table.filter(pc.equal(table["_partition"], partition)).drop_columns(["_partition"])
+
+                    writer = writers.get(partition)
+                    if writer is None:
+                        partition_dir = os.path.join(work_dir, f"source_schema={partition}")
+                        os.makedirs(partition_dir, exist_ok=True)
+                        writer = writers[partition] = pq.ParquetWriter(
+                            os.path.join(partition_dir, "part-0.parquet"),
+                            schema,
+                            use_dictionary=DICTIONARY_COLUMNS,
+                            compression="zstd",
+                        )
+
+                    writer.write_table(part, row_group_size=self.row_group_size)
+                    rows += part.num_rows
+
+        except BaseException:
+            for writer in writers.values():
+                writer.close()
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+
+        for writer in writers.values():
+            writer.close()
+
+        if not rows and not subset and self.count(engine):
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise ValueError(
+                f"No {engine} edges to store: keeping snapshot {self.latest(engine)} as the latest"
+            )
+
+        os.makedirs(work_dir, exist_ok=True)
+
+        if subset:
+            open(os.path.join(work_dir, SUBSET_MARKER), "w").close()
+
+        with self._lock:
+            if os.path.exists(final_dir):
+                shutil.rmtree(final_dir)
+            os.replace(work_dir, final_dir)
+
+        return snapshot, rows
+
+    # -------------------- snapshots --------------------
+
+    def engines(self):
+        try:
+            return sorted(
+                entry.name.partition("=")[2] for entry in os.scandir(self.root)
+                if entry.is_dir() and entry.name.startswith("engine=")
+            )
+        except OSError:
+            return []
+
+    def is_subset(self, engine, snapshot):
+        return os.path.exists(os.path.join(self._snapshot_dir(engine, snapshot), SUBSET_MARKER))
+
+    def snapshots(self, engine, subset=False):
+        """
+        Snapshot IDs of an engine, oldest first: the full ones, or with
+        `subset` those limited to some objects.
+        """
+
+        try:
+            return sorted(
+                entry.name.partition("=")[2] for entry in os.scandir(self._engine_dir(engine))
+                if entry.is_dir() and entry.name.startswith("snapshot=")
+                and self.is_subset(engine, entry.name.partition("=")[2]) == subset
+            )
+        except OSError:
+            return []
+
+    def latest(self, engine):
+        """
+        Newest full snapshot of an engine.
+        """
+        snapshots = self.snapshots(engine)
+        return snapshots[-1] if snapshots else None
+
+    def prune(self, engine, keep=LINEAGE_STORE_KEEP_SNAPSHOTS):
+        """
+        Delete all but the `keep` newest full snapshots of an engine, and
+        all but the `keep` newest subset ones. Returns the deleted IDs.
+        """
+
+        dropped = []
+
+        with self._lock:
+            for subset in (False, True):
+                snapshots = self.snapshots(engine, subset)
+                dropped += snapshots[:max(len(snapshots) - keep, 0)]
+            for snapshot in dropped:
+                shutil.rmtree(self._snapshot_dir(engine, snapshot), ignore_errors=True)
+
+        return dropped
+
+    def count(self, engine, snapshot=None):
+        """
+        Edges in a snapshot (default: the latest), from the Parquet
+        footers only.
+        """
+
+        if snapshot is None and self.latest(engine) is None:
+            return 0
+
+        return self._dataset(engine, snapshot).count_rows()
+
+    # -------------------- read --------------------
+
+    def _dataset(self, engine, snapshot=None):
+
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        from pyarrow.fs import LocalFileSystem
+
+        snapshot = snapshot or self.latest(engine)
+
+        if snapshot is None:
+            raise LookupError(f"No lineage snapshot stored for engine '{engine}'")
+
+        partition_schema = pa.schema([("source_schema", pa.string())])
+
+        return ds.dataset(
+            self._snapshot_dir(engine, snapshot),
+            schema=pa.schema(
+                [(column, pa.dictionary(pa.int32(), pa.string())) for column in EDGE_COLUMNS]
+                + list(partition_schema)
+            ),
+            format=ds.ParquetFileFormat(
+                read_options=ds.ParquetReadOptions(dictionary_columns=DICTIONARY_COLUMNS)
+            ),
+            partitioning=ds.partitioning(partition_schema, flavor="hive"),
+            filesystem=LocalFileSystem(use_mmap=True),
+        )
+
+    def query(self, engine, snapshot=None, source_table=None, source_column=None,
+              target_table=None, target_column=None, object_name=None, columns=None):
+        """
+        Edges of one snapshot (default: the latest) matching every given
+        name exactly, as a DataFrame with categorical string columns.
+        A source_table filter also prunes the source_schema partitions.
+        """
+
+        import pyarrow.dataset as ds
+
+        dataset = self._dataset(engine, snapshot)
+
+        filters = {
+            "source_table": source_table,
+            "source_column": source_column,
+            "target_table": target_table,
+            "target_column": target_column,
+            "object_name": object_name,
+        }
+
+        expression = None
+
+        for column, value in filters.items():
+
+            if value is None:
+                continue
+
+            if engine in UPPERCASE_ENGINES:
+                value = value.upper()
+
+            condition = ds.field(column) == value
+            if column == "source_table":
+                condition = condition & (ds.field("source_schema") == source_schema(value))
+
+            expression = condition if expression is None else expression & condition
+
+        table = dataset.to_table(columns=columns or EDGE_COLUMNS, filter=expression)
+
+        return table.to_pandas()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_lineage_store():
+
+    global _store
+
+    with _store_lock:
+        if _store is None:
+            _store = LineageStore()
+
+    return _store
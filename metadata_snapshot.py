@@ -0,0 +1,496 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from config import (
+    SERVER,
+    DATABASE,
+    SNAPSHOT_DIR,
+    SNAPSHOT_MAX_AGE_SECONDS,
+    SNAPSHOT_FETCH_BATCH,
+    MODULE_READ_CHUNK,
+)
+
+
+# --------------------------------------------------
+# CATALOG QUERIES
+# --------------------------------------------------
+
+MODULE_SELECT = """
+SELECT
+    o.object_id,
+    s.name AS schema_name,
+    o.name AS object_name,
+    o.type,
+    o.type_desc,
+    o.modify_date,
+    m.definition
+FROM sys.objects o
+JOIN sys.schemas s ON o.schema_id = s.schema_id
+JOIN sys.sql_modules m ON o.object_id = m.object_id
+"""
+
+# One bulk pull, filtered by modify_date
+BULK_MODULE_QUERY = MODULE_SELECT + "WHERE o.modify_date >= ?"
+
+# Key scan used by the incremental sync: no definition text
+MODULE_KEY_QUERY = """
+SELECT o.object_id, o.modify_date
+FROM sys.objects o
+JOIN sys.sql_modules m ON o.object_id = m.object_id
+"""
+
+MODULE_BY_ID_QUERY = MODULE_SELECT + "WHERE o.object_id IN ({placeholders})"
+
+# SQL Server allows 2100 parameters per statement
+MODULE_ID_BATCH = 1000
+
+EPOCH = datetime(1900, 1, 1)
+
+
+# --------------------------------------------------
+# LOCAL STORE (SQLITE)
+# --------------------------------------------------
+
+SNAPSHOT_DDL = """
+CREATE TABLE IF NOT EXISTS modules (
+    object_id   INTEGER PRIMARY KEY,
+    schema_name TEXT NOT NULL,
+    object_name TEXT NOT NULL,
+    type        TEXT,
+    type_desc   TEXT,
+    modify_date TEXT,
+    definition  TEXT
+);
+CREATE INDEX IF NOT EXISTS modules_by_name ON modules (schema_name, object_name);
+CREATE INDEX IF NOT EXISTS modules_by_type ON modules (type);
+"""
+
+STATE_DDL = """
+CREATE TABLE IF NOT EXISTS snapshot_state (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_refresh_lock = threading.Lock()
+
+
+def snapshot_path(server=SERVER, database=DATABASE):
+    """
+    One snapshot file per server/database pair.
+    """
+
+    safe = re.sub(r"[^\w.-]+", "_", f"{server}_{database}")
+    return os.path.join(SNAPSHOT_DIR, f"{safe}.db")
+
+
+def open_snapshot(path=None, ddl=None):
+
+    path = path or snapshot_path()
+
+    if path != ":memory:":
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    store = sqlite3.connect(path, check_same_thread=False)
+    store.executescript(STATE_DDL + (SNAPSHOT_DDL if ddl is None else ddl))
+
+    return store
+
+
+def get_state(store, key, default=None):
+    row = store.execute(
+        "SELECT value FROM snapshot_state WHERE key = ?", (key,)
+    ).fetchone()
+    return row[0] if row else default
+
+
+def set_state(store, key, value):
+    store.execute(
+        "INSERT OR REPLACE INTO snapshot_state (key, value) VALUES (?, ?)",
+        (key, str(value))
+    )
+
+
+def to_text(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return None if value is None else str(value)
+
+
+# --------------------------------------------------
+# REFRESH
+# --------------------------------------------------
+
+def _upsert_modules(store, cursor, newest, on_batch=None):
+    """
+    Stream a module result set into the store. Returns (rows, newest modify_date).
+    Each fetched batch of module rows is also handed to on_batch(rows).
+    """
+
+    written = 0
+
+    while True:
+        batch = cursor.fetchmany(SNAPSHOT_FETCH_BATCH)
+        if not batch:
+            break
+
+        rows = []
+        for object_id, schema_name, object_name, obj_type, type_desc, modify_date, definition in batch:
+            if isinstance(modify_date, str):
+                modify_date = datetime.fromisoformat(modify_date)
+            if modify_date and modify_date > newest:
+                newest = modify_date
+            rows.append((
+                object_id,
+                schema_name,
+                object_name,
+                (obj_type or "").strip(),
+                type_desc,
+                to_text(modify_date),
+                definition
+            ))
+
+        store.executemany(
+            "INSERT OR REPLACE INTO modules "
+            "(object_id, schema_name, object_name, type, type_desc, modify_date, definition) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        written += len(rows)
+
+        if on_batch is not None:
+            # The batch's consumer may write to this store: release the
+            # write lock before handing the rows over (and possibly waiting
+            # for the consumer to catch up)
+            store.commit()
+            on_batch(rows)
+
+    return written, newest
+
+
+def refresh_snapshot(conn, path=None, on_batch=None):
+    """
+    Pull every module modified since the last refresh in a single bulk
+    query and upsert it into the local store. Returns rows written.
+    """
+
+    with _refresh_lock:
+
+        store = open_snapshot(path)
+
+        try:
+            high_water = get_state(store, "modules_modify_date")
+            since = datetime.fromisoformat(high_water) if high_water else EPOCH
+
+            cursor = conn.cursor()
+            cursor.execute(BULK_MODULE_QUERY, (since,))
+
+            written, newest = _upsert_modules(store, cursor, since, on_batch)
+
+            set_state(store, "modules_modify_date", to_text(newest))
+            set_state(store, "refreshed_at", time.time())
+            store.commit()
+
+        finally:
+            store.close()
+
+    return written
+
+
+def sync_modules(conn, path=None, on_batch=None):
+    """
+    Incremental sync against the per-object modify_date high-water marks.
+
+    Only object IDs and modify dates are scanned remotely; definitions are
+    fetched for new or changed objects only and dropped objects are removed.
+    Fetched rows are passed to on_batch(rows) as they arrive.
+    Returns {"changed": [object_id, ...], "dropped": [object_id, ...]}.
+    """
+
+    with _refresh_lock:
+
+        store = open_snapshot(path)
+
+        try:
+            local = dict(store.execute("SELECT object_id, modify_date FROM modules"))
+
+            cursor = conn.cursor()
+            cursor.execute(MODULE_KEY_QUERY)
+
+            remote = {}
+            for object_id, modify_date in cursor.fetchall():
+                if isinstance(modify_date, str):
+                    modify_date = datetime.fromisoformat(modify_date)
+                remote[object_id] = to_text(modify_date)
+
+            changed = sorted(
+                object_id for object_id, modify_date in remote.items()
+                if local.get(object_id) != modify_date
+            )
+            dropped = sorted(object_id for object_id in local if object_id not in remote)
+
+            high_water = get_state(store, "modules_modify_date")
+            newest = datetime.fromisoformat(high_water) if high_water else EPOCH
+
+            for start in range(0, len(changed), MODULE_ID_BATCH):
+                ids = changed[start:start + MODULE_ID_BATCH]
+                cursor.execute(
+                    MODULE_BY_ID_QUERY.format(placeholders=", ".join("?" for _ in ids)),
+                    ids
+                )
+                _, newest = _upsert_modules(store, cursor, newest, on_batch)
+
+            store.executemany(
+                "DELETE FROM modules WHERE object_id = ?",
+                [(object_id,) for object_id in dropped]
+            )
+
+            set_state(store, "modules_modify_date", to_text(newest))
+            set_state(store, "refreshed_at", time.time())
+            store.commit()
+
+        finally:
+            store.close()
+
+    return {"changed": changed, "dropped": dropped}
+
+
+def snapshot_is_fresh(path=None, max_age=SNAPSHOT_MAX_AGE_SECONDS):
+    """
+    Whether the snapshot was synced within max_age seconds; checked
+    locally, so callers can skip borrowing a server connection.
+    """
+
+    store = open_snapshot(path)
+    try:
+        refreshed_at = float(get_state(store, "refreshed_at", 0))
+    finally:
+        store.close()
+
+    return time.time() - refreshed_at <= max_age
+
+
+def ensure_snapshot(conn, path=None, max_age=SNAPSHOT_MAX_AGE_SECONDS, on_batch=None):
+    """
+    Bring the snapshot up to date when it is older than max_age seconds:
+    a bulk load the first time, an incremental sync afterwards. Fetched
+    module rows are passed to on_batch(rows) as they arrive.
+    Returns the sync result, or None when the snapshot was fresh.
+    """
+
+    if snapshot_is_fresh(path, max_age):
+        return None
+
+    store = open_snapshot(path)
+    try:
+        loaded = get_state(store, "modules_modify_date") is not None
+    finally:
+        store.close()
+
+    if not loaded:
+        refresh_snapshot(conn, path, on_batch)
+
+        store = open_snapshot(path)
+        try:
+            changed = [row[0] for row in store.execute("SELECT object_id FROM modules ORDER BY object_id")]
+        finally:
+            store.close()
+
+        return {"changed": changed, "dropped": []}
+
+    return sync_modules(conn, path, on_batch)
+
+
+# --------------------------------------------------
+# READS
+# --------------------------------------------------
+
+MODULE_COLUMNS = ["object_id", "schema_name", "object_name", "type_desc", "definition"]
+
+
+def _module_query(types=None, names=None, object_ids=None, with_definition=True):
+
+    columns = MODULE_COLUMNS if with_definition else MODULE_COLUMNS[:-1]
+
+    query = f"SELECT {', '.join(columns)} FROM modules WHERE 1 = 1"
+    params = []
+
+    if types:
+        query += f" AND type IN ({', '.join('?' for _ in types)})"
+        params.extend(types)
+
+    # Warehouse identifiers are case-insensitive, SQLite's IN is not
+    if names:
+        query += f" AND UPPER(object_name) IN ({', '.join('?' for _ in names)})"
+        params.extend(name.upper() for name in names)
+
+    if object_ids is not None:
+        query += f" AND object_id IN ({', '.join('?' for _ in object_ids)})"
+        params.extend(sorted(object_ids))
+
+    query += " ORDER BY schema_name, object_name"
+
+    return query, params, columns
+
+
+def load_modules(path=None, types=None, names=None, object_ids=None, with_definition=True):
+    """
+    Read modules from the snapshot, optionally filtered by sys.objects.type
+    codes (e.g. ('V', 'P')), object names (any case) and object IDs.
+    """
+
+    query, params, columns = _module_query(types, names, object_ids, with_definition)
+
+    if object_ids is not None and not object_ids:
+        return pd.DataFrame(columns=columns)
+
+    store = open_snapshot(path)
+    try:
+        return pd.read_sql(query, store, params=params)
+    finally:
+        store.close()
+
+
+def iter_modules(path=None, types=None, names=None, object_ids=None, with_definition=True,
+                 chunk_size=MODULE_READ_CHUNK):
+    """
+    load_modules() as a stream of DataFrames of at most `chunk_size` rows,
+    so definitions are parsed chunk by chunk instead of all being held in
+    memory at once.
+    """
+
+    query, params, columns = _module_query(types, names, object_ids, with_definition)
+
+    if object_ids is not None and not object_ids:
+        return
+
+    store = open_snapshot(path)
+    try:
+        cursor = store.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield pd.DataFrame(rows, columns=columns)
+    finally:
+        store.close()
+
+
+def load_module_definition(object_id, path=None):
+    """
+    Definition text of one module, for showing it on demand.
+    """
+
+    store = open_snapshot(path)
+    try:
+        row = store.execute(
+            "SELECT definition FROM modules WHERE object_id = ?", (int(object_id),)
+        ).fetchone()
+    finally:
+        store.close()
+
+    return row[0] if row else None
+
+
+# --------------------------------------------------
+# OFFLINE STAND-IN FOR THE SYNAPSE CONNECTION
+# --------------------------------------------------
+
+OFFLINE_CATALOG_DDL = """
+CREATE TABLE IF NOT EXISTS sys.schemas (
+    schema_id INTEGER PRIMARY KEY,
+    name      TEXT
+);
+CREATE TABLE IF NOT EXISTS sys.objects (
+    object_id   INTEGER PRIMARY KEY,
+    schema_id   INTEGER,
+    name        TEXT,
+    type        TEXT,
+    type_desc   TEXT,
+    modify_date TEXT
+);
+CREATE TABLE IF NOT EXISTS sys.sql_modules (
+    object_id  INTEGER PRIMARY KEY,
+    definition TEXT
+);
+"""
+
+OBJECT_TYPE_DESC = {
+    "V": "VIEW",
+    "P": "SQL_STORED_PROCEDURE",
+    "FN": "SQL_SCALAR_FUNCTION",
+    "IF": "SQL_INLINE_TABLE_VALUED_FUNCTION",
+    "TF": "SQL_TABLE_VALUED_FUNCTION",
+    "TR": "SQL_TRIGGER",
+}
+
+
+def connect_offline_catalog(path):
+    """
+    File-backed stand-in for a Synapse connection: a SQLite file attached
+    as `sys` so the catalog queries above run unchanged.
+    """
+
+    sqlite3.register_adapter(datetime, lambda value: value.isoformat(sep=" "))
+
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.execute("ATTACH DATABASE ? AS sys", (path,))
+    conn.executescript(OFFLINE_CATALOG_DDL)
+
+    return conn
+
+
+def write_offline_catalog(conn, modules):
+    """
+    Load (schema, name, type, definition[, modify_date]) tuples into an
+    offline catalog connection.
+    """
+
+    schema_ids = {
+        name: schema_id
+        for schema_id, name in conn.execute("SELECT schema_id, name FROM sys.schemas")
+    }
+    next_object_id = conn.execute(
+        "SELECT COALESCE(MAX(object_id), 0) + 1 FROM sys.objects"
+    ).fetchone()[0]
+
+    for module in modules:
+        schema_name, object_name, obj_type, definition = module[:4]
+        modify_date = module[4] if len(module) > 4 else datetime.now()
+
+        if schema_name not in schema_ids:
+            schema_ids[schema_name] = len(schema_ids) + 1
+            conn.execute(
+                "INSERT INTO sys.schemas (schema_id, name) VALUES (?, ?)",
+                (schema_ids[schema_name], schema_name)
+            )
+
+        existing = conn.execute(
+            "SELECT object_id FROM sys.objects WHERE schema_id = ? AND name = ?",
+            (schema_ids[schema_name], object_name)
+        ).fetchone()
+
+        if existing:
+            object_id = existing[0]
+        else:
+            object_id = next_object_id
+            next_object_id += 1
+
+        conn.execute(
+            "INSERT OR REPLACE INTO sys.objects "
+            "(object_id, schema_id, name, type, type_desc, modify_date) VALUES (?, ?, ?, ?, ?, ?)",
+            (object_id, schema_ids[schema_name], object_name, obj_type,
+             OBJECT_TYPE_DESC.get(obj_type, obj_type), to_text(modify_date))
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO sys.sql_modules (object_id, definition) VALUES (?, ?)",
+            (object_id, definition)
+        )
+
+    conn.commit()
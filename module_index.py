@@ -0,0 +1,293 @@
+import bisect
+import re
+import threading
+
+from config import MODULE_READ_CHUNK
+from metadata_snapshot import get_state, open_snapshot, snapshot_path
+
+
+# --------------------------------------------------
+# TOKENIZER
+# --------------------------------------------------
+
+_PART = r'(?:\[[^\]]+\]|"[^"]+"|[A-Za-z_@#][\w@#$]*)'
+
+TOKEN_PATTERN = re.compile(
+    r"--[^\n]*"
+    r"|/\*.*?\*/"
+    r"|N?'(?:[^']|'')*'"
+    rf"|(?P<name>{_PART}(?:\s*\.\s*{_PART})*)",
+    re.S
+)
+
+
+def normalize_identifier(name):
+    return name.strip().strip('[]"').upper()
+
+
+def tokenize_definition(sql_text):
+    """
+    Yield (token, offset) for every identifier outside comments and string
+    literals. Multi-part names yield each part plus the trailing
+    two-part name, so 'ODS.SRC' and 'SRC' both resolve to the module.
+    """
+
+    for match in TOKEN_PATTERN.finditer(sql_text or ""):
+
+        name = match.group("name")
+        if not name:
+            continue
+
+        offset = match.start("name")
+        parts = [normalize_identifier(part) for part in re.findall(_PART, name)]
+
+        for part in parts:
+            yield part, offset
+
+        if len(parts) >= 2:
+            yield f"{parts[-2]}.{parts[-1]}", offset
+
+
+# --------------------------------------------------
+# PERSISTED POSTINGS (IN THE METADATA SNAPSHOT)
+# --------------------------------------------------
+
+INDEX_DDL = """
+CREATE TABLE IF NOT EXISTS module_tokens (
+    token     TEXT NOT NULL,
+    object_id INTEGER NOT NULL,
+    positions TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS module_tokens_by_token ON module_tokens (token);
+CREATE INDEX IF NOT EXISTS module_tokens_by_object ON module_tokens (object_id);
+CREATE TABLE IF NOT EXISTS module_index_state (
+    object_id   INTEGER PRIMARY KEY,
+    modify_date TEXT
+);
+"""
+
+
+def _postings_for(sql_text):
+
+    postings = {}
+
+    for token, offset in tokenize_definition(sql_text):
+        positions = postings.setdefault(token, [])
+        if not positions or positions[-1] != offset:
+            positions.append(offset)
+
+    return postings
+
+
+class ModuleIndex:
+    """
+    Token -> {object_id: [character offsets]} over every module definition.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.postings = {}
+        self._vocabulary = None
+        self._synced_at = None
+        self._lock = threading.Lock()
+
+    # -------------------- maintenance --------------------
+
+    def _apply(self, object_id, postings):
+        for token, positions in postings.items():
+            self.postings.setdefault(token, {})[object_id] = positions
+
+    def _forget(self, stale_tokens):
+        for token, object_id in stale_tokens:
+            entry = self.postings.get(token)
+            if entry is None:
+                continue
+            entry.pop(object_id, None)
+            if not entry:
+                del self.postings[token]
+
+    def _index_changed(self, store, changed, chunk_size, keep):
+        """
+        Tokenise the `changed` (object_id, modify_date) modules and store
+        their postings, reading definitions `chunk_size` at a time so only
+        one chunk of text is held in memory. Returns the new postings per
+        object ID when `keep` is set.
+        """
+
+        new_postings = {}
+
+        for start in range(0, len(changed), chunk_size):
+
+            dates = dict(changed[start:start + chunk_size])
+
+            cursor = store.execute(
+                f"SELECT object_id, definition FROM modules WHERE object_id IN ({', '.join('?' for _ in dates)})",
+                list(dates)
+            )
+
+            for object_id, definition in cursor.fetchall():
+                postings = _postings_for(definition)
+                if keep:
+                    new_postings[object_id] = postings
+                store.executemany(
+                    "INSERT INTO module_tokens (token, object_id, positions) VALUES (?, ?, ?)",
+                    [
+                        (token, object_id, ",".join(map(str, positions)))
+                        for token, positions in postings.items()
+                    ]
+                )
+
+            store.executemany(
+                "INSERT OR REPLACE INTO module_index_state (object_id, modify_date) VALUES (?, ?)",
+                list(dates.items())
+            )
+
+        return new_postings
+
+    def refresh(self, chunk_size=MODULE_READ_CHUNK):
+        """
+        Re-tokenise only modules whose modify_date differs from the one they
+        were indexed at, and drop modules that left the snapshot. Changed
+        definitions are read and indexed `chunk_size` at a time.
+        """
+
+        store = open_snapshot(self.path)
+        store.executescript(INDEX_DDL)
+
+        try:
+            refreshed_at = get_state(store, "refreshed_at")
+
+            with self._lock:
+
+                if self._synced_at is not None and self._synced_at == refreshed_at:
+                    return
+
+                # IDs and dates only: definitions are read per chunk below
+                changed = store.execute("""
+                    SELECT m.object_id, m.modify_date
+                    FROM modules m
+                    LEFT JOIN module_index_state s ON s.object_id = m.object_id
+                    WHERE s.object_id IS NULL OR s.modify_date IS NOT m.modify_date
+                """).fetchall()
+
+                dropped = [row[0] for row in store.execute("""
+                    SELECT s.object_id
+                    FROM module_index_state s
+                    LEFT JOIN modules m ON m.object_id = s.object_id
+                    WHERE m.object_id IS NULL
+                """)]
+
+                stale = [object_id for object_id, _ in changed] + dropped
+
+                stale_tokens = []
+                for object_id in stale:
+                    stale_tokens.extend(
+                        (token, object_id) for token, in store.execute(
+                            "SELECT token FROM module_tokens WHERE object_id = ?", (object_id,)
+                        )
+                    )
+
+                store.executemany(
+                    "DELETE FROM module_tokens WHERE object_id = ?",
+                    [(object_id,) for object_id in stale]
+                )
+                store.executemany(
+                    "DELETE FROM module_index_state WHERE object_id = ?",
+                    [(object_id,) for object_id in dropped]
+                )
+
+                # On first use every posting is loaded from disk afterwards
+                new_postings = self._index_changed(
+                    store, changed, chunk_size, keep=self._synced_at is not None
+                )
+
+                store.commit()
+
+                if self._synced_at is None:
+                    # First use in this process: load every posting from disk
+                    self.postings = {}
+                    for token, object_id, positions in store.execute(
+                        "SELECT token, object_id, positions FROM module_tokens"
+                    ):
+                        self.postings.setdefault(token, {})[object_id] = [
+                            int(p) for p in positions.split(",")
+                        ]
+                else:
+                    self._forget(stale_tokens)
+                    for object_id, postings in new_postings.items():
+                        self._apply(object_id, postings)
+
+                if stale or self._synced_at is None:
+                    self._vocabulary = None
+
+                self._synced_at = refreshed_at
+
+        finally:
+            store.close()
+
+    # -------------------- lookups --------------------
+
+    def objects_with(self, token):
+        with self._lock:
+            return set(self.postings.get(normalize_identifier(token), ()))
+
+    def positions(self, token, object_id):
+        with self._lock:
+            return list(self.postings.get(normalize_identifier(token), {}).get(object_id, []))
+
+    def candidates(self, table, column=None):
+        """
+        Modules that mention the table and (optionally) the column.
+        """
+
+        ids = self.objects_with(table)
+
+        if column and ids:
+            ids &= self.objects_with(column)
+
+        return ids
+
+    def search(self, text):
+        """
+        Modules referencing any identifier that starts with `text`.
+        """
+
+        prefix = normalize_identifier(text)
+        if not prefix:
+            return set()
+
+        with self._lock:
+
+            if self._vocabulary is None:
+                self._vocabulary = sorted(self.postings)
+
+            ids = set()
+            start = bisect.bisect_left(self._vocabulary, prefix)
+
+            for token in self._vocabulary[start:]:
+                if not token.startswith(prefix):
+                    break
+                ids.update(self.postings[token])
+
+        return ids
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_module_index(path=None):
+    """
+    Process-wide index for a snapshot, brought up to date with it.
+    """
+
+    path = path or snapshot_path()
+
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = ModuleIndex(path)
+
+    index.refresh()
+
+    return index
@@ -0,0 +1,239 @@
+import collections
+import concurrent.futures
+import heapq
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+from config import (
+    EXTRACT_WORKERS,
+    EXTRACT_CHUNKS_PER_WORKER,
+    EXTRACT_MODULE_TIMEOUT_SECONDS,
+    EXTRACT_PARALLEL_MIN_MODULES,
+)
+
+
+class ModuleTimeout(Exception):
+    pass
+
+
+# --------------------------------------------------
+# PER-MODULE TIME LIMIT
+# --------------------------------------------------
+
+def _can_use_alarm():
+    return (
+        hasattr(signal, "setitimer")
+        and threading.current_thread() is threading.main_thread()
+    )
+
+
+def _on_alarm(signum, frame):
+    raise ModuleTimeout()
+
+
+def run_with_timeout(func, args, timeout):
+    """
+    Run func(*args) and report {"status", "result", "error", "elapsed"}.
+
+    On POSIX the call is interrupted after `timeout` seconds; calls nest, so
+    a statement budget inside a module budget never outlives the module's.
+    Elsewhere (or off the main thread) only map_modules' chunk deadline applies.
+    """
+
+    use_alarm = timeout and _can_use_alarm()
+    started = time.perf_counter()
+
+    if use_alarm:
+        outer_remaining = signal.getitimer(signal.ITIMER_REAL)[0]
+        budget = min(timeout, outer_remaining) if outer_remaining > 0 else timeout
+        previous = signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, budget)
+
+    try:
+        outcome = {"status": "ok", "result": func(*args), "error": None}
+    except ModuleTimeout:
+        outcome = {"status": "timeout", "result": None, "error": f"exceeded {timeout}s"}
+    except Exception as e:
+        outcome = {"status": "error", "result": None, "error": f"{type(e).__name__}: {e}"}
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+            if outer_remaining > 0:
+                spent = time.perf_counter() - started
+                signal.setitimer(signal.ITIMER_REAL, max(outer_remaining - spent, 0.001))
+
+    outcome["elapsed"] = time.perf_counter() - started
+
+    return outcome
+
+
+def _run_chunk(func, chunk, timeout):
+    return [(index, run_with_timeout(func, args, timeout)) for index, args in chunk]
+
+
+# --------------------------------------------------
+# SIZE-BALANCED CHUNKING
+# --------------------------------------------------
+
+def balance_chunks(sizes, chunk_count):
+    """
+    Longest-processing-time-first assignment of item indexes to chunks so
+    every chunk carries roughly the same amount of SQL text.
+    """
+
+    chunk_count = max(1, min(chunk_count, len(sizes)))
+
+    heap = [(0, n) for n in range(chunk_count)]
+    chunks = [[] for _ in range(chunk_count)]
+
+    for index in sorted(range(len(sizes)), key=lambda i: (-sizes[i], i)):
+        load, n = heapq.heappop(heap)
+        chunks[n].append(index)
+        heapq.heappush(heap, (load + sizes[index], n))
+
+    return [sorted(chunk) for chunk in chunks if chunk]
+
+
+# --------------------------------------------------
+# POOL
+# --------------------------------------------------
+
+def _register_worker(pids):
+    pids.put(os.getpid())
+
+
+def _start_pool(workers):
+    """
+    Worker processes owned by one map_modules() call: stopping them after
+    a timeout cannot break any other caller's work. Each worker reports
+    its PID so a stuck one can be terminated.
+    """
+
+    pids = multiprocessing.SimpleQueue()
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_register_worker,
+        initargs=(pids,)
+    )
+
+    return executor, pids
+
+
+def _stop_pool(executor, pids, kill=False):
+
+    if not kill:
+        executor.shutdown(wait=True)
+        return
+
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    while not pids.empty():
+        try:
+            os.kill(pids.get(), signal.SIGTERM)
+        except OSError:
+            pass
+
+
+def _chunk_outcomes(chunk, status, error):
+    return [
+        (index, {"status": status, "result": None, "error": error, "elapsed": 0.0})
+        for index in chunk
+    ]
+
+
+def map_modules(func, args_list, sizes=None, max_workers=None, timeout=None):
+    """
+    Apply a top-level func(*args) to every entry of args_list on a process
+    pool, in size-balanced chunks. Returns one outcome dict per entry, in
+    input order: {"status": ok|timeout|error, "result", "error", "elapsed"}.
+
+    Workers interrupt a module after `timeout` seconds themselves (they
+    run on their main thread). A chunk still running after every module
+    in it could have used its budget times out as a whole: this call's
+    workers are terminated and its other chunks resume on fresh ones.
+    """
+
+    max_workers = max_workers or EXTRACT_WORKERS
+    timeout = EXTRACT_MODULE_TIMEOUT_SECONDS if timeout is None else timeout
+
+    args_list = list(args_list)
+    sizes = list(sizes) if sizes is not None else [1] * len(args_list)
+
+    if not args_list:
+        return []
+
+    # Small batches run in this process, unless a timeout is due and no
+    # alarm can enforce it here (off the main thread, e.g. under Streamlit)
+    if (max_workers <= 1 or len(args_list) < EXTRACT_PARALLEL_MIN_MODULES) \
+            and (not timeout or _can_use_alarm()):
+        return [run_with_timeout(func, args, timeout) for args in args_list]
+
+    chunks = collections.deque(balance_chunks(sizes, max_workers * EXTRACT_CHUNKS_PER_WORKER))
+    workers = min(max_workers, len(chunks))
+
+    outcomes = [None] * len(args_list)
+    running = {}                # future -> (chunk, deadline)
+
+    executor, pids = _start_pool(workers)
+
+    try:
+        while chunks or running:
+
+            # One chunk per worker at a time, so a chunk's deadline starts
+            # when it does; one module's budget of slack covers start-up
+            while chunks and len(running) < workers:
+                chunk = chunks.popleft()
+                future = executor.submit(_run_chunk, func, [(i, args_list[i]) for i in chunk], timeout)
+                deadline = time.monotonic() + timeout * (len(chunk) + 1) if timeout else None
+                running[future] = (chunk, deadline)
+
+            deadlines = [deadline for _, deadline in running.values() if deadline is not None]
+            wait_for = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+
+            done, _ = concurrent.futures.wait(
+                running,
+                timeout=wait_for,
+                return_when=concurrent.futures.FIRST_COMPLETED
+            )
+
+            for future in done:
+                chunk, _ = running.pop(future)
+                try:
+                    results = future.result()
+                except Exception as e:
+                    results = _chunk_outcomes(chunk, "error", f"{type(e).__name__}: {e}")
+                for index, outcome in results:
+                    outcomes[index] = outcome
+
+            now = time.monotonic()
+            expired = [
+                future for future, (_, deadline) in running.items()
+                if deadline is not None and deadline <= now
+            ]
+
+            if not expired:
+                continue
+
+            for future in expired:
+                chunk, _ = running.pop(future)
+                for index, outcome in _chunk_outcomes(chunk, "timeout", "chunk exceeded its deadline"):
+                    outcomes[index] = outcome
+
+            # Terminating the stuck workers takes this call's other running
+            # chunks with them: run those again on a fresh pool
+            _stop_pool(executor, pids, kill=True)
+            chunks.extendleft(chunk for chunk, _ in running.values())
+            running.clear()
+            executor, pids = _start_pool(workers)
+
+    except BaseException:
+        _stop_pool(executor, pids, kill=True)
+        raise
+
+    _stop_pool(executor, pids)
+
+    return outcomes
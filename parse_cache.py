@@ -0,0 +1,232 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import sqlglot
+from sqlglot.errors import ParseError, TokenError
+
+from config import PARSE_CACHE_DIR, PARSE_CACHE_DISK_ENTRIES, PARSE_CACHE_SIZE
+
+
+# --------------------------------------------------
+# CACHE KEY
+# --------------------------------------------------
+
+def definition_key(sql_text, dialect="tsql"):
+    """
+    Stable key for a module definition: sqlglot version + dialect + text.
+    """
+
+    digest = hashlib.sha256()
+    digest.update(sqlglot.__version__.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(dialect.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(sql_text.encode("utf-8"))
+
+    return digest.hexdigest()
+
+
+# --------------------------------------------------
+# TWO-LEVEL CACHE (MEMORY LRU + DISK LRU)
+# --------------------------------------------------
+
+class ParseCache:
+    """
+    In-process LRU of parsed statements backed by pickles on disk. The
+    disk tier keeps the `max_disk_entries` most recently used pickles; a
+    hit refreshes the file's mtime, so eviction goes by last use.
+
+    Cached ASTs are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, cache_dir=PARSE_CACHE_DIR, max_entries=PARSE_CACHE_SIZE,
+                 max_disk_entries=PARSE_CACHE_DISK_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_entries = None   # pickles on disk as of the last scan, plus our writes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.pkl")
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+            os.utime(path)
+            return entry
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+
+    def _write_disk(self, key, entry):
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            added = not os.path.exists(path)
+            os.replace(tmp_path, path)
+        except (OSError, pickle.PicklingError, RecursionError):
+            # Very deep ASTs can exceed the pickler's recursion limit;
+            # they simply stay memory-only.
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            if self._disk_entries is not None and added:
+                self._disk_entries += 1
+            full = self._disk_entries is None or self._disk_entries > self.max_disk_entries
+
+        if full:
+            self._evict_disk()
+
+    def _evict_disk(self):
+
+        # Pickles are spread over key-prefix directories: they are only
+        # scanned when the running count says the cap may be exceeded
+        entries = []
+        try:
+            for shard in os.scandir(self.cache_dir):
+                if shard.is_dir():
+                    entries.extend(entry for entry in os.scandir(shard.path) if entry.name.endswith(".pkl"))
+        except OSError:
+            return
+
+        # Over the cap, evict down to 90% of it so the next scan is a tenth
+        # of the cap's writes away rather than the very next write
+        if len(entries) <= self.max_disk_entries:
+            excess = 0
+        else:
+            excess = len(entries) - (self.max_disk_entries - self.max_disk_entries // 10)
+
+        def last_used(entry):
+            try:
+                return entry.stat().st_mtime
+            except OSError:
+                return 0
+
+        removed = 0
+        for entry in sorted(entries, key=last_used)[:excess]:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except OSError:
+                pass
+
+        with self._lock:
+            self.evictions += removed
+            self._disk_entries = len(entries) - removed
+
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = self._read_disk(key)
+        if entry is not None:
+            self.disk_hits += 1
+            self._remember(key, entry)
+            return entry
+
+        self.misses += 1
+        return None
+
+    def put(self, key, entry):
+        self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def stats(self):
+        return {
+            "memory_hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_entries": len(self._memory),
+            "disk_evictions": self.evictions,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+
+
+_cache = ParseCache()
+
+
+def get_parse_cache():
+    return _cache
+
+
+# --------------------------------------------------
+# CACHED PARSE ENTRY POINTS
+# --------------------------------------------------
+
+def parse_cached(sql_text, dialect="tsql", cache=None):
+    """
+    Drop-in for sqlglot.parse(sql_text, read=dialect) that skips parsing
+    when the same definition was parsed before (in this process or on disk).
+    Parse failures are cached too and re-raised as ParseError.
+    """
+
+    cache = cache or _cache
+    key = definition_key(sql_text, dialect)
+
+    entry = cache.get(key)
+
+    if entry is None:
+        try:
+            entry = ("ok", sqlglot.parse(sql_text, read=dialect))
+        except (ParseError, TokenError) as e:
+            # The tokenizer wraps anything raised while scanning (such as a
+            # statement timeout); only failures of the SQL itself are cached
+            if e.__cause__ is not None and not isinstance(e.__cause__, (ParseError, TokenError)):
+                raise e.__cause__
+            entry = ("error", str(e))
+        cache.put(key, entry)
+
+    status, payload = entry
+
+    if status == "error":
+        raise ParseError(payload)
+
+    return payload
+
+
+def parse_one_cached(sql_text, dialect="tsql", cache=None):
+    """
+    Drop-in for sqlglot.parse_one(sql_text, read=dialect).
+    """
+
+    for expression in parse_cached(sql_text, dialect, cache):
+        if not expression:
+            raise ParseError(f"No expression was parsed from '{sql_text}'")
+        return expression
+
+    raise ParseError(f"No expression was parsed from '{sql_text}'")
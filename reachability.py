@@ -0,0 +1,787 @@
+import bisect
+import collections
+import itertools
+import threading
+from collections import OrderedDict
+
+import networkx as nx
+import numpy as np
+
+from config import REACHABILITY_MEMO_SIZE, REACHABILITY_REBUILD_RATIO
+
+
+# --------------------------------------------------
+# INTERVAL LABELS
+# --------------------------------------------------
+
+# A label is the set of positions a component reaches, as a flat sorted
+# tuple of inclusive intervals: (lo, hi, lo, hi, ...)
+
+def _merge(labels):
+    """
+    Union of labels, with overlapping and touching intervals joined.
+    """
+
+    labels = [label for label in labels if label]
+    if len(labels) == 1:
+        return labels[0]
+
+    pairs = []
+    for label in labels:
+        pairs.extend(zip(label[0::2], label[1::2]))
+
+    if not pairs:
+        return ()
+
+    pairs.sort()
+
+    merged = []
+    lo, hi = pairs[0]
+
+    for next_lo, next_hi in pairs[1:]:
+        if next_lo > hi + 1:
+            merged += (lo, hi)
+            lo, hi = next_lo, next_hi
+        elif next_hi > hi:
+            hi = next_hi
+
+    merged += (lo, hi)
+
+    return tuple(merged)
+
+
+def _label_contains(label, position):
+    k = bisect.bisect_right(label[0::2], position) - 1
+    return k >= 0 and label[2 * k + 1] >= position
+
+
+def _csr(node_count, sources, targets):
+    """
+    (ptr, idx) adjacency of the edges grouped by source, in edge order.
+    """
+
+    sources = np.asarray(sources, dtype=np.int32)
+    targets = np.asarray(targets, dtype=np.int32)
+
+    ptr = np.zeros(node_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=node_count), out=ptr[1:])
+
+    return ptr, targets[np.argsort(sources, kind="stable")]
+
+
+def _strong_components(node_count, successors):
+    """
+    Component of every node (iterative Tarjan). Components are numbered
+    in the order they complete: sinks first, and the components under a
+    DFS tree node take a contiguous run of numbers ending at its own, so
+    the numbering is a post-order of the condensation.
+    """
+
+    index = [-1] * node_count
+    low = [0] * node_count
+    on_stack = [False] * node_count
+    component = [-1] * node_count
+    stack = []
+    counter = 0
+    count = 0
+
+    for root in range(node_count):
+
+        if index[root] != -1:
+            continue
+
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, iter(successors[root]))]
+
+        while work:
+
+            node, neighbours = work[-1]
+
+            for neighbour in neighbours:
+                if index[neighbour] == -1:
+                    index[neighbour] = low[neighbour] = counter
+                    counter += 1
+                    stack.append(neighbour)
+                    on_stack[neighbour] = True
+                    work.append((neighbour, iter(successors[neighbour])))
+                    break
+                if on_stack[neighbour] and index[neighbour] < low[node]:
+                    low[node] = index[neighbour]
+
+            else:
+                work.pop()
+
+                if work and low[node] < low[work[-1][0]]:
+                    low[work[-1][0]] = low[node]
+
+                if low[node] == index[node]:
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component[member] = count
+                        if member == node:
+                            break
+                    count += 1
+
+    return component, count
+
+
+def _post_order(count, neighbours):
+    """
+    Position of every component in a DFS post-order over `neighbours`.
+    """
+
+    position = [-1] * count
+    visited = [False] * count
+    counter = 0
+
+    for root in range(count):
+
+        if visited[root]:
+            continue
+
+        visited[root] = True
+        work = [(root, iter(neighbours[root]))]
+
+        while work:
+
+            component, pending = work[-1]
+
+            for neighbour in pending:
+                if not visited[neighbour]:
+                    visited[neighbour] = True
+                    work.append((neighbour, iter(neighbours[neighbour])))
+                    break
+
+            else:
+                work.pop()
+                position[component] = counter
+                counter += 1
+
+    return position
+
+
+# --------------------------------------------------
+# REACHABILITY INDEX
+# --------------------------------------------------
+
+class ReachabilityIndex:
+    """
+    Upstream/downstream queries over a lineage graph, answered from labels
+    built once per graph.
+
+    Nodes are grouped into strongly connected components. Each component
+    is labelled, per direction, with the positions of the components it
+    reaches in a DFS post-order of the condensation, stored as intervals:
+    a DFS subtree is one contiguous run, so a tree-shaped lineage needs a
+    single interval per component where bitsets would need one bit per
+    node. Labels are packed into one int32 array per direction. Members
+    are stored in position order, so a closure is a few array slices, and
+    its size is kept per component.
+
+    Added edges merge the target's label into each ancestor's. Removed
+    edges re-derive the labels of the cone above (and below) them only.
+    An edge that merges or may split a component rebuilds the index.
+
+    Closures and levels of recently selected nodes are remembered in a
+    bounded LRU.
+    """
+
+    def __init__(self, G, memo_size=REACHABILITY_MEMO_SIZE):
+
+        self.memo_size = memo_size
+
+        self._closures = OrderedDict()  # (node, direction) -> frozenset
+        self._levels = OrderedDict()    # (node, direction, mode) -> {node: level}
+        self._lock = threading.RLock()
+
+        self._build_from(G)
+
+    # -------------------- build --------------------
+
+    def _build_from(self, G):
+        """
+        Index G from scratch. A LineageGraph's adjacency arrays are used in
+        place, not copied.
+        """
+
+        self.graph = G
+        names = list(G.nodes)
+
+        if hasattr(G, "_out_ptr"):
+            out_ptr, out_idx, in_ptr, in_idx = G._out_ptr, G._out_idx, G._in_ptr, G._in_idx
+        else:
+            ids = {name: position for position, name in enumerate(names)}
+            sources = [ids[source] for source, _ in G.edges]
+            targets = [ids[target] for _, target in G.edges]
+            out_ptr, out_idx = _csr(len(names), sources, targets)
+            in_ptr, in_idx = _csr(len(names), targets, sources)
+
+        self._build(names, out_ptr, out_idx, in_ptr, in_idx)
+
+    def _build(self, names, out_ptr, out_idx, in_ptr, in_idx):
+
+        self._names = names
+        self._ids = {name: position for position, name in enumerate(names)}
+
+        self._out_ptr, self._out_idx = out_ptr, out_idx
+        self._in_ptr, self._in_idx = in_ptr, in_idx
+        self._base_count = len(names)
+
+        # Edge changes since the build, on top of the arrays
+        self._added_out = collections.defaultdict(list)
+        self._added_in = collections.defaultdict(list)
+        self._removed = set()
+
+        node_count = len(names)
+        ptr = out_ptr.tolist()
+        targets = out_idx.tolist()
+        successors = [targets[ptr[i]:ptr[i + 1]] for i in range(node_count)]
+
+        component, count = _strong_components(node_count, successors)
+        self._component = np.asarray(component, dtype=np.int32)
+        self._cyclic = {component[i] for i in range(node_count) if i in successors[i]}
+
+        sizes = np.bincount(np.asarray(component, dtype=np.int64), minlength=count)
+        self._cyclic.update(np.flatnonzero(sizes > 1).tolist())
+
+        # Condensation, as component adjacency lists
+        pairs = {
+            (component[i], component[j])
+            for i in range(node_count) for j in successors[i]
+            if component[i] != component[j]
+        }
+        down = [[] for _ in range(count)]
+        up = [[] for _ in range(count)]
+        for a, b in pairs:
+            down[a].append(b)
+            up[b].append(a)
+
+        # Downstream positions are the component numbers themselves (a
+        # post-order already); upstream ones come from a DFS over the
+        # reversed condensation
+        self._position = {
+            "downstream": np.arange(count, dtype=np.int32),
+            "upstream": np.asarray(_post_order(count, up), dtype=np.int32),
+        }
+        self._order = {}
+        self._members = {}
+        self._start = {}
+        self._packed = {}       # direction -> (label pointers, flat intervals)
+        self._patched = {}      # direction -> {component: label} changed since
+        self._counts = {}
+
+        for direction, neighbours, components in (
+            ("downstream", down, range(count)),
+            ("upstream", up, range(count - 1, -1, -1)),
+        ):
+            position = self._position[direction]
+
+            order = np.empty(count, dtype=np.int32)
+            order[position] = np.arange(count, dtype=np.int32)
+            self._order[direction] = order
+
+            # Node IDs grouped by their component's position
+            node_positions = position[self._component]
+            self._members[direction] = np.argsort(node_positions, kind="stable").astype(np.int32)
+            start = np.zeros(count + 1, dtype=np.int64)
+            np.cumsum(np.bincount(node_positions, minlength=count), out=start[1:])
+            self._start[direction] = start
+
+            # Neighbours are labelled first: components run sinks first
+            # downstream and sources first upstream
+            labels = [()] * count
+            positions = position.tolist()
+            for c in components:
+                p = positions[c]
+                labels[c] = _merge([(p, p)] + [labels[n] for n in neighbours[c]])
+
+            lengths = np.fromiter(map(len, labels), dtype=np.int64, count=count)
+            label_ptr = np.zeros(count + 1, dtype=np.int64)
+            np.cumsum(lengths, out=label_ptr[1:])
+            flat = np.fromiter(itertools.chain.from_iterable(labels), dtype=np.int32, count=int(label_ptr[-1]))
+            del labels
+
+            self._packed[direction] = (label_ptr, flat)
+            self._patched[direction] = {}
+
+            # Nodes under each interval, summed per component
+            sizes = start[flat[1::2] + 1] - start[flat[0::2]]
+            owner = np.repeat(np.arange(count), lengths // 2)
+            self._counts[direction] = np.bincount(owner, weights=sizes, minlength=count).astype(np.int64) - 1
+
+        self._closures.clear()
+        self._levels.clear()
+
+    def _rebuild(self):
+
+        sources, targets = [], []
+        for i in range(len(self._names)):
+            for j in self._successors(i):
+                sources.append(i)
+                targets.append(j)
+
+        node_count = len(self._names)
+        out_ptr, out_idx = _csr(node_count, sources, targets)
+        in_ptr, in_idx = _csr(node_count, targets, sources)
+
+        self._build(self._names, out_ptr, out_idx, in_ptr, in_idx)
+
+    # -------------------- structure --------------------
+
+    def _label(self, direction, c):
+
+        label = self._patched[direction].get(c)
+        if label is not None:
+            return label
+
+        label_ptr, flat = self._packed[direction]
+        return tuple(flat[label_ptr[c]:label_ptr[c + 1]].tolist())
+
+    def _label_size(self, direction, label):
+        start = self._start[direction]
+        return int(sum(start[hi + 1] - start[lo] for lo, hi in zip(label[0::2], label[1::2])))
+
+    def _neighbours(self, i, ptr, idx, added, reverse):
+
+        base = idx[ptr[i]:ptr[i + 1]].tolist() if i < self._base_count else []
+
+        if self._removed:
+            if reverse:
+                base = [j for j in base if (j, i) not in self._removed]
+            else:
+                base = [j for j in base if (i, j) not in self._removed]
+
+        return base + added[i] if i in added else base
+
+    def _successors(self, i):
+        return self._neighbours(i, self._out_ptr, self._out_idx, self._added_out, False)
+
+    def _predecessors(self, i):
+        return self._neighbours(i, self._in_ptr, self._in_idx, self._added_in, True)
+
+    def _component_members(self, c):
+        p = self._position["downstream"][c]
+        start = self._start["downstream"]
+        return self._members["downstream"][start[p]:start[p + 1]].tolist()
+
+    def _component_neighbours(self, c, direction):
+
+        neighbours = self._successors if direction == "downstream" else self._predecessors
+        ids = [j for i in self._component_members(c) for j in neighbours(i)]
+
+        return set(self._component[ids].tolist()) - {c}
+
+    def _cone(self, c, direction):
+        """
+        Components reached from c in `direction`, c included.
+        """
+
+        order = self._order[direction]
+        label = self._label(direction, c)
+
+        return np.concatenate([order[lo:hi + 1] for lo, hi in zip(label[0::2], label[1::2])]).tolist()
+
+    def _set_label(self, direction, c, label):
+        self._patched[direction][c] = label
+        self._counts[direction][c] = self._label_size(direction, label) - 1
+
+    def _add_nodes(self, nodes):
+        """
+        Register new nodes, each as its own component at the end of both
+        position orders.
+        """
+
+        new = [node for node in dict.fromkeys(nodes) if node not in self._ids]
+        if not new:
+            return
+
+        first = len(self._order["downstream"])
+        components = np.arange(first, first + len(new), dtype=np.int32)
+        new_ids = np.arange(len(self._names), len(self._names) + len(new), dtype=np.int32)
+
+        for node in new:
+            self._ids[node] = len(self._names)
+            self._names.append(node)
+
+        self._component = np.concatenate([self._component, components])
+
+        # A new component takes the next position in both orders
+        for direction in ("downstream", "upstream"):
+            start = self._start[direction]
+            self._position[direction] = np.concatenate([self._position[direction], components])
+            self._order[direction] = np.concatenate([self._order[direction], components])
+            self._start[direction] = np.concatenate([start, start[-1] + np.arange(1, len(new) + 1)])
+            self._members[direction] = np.concatenate([self._members[direction], new_ids])
+            self._counts[direction] = np.concatenate([self._counts[direction], np.zeros(len(new), dtype=np.int64)])
+            for c in components.tolist():
+                self._patched[direction][c] = (c, c)
+
+    def _relabel(self, dirty, direction):
+        """
+        Re-derive the labels of the `dirty` components from their
+        neighbours', neighbours first. Every neighbour outside `dirty` must
+        already be correct.
+        """
+
+        position = self._position[direction]
+        done = set()
+
+        for root in dirty:
+
+            if root in done:
+                continue
+
+            done.add(root)
+            work = [(root, iter(self._component_neighbours(root, direction)))]
+
+            while work:
+
+                c, pending = work[-1]
+
+                for n in pending:
+                    if n in dirty and n not in done:
+                        done.add(n)
+                        work.append((n, iter(self._component_neighbours(n, direction))))
+                        break
+
+                else:
+                    work.pop()
+                    p = int(position[c])
+                    neighbour_labels = [self._label(direction, n) for n in self._component_neighbours(c, direction)]
+                    self._set_label(direction, c, _merge([(p, p)] + neighbour_labels))
+
+    # -------------------- edge changes --------------------
+
+    def _has_edge(self, i, j):
+        return j in self._successors(i)
+
+    def add_edges(self, edges):
+        """
+        Add (source, target) edges. Each ancestor of the source takes the
+        target's downstream label, and each descendant of the target the
+        source's upstream label. An edge closing a cycle rebuilds.
+        """
+
+        with self._lock:
+
+            edges = list(edges)
+            self._add_nodes(node for edge in edges for node in edge)
+
+            component = self._component
+            stale = False
+
+            for source, target in edges:
+
+                i, j = self._ids[source], self._ids[target]
+                if self._has_edge(i, j):
+                    continue
+
+                if (i, j) in self._removed:
+                    self._removed.discard((i, j))
+                else:
+                    self._added_out[i].append(j)
+                    self._added_in[j].append(i)
+
+                a, b = int(component[i]), int(component[j])
+
+                if a == b:
+                    if i == j:
+                        self._cyclic.add(a)
+                    continue
+
+                if stale or _label_contains(self._label("downstream", b), self._position["downstream"][a]):
+                    stale = True
+                    continue
+
+                ancestors = self._cone(a, "upstream")
+                descendants = self._cone(b, "downstream")
+                reached = self._label("downstream", b)
+                reaching = self._label("upstream", a)
+
+                for c in ancestors:
+                    self._set_label("downstream", c, _merge([self._label("downstream", c), reached]))
+                for c in descendants:
+                    self._set_label("upstream", c, _merge([self._label("upstream", c), reaching]))
+
+            if stale:
+                self._rebuild()
+
+            self._closures.clear()
+            self._levels.clear()
+
+    def remove_edges(self, edges):
+        """
+        Remove (source, target) edges and re-derive the labels of the
+        source's ancestors and the target's descendants. Removing an edge
+        inside a cycle rebuilds, since the component may split.
+        """
+
+        with self._lock:
+
+            component = self._component
+            dirty = {"downstream": set(), "upstream": set()}
+            stale = False
+
+            for source, target in edges:
+
+                i, j = self._ids.get(source), self._ids.get(target)
+                if i is None or j is None or not self._has_edge(i, j):
+                    continue
+
+                if j in self._added_out.get(i, ()):
+                    self._added_out[i].remove(j)
+                    self._added_in[j].remove(i)
+                else:
+                    self._removed.add((i, j))
+
+                a, b = int(component[i]), int(component[j])
+
+                if a == b:
+                    if i != j:
+                        stale = True
+                    elif len(self._component_members(a)) == 1:
+                        self._cyclic.discard(a)
+                    continue
+
+                # Another edge may still join the two components
+                if any(component[k] == b for m in self._component_members(a) for k in self._successors(m)):
+                    continue
+
+                dirty["downstream"].update(self._cone(a, "upstream"))
+                dirty["upstream"].update(self._cone(b, "downstream"))
+
+            if stale:
+                self._rebuild()
+            else:
+                for direction, components in dirty.items():
+                    self._relabel(components, direction)
+
+            self._closures.clear()
+            self._levels.clear()
+
+    def _edge_names(self):
+        names = self._names
+        return {(names[i], names[j]) for i in range(len(names)) for j in self._successors(i)}
+
+    def sync(self, G):
+        """
+        Bring the index in line with G, a new version of the graph: the
+        edge difference is applied in place, or the index is rebuilt when
+        more than REACHABILITY_REBUILD_RATIO of the edges changed. Returns
+        (added, removed) edge counts.
+        """
+
+        with self._lock:
+
+            current = set(G.edges)
+            indexed = self._edge_names()
+
+            added = current - indexed
+            removed = indexed - current
+
+            if len(added) + len(removed) > REACHABILITY_REBUILD_RATIO * max(len(current), 1):
+                self._build_from(G)
+            else:
+                self.remove_edges(removed)
+                self.add_edges(added)
+                self._add_nodes(G.nodes)
+                self.graph = G
+
+        return len(added), len(removed)
+
+    # -------------------- memo --------------------
+
+    def _remember(self, memo, key, compute):
+
+        with self._lock:
+            value = memo.get(key)
+            if value is not None:
+                memo.move_to_end(key)
+                return value
+
+        value = compute()
+
+        with self._lock:
+            memo[key] = value
+            memo.move_to_end(key)
+            while len(memo) > self.memo_size:
+                memo.popitem(last=False)
+
+        return value
+
+    def _node_component(self, node):
+
+        if node not in self.graph:
+            raise KeyError(node)
+
+        i = self._ids[node]
+        return i, int(self._component[i])
+
+    def _closure(self, node, direction):
+
+        if direction not in ("upstream", "downstream"):
+            raise ValueError(f"Unknown direction: {direction}")
+
+        def compute():
+
+            with self._lock:
+
+                i, c = self._node_component(node)
+                label = self._label(direction, c)
+                members, start = self._members[direction], self._start[direction]
+
+                ids = np.concatenate([
+                    members[start[lo]:start[hi + 1]] for lo, hi in zip(label[0::2], label[1::2])
+                ]).tolist()
+
+            names = self._names
+            return frozenset(names[j] for j in ids if j != i)
+
+        return self._remember(self._closures, (node, direction), compute)
+
+    # -------------------- levels --------------------
+
+    def _shortest_levels(self, node, neighbours, step):
+
+        levels = {node: 0}
+        queue = collections.deque([node])
+
+        while queue:
+            current = queue.popleft()
+            level = levels[current] + step
+            for neighbour in neighbours(current):
+                if neighbour not in levels:
+                    levels[neighbour] = level
+                    queue.append(neighbour)
+
+        return levels
+
+    def _longest_levels(self, node, reached, step):
+
+        # Longest path over the condensation of the reached nodes: members of
+        # a cycle share one level, and a diamond takes its longer branch.
+        # Only the reached cone is turned into a networkx graph.
+        cone = self.graph.subgraph(reached)
+        if hasattr(cone, "to_networkx"):
+            cone = cone.to_networkx()
+
+        condensed = nx.condensation(cone)
+        mapping = condensed.graph["mapping"]
+
+        if step < 0:
+            condensed = condensed.reverse(copy=False)
+
+        depth = {mapping[node]: 0}
+
+        for component in nx.topological_sort(condensed):
+            if component not in depth:
+                continue
+            for successor in condensed.successors(component):
+                depth[successor] = max(depth.get(successor, 0), depth[component] + 1)
+
+        return {member: depth[mapping[member]] * step for member in reached}
+
+    def levels(self, node, direction="downstream", mode="shortest"):
+        """
+        Hops from `node` to every node upstream (negative) or downstream
+        (positive) of it, the node itself at 0. `mode` is "shortest" (fewest
+        hops) or "longest" (most hops through the condensation, so cycles
+        share a level).
+        """
+
+        if direction not in ("upstream", "downstream"):
+            raise ValueError(f"Unknown direction: {direction}")
+        if mode not in ("shortest", "longest"):
+            raise ValueError(f"Unknown level mode: {mode}")
+
+        if direction == "upstream":
+            neighbours, step = self.graph.predecessors, -1
+        else:
+            neighbours, step = self.graph.successors, 1
+
+        def compute():
+            if mode == "shortest":
+                return self._shortest_levels(node, neighbours, step)
+            return self._longest_levels(node, self._closure(node, direction) | {node}, step)
+
+        return self._remember(self._levels, (node, direction, mode), compute)
+
+    # -------------------- queries --------------------
+
+    def __contains__(self, node):
+        return node in self.graph
+
+    def upstream(self, node):
+        """
+        Same set as nx.ancestors(G, node), as a frozenset.
+        """
+        return self._closure(node, "upstream")
+
+    def downstream(self, node):
+        """
+        Same set as nx.descendants(G, node), as a frozenset.
+        """
+        return self._closure(node, "downstream")
+
+    def upstream_count(self, node):
+        with self._lock:
+            return int(self._counts["upstream"][self._node_component(node)[1]])
+
+    def downstream_count(self, node):
+        with self._lock:
+            return int(self._counts["downstream"][self._node_component(node)[1]])
+
+    def impact(self, node):
+        """
+        Upstream, downstream and the node itself.
+        """
+        return self.upstream(node) | self.downstream(node) | {node}
+
+    def reaches(self, source, target):
+        """
+        Whether a path of one or more edges leads from source to target.
+        """
+
+        with self._lock:
+
+            _, a = self._node_component(source)
+            _, b = self._node_component(target)
+
+            if a == b:
+                return a in self._cyclic
+
+            return _label_contains(self._label("downstream", a), self._position["downstream"][b])
+
+    def clear(self):
+        with self._lock:
+            self._closures.clear()
+            self._levels.clear()
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_reachability_index(G, version, name="semantic"):
+    """
+    Process-wide index for a lineage graph, built once per graph version.
+    A new version is applied to the existing index as an edge diff (see
+    ReachabilityIndex.sync) instead of a rebuild.
+    """
+
+    with _indexes_lock:
+
+        cached = _indexes.get(name)
+
+        if cached is None:
+            cached = _indexes[name] = (version, ReachabilityIndex(G))
+
+        elif cached[0] != version:
+            cached[1].sync(G)
+            cached = _indexes[name] = (version, cached[1])
+
+    return cached[1]
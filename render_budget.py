@@ -0,0 +1,195 @@
+import collections
+
+from config import RENDER_MAX_EDGES, RENDER_MAX_NODES
+
+
+BudgetGraph = collections.namedtuple(
+    "BudgetGraph", ["nodes", "edges", "radius", "hidden_nodes", "hidden_edges", "reachable_radius"]
+)
+
+
+# --------------------------------------------------
+# GROUPING
+# --------------------------------------------------
+
+def table_of(node):
+    """
+    Table part of a semantic node: 'Sales.Amount' -> 'Sales', a bare table
+    stays itself.
+    """
+
+    table, dot, _ = node.rpartition(".")
+    return table if dot else node
+
+
+def hop_distances(G, focus):
+    """
+    Fewest hops from `focus` to every node upstream (through predecessors)
+    or downstream (through successors) of it.
+    """
+
+    distances = {focus: 0}
+
+    for neighbours in (G.predecessors, G.successors):
+
+        frontier = [focus]
+        seen = {focus}
+        hop = 0
+
+        while frontier:
+
+            hop += 1
+            next_frontier = []
+
+            for node in frontier:
+                for neighbour in neighbours(node):
+                    if neighbour not in seen:
+                        seen.add(neighbour)
+                        next_frontier.append(neighbour)
+                        if hop < distances.get(neighbour, hop + 1):
+                            distances[neighbour] = hop
+
+            frontier = next_frontier
+
+    return distances
+
+
+def fitting_radius(distances, max_nodes):
+    """
+    Largest radius whose nodes all fit in `max_nodes` (at least 1).
+    """
+
+    per_hop = collections.Counter(distances.values())
+    total = 0
+    radius = 0
+
+    for hop in sorted(per_hop):
+        total += per_hop[hop]
+        if total > max_nodes:
+            break
+        radius = hop
+
+    return max(radius, 1)
+
+
+# --------------------------------------------------
+# BUDGET
+# --------------------------------------------------
+
+def budget_graph(G, focus, radius=None, group_of=table_of, max_nodes=RENDER_MAX_NODES,
+                 max_edges=RENDER_MAX_EDGES):
+    """
+    The part of G around `focus` that fits a render budget.
+
+    Nodes within `radius` hops are drawn one by one, nearest first, up to
+    about four fifths of `max_nodes`. Every other node is collapsed into a
+    group node per group_of(node), with the smallest groups folded into one
+    overflow node. Parallel edges between the drawn nodes are merged into
+    one edge with a count. Edges beyond `max_edges` are dropped, farthest
+    from the focus first. `radius=None` picks the largest radius that fits.
+
+    Returns a BudgetGraph:
+    - nodes: name -> {"label", "group", "count", "hop"}; "group" is False
+      for real nodes;
+    - edges: (source, target) -> {"count", "dependencies", "transformation"};
+    - radius: the radius used;
+    - hidden_nodes: number of nodes collapsed into groups;
+    - hidden_edges: number of edges dropped by the edge budget;
+    - reachable_radius: the farthest hop in G.
+    """
+
+    distances = hop_distances(G, focus)
+    reachable_radius = max(distances.values())
+
+    group_slots = max(1, max_nodes // 5)
+    nearest_first = sorted(distances, key=lambda node: (distances[node], str(node)))
+
+    if len(distances) <= max_nodes:
+        # Everything fits: nothing to collapse
+        radius = reachable_radius
+        drawn = nearest_first
+    else:
+        if radius is None:
+            radius = fitting_radius(distances, max_nodes - group_slots)
+        drawn = [node for node in nearest_first if distances[node] <= radius]
+        drawn = drawn[:max(max_nodes - group_slots, 1)]
+
+    drawn_set = set(drawn)
+
+    nodes = {
+        node: {"label": str(node), "group": False, "count": 1, "hop": distances[node]}
+        for node in drawn
+    }
+
+    # -------------------- collapse the rest --------------------
+
+    members = collections.defaultdict(list)
+    for node in distances:
+        if node not in drawn_set:
+            members[group_of(node)].append(node)
+
+    ranked = sorted(members.items(), key=lambda item: (-len(item[1]), str(item[0])))
+
+    if len(ranked) > group_slots:
+        overflow = [node for _, group_nodes in ranked[group_slots - 1:] for node in group_nodes]
+        ranked = ranked[:group_slots - 1] + [(None, overflow)]
+
+    representative = {node: node for node in drawn}
+
+    for key, group_nodes in ranked:
+
+        group_id = f"group::{key}" if key is not None else "group::*"
+        label = f"{key}\n({len(group_nodes)} collapsed)" if key is not None else \
+            f"{len(group_nodes)} more nodes"
+
+        nodes[group_id] = {
+            "label": label,
+            "group": True,
+            "count": len(group_nodes),
+            "hop": min(distances[node] for node in group_nodes),
+        }
+
+        for node in group_nodes:
+            representative[node] = group_id
+
+    # -------------------- aggregate edges --------------------
+
+    edges = {}
+
+    for source, target, data in G.edges(data=True):
+
+        if source not in representative or target not in representative:
+            continue
+
+        pair = (representative[source], representative[target])
+        if pair[0] == pair[1] and nodes[pair[0]]["group"]:
+            continue
+
+        edge = edges.get(pair)
+        if edge is None:
+            edge = edges[pair] = {
+                "count": 0,
+                "dependencies": collections.Counter(),
+                "transformation": data.get("transformation", ""),
+            }
+
+        edge["count"] += 1
+        edge["dependencies"][data.get("dependency", "")] += 1
+
+    hidden_edges = 0
+
+    if len(edges) > max_edges:
+
+        def closeness(pair):
+            source, target = pair
+            touches_focus = focus in pair
+            return (not touches_focus, nodes[source]["group"] or nodes[target]["group"],
+                    max(nodes[source]["hop"], nodes[target]["hop"]), str(pair))
+
+        kept = sorted(edges, key=closeness)[:max_edges]
+        hidden_edges = len(edges) - len(kept)
+        edges = {pair: edges[pair] for pair in kept}
+
+    hidden_nodes = len(distances) - len(drawn)
+
+    return BudgetGraph(nodes, edges, radius, hidden_nodes, hidden_edges, reachable_radius)
@@ -0,0 +1,327 @@
+import hashlib
+import json
+import os
+import re
+import threading
+
+import pandas as pd
+
+from config import SNAPSHOT_DIR
+from dax_lexer import prime_references
+from dmv_source import TMSCHEMA_ROWSETS, get_model_source
+from lineage_builder import RULES_VERSION, derive_lineage, prepare_model
+from metadata_snapshot import get_state, open_snapshot, set_state, to_text
+
+
+# --------------------------------------------------
+# LOCAL STORE
+# --------------------------------------------------
+
+SEMANTIC_DDL = """
+CREATE TABLE IF NOT EXISTS tmschema_rows (
+    kind          TEXT NOT NULL,
+    id            INTEGER NOT NULL,
+    modified_time TEXT,
+    payload       TEXT,
+    PRIMARY KEY (kind, id)
+);
+CREATE TABLE IF NOT EXISTS semantic_edges (
+    kind_rank       INTEGER NOT NULL,
+    kind            TEXT NOT NULL,
+    id              INTEGER NOT NULL,
+    seq             INTEGER NOT NULL,
+    source          TEXT,
+    target          TEXT,
+    transformation  TEXT,
+    dependency_type TEXT
+);
+CREATE INDEX IF NOT EXISTS semantic_edges_by_object ON semantic_edges (kind, id);
+"""
+
+# Edge order of a full build: measures, calculated columns, relationships, partitions
+KIND_RANK = {"measures": 0, "columns": 1, "relationships": 2, "partitions": 3}
+
+LINEAGE_COLUMNS = ["Source", "Target", "Transformation", "DependencyType"]
+
+_sync_lock = threading.Lock()
+
+
+def semantic_snapshot_path(name=None):
+    """
+    Snapshot file of a model, named after its DMV source.
+    """
+
+    name = re.sub(r"[^\w.-]+", "_", name or get_model_source().name)
+
+    return os.path.join(SNAPSHOT_DIR, f"semantic_{name}.db")
+
+
+# Largest number of IDs bound into one IN (...) lookup
+_ID_BATCH = 500
+
+# Fields of the rows no sync touched that prepare_model's lookups read
+_LOOKUP_FIELDS = {"measures": ("TableID",)}
+
+
+def _frame(payloads, name="Name"):
+
+    df = pd.DataFrame([json.loads(payload) for payload, in payloads])
+
+    if "ID" not in df.columns:
+        df = pd.DataFrame(columns=["ID", "TableID", name, "Expression"])
+
+    return df
+
+
+def _name_field(store, kind):
+    """
+    Name column of a kind, as get_name_column() picks it on the full frame.
+    """
+
+    has_name, count = store.execute(
+        "SELECT MAX(json_type(payload, '$.Name') IS NOT NULL), COUNT(*) FROM tmschema_rows WHERE kind = ?",
+        (kind,)
+    ).fetchone()
+
+    return "Name" if has_name or not count else "ExplicitName"
+
+
+def _rows(store, kind, ids, name):
+    """
+    Some rows of a kind, in ID order.
+    """
+
+    ids = sorted(ids)
+    payloads = []
+
+    for start in range(0, len(ids), _ID_BATCH):
+        batch = ids[start:start + _ID_BATCH]
+        payloads += store.execute(
+            f"SELECT payload FROM tmschema_rows WHERE kind = ? AND id IN ({', '.join('?' for _ in batch)}) "
+            "ORDER BY id",
+            (kind, *batch)
+        ).fetchall()
+
+    return _frame(payloads, name)
+
+
+def _lookup_rows(store, kind, fields):
+    """
+    Just the ID, `fields` and name of every row of a kind, read with
+    json_extract instead of decoding whole payloads.
+    """
+
+    fields = ("ID", *fields)
+
+    rows = store.execute(
+        f"SELECT {', '.join('json_extract(payload, ?)' for _ in fields)} "
+        "FROM tmschema_rows WHERE kind = ? ORDER BY id",
+        (*(f"$.{field}" for field in fields), kind)
+    ).fetchall()
+
+    return pd.DataFrame(rows, columns=list(fields))
+
+
+def _load_frames(store, only=None):
+    """
+    TMSCHEMA frames from the store. With `only` ({kind: IDs}) just those
+    rows are decoded, plus what the model lookups read from the others:
+    every table, and the ID, table and name of every measure.
+    """
+
+    frames = {}
+
+    for kind in TMSCHEMA_ROWSETS:
+
+        if only is None or kind == "tables":
+            frames[kind] = _frame(store.execute(
+                "SELECT payload FROM tmschema_rows WHERE kind = ? ORDER BY id", (kind,)
+            ))
+            continue
+
+        name = _name_field(store, kind)
+        df = _rows(store, kind, only.get(kind, ()), name)
+
+        if kind in _LOOKUP_FIELDS:
+            lookups = _lookup_rows(store, kind, _LOOKUP_FIELDS[kind] + (name,))
+            lookups = lookups[~lookups["ID"].isin(df["ID"])]
+            df = pd.concat([df, lookups], ignore_index=True) if not df.empty else lookups
+            df = df.sort_values("ID", kind="stable", ignore_index=True)
+
+        for column in ("TableID", "Expression"):
+            if column not in df.columns:
+                df[column] = None
+
+        frames[kind] = df
+
+    return frames
+
+
+def _model_fingerprint(model):
+    """
+    Edges of one row depend on other rows only through these lookups.
+    """
+
+    return hashlib.sha256(json.dumps([
+        RULES_VERSION,
+        sorted((str(k), str(v)) for k, v in model["table_lookup"].items()),
+        sorted((str(k), str(v)) for k, v in model["measure_lookup"].items()),
+        model["column_name_col"],
+        model["measure_name_col"],
+    ]).encode("utf-8")).hexdigest()
+
+
+# --------------------------------------------------
+# INCREMENTAL SYNC (ModifiedTime HIGH-WATER MARK PER ROW)
+# --------------------------------------------------
+
+def sync_semantic_model(source=None, path=None):
+    """
+    Re-read only TMSCHEMA rows whose ModifiedTime changed, drop rows that
+    disappeared, and re-derive only the lineage edges those rows produce.
+    Returns {kind: {"changed": [...], "dropped": [...]}}.
+    """
+
+    source = source or get_model_source()
+    path = path or semantic_snapshot_path(source.name)
+
+    with _sync_lock:
+
+        store = open_snapshot(path, SEMANTIC_DDL)
+
+        try:
+            source.open()
+
+            # Key scans, then the changed rows, run side by side; DAX
+            # expressions are lexed as each rowset arrives
+            remote = {}
+            for kind, keys in source.fetch({kind: ("read_keys", kind) for kind in TMSCHEMA_ROWSETS}):
+                remote[kind] = {
+                    int(object_id): to_text(modified)
+                    for object_id, modified in zip(keys["ID"], keys["ModifiedTime"])
+                }
+
+            changes = {}
+
+            for kind in TMSCHEMA_ROWSETS:
+
+                local = dict(store.execute(
+                    "SELECT id, modified_time FROM tmschema_rows WHERE kind = ?", (kind,)
+                ))
+
+                changes[kind] = {
+                    "changed": sorted(i for i, modified in remote[kind].items() if local.get(i) != modified),
+                    "dropped": sorted(i for i in local if i not in remote[kind]),
+                }
+
+            reads = source.fetch({
+                kind: ("read_rows", kind, change["changed"], len(remote[kind]))
+                for kind, change in changes.items()
+                if change["changed"]
+            })
+
+            for kind, df in reads:
+
+                if "Expression" in df and kind in ("measures", "columns"):
+                    prime_references(df["Expression"])
+
+                records = json.loads(df.to_json(orient="records", date_format="iso"))
+
+                store.executemany(
+                    "INSERT OR REPLACE INTO tmschema_rows (kind, id, modified_time, payload) "
+                    "VALUES (?, ?, ?, ?)",
+                    [
+                        (kind, int(record["ID"]), remote[kind][int(record["ID"])], json.dumps(record))
+                        for record in records
+                    ]
+                )
+
+            for kind, change in changes.items():
+                store.executemany(
+                    "DELETE FROM tmschema_rows WHERE kind = ? AND id = ?",
+                    [(kind, object_id) for object_id in change["dropped"]]
+                )
+
+            _rederive_edges(store, changes)
+            store.commit()
+
+        finally:
+            source.close()
+            store.close()
+
+    return changes
+
+
+def _rederive_edges(store, changes):
+
+    touched = {
+        kind: set(change["changed"]) | set(change["dropped"])
+        for kind, change in changes.items()
+    }
+
+    if not any(touched.values()):
+        return
+
+    # Edges of a row depend on the rest of the model only through the
+    # lookups, so only the touched rows are decoded in full
+    frames = _load_frames(store, touched)
+    model = prepare_model(frames)
+
+    fingerprint = _model_fingerprint(model)
+    has_edges = store.execute("SELECT 1 FROM semantic_edges LIMIT 1").fetchone() is not None
+
+    if get_state(store, "model_fingerprint") != fingerprint or not has_edges:
+        # A table or measure was renamed, added or dropped: references
+        # elsewhere in the model may resolve differently, so rebuild all
+        only = None
+        frames = _load_frames(store)
+        model = prepare_model(frames)
+        store.execute("DELETE FROM semantic_edges")
+    else:
+        only = touched
+        store.executemany(
+            "DELETE FROM semantic_edges WHERE kind = ? AND id = ?",
+            [(kind, object_id) for kind, ids in touched.items() for object_id in ids]
+        )
+
+    edges = derive_lineage(frames, model, only)
+    seq = edges.groupby(["kind", "ID"], sort=False).cumcount()
+
+    rows = list(zip(
+        edges["kind"].map(KIND_RANK).tolist(),
+        edges["kind"],
+        edges["ID"].astype("int64").tolist(),
+        seq.tolist(),
+        edges["Source"],
+        edges["Target"],
+        edges["Transformation"],
+        edges["DependencyType"],
+    ))
+
+    store.executemany(
+        "INSERT INTO semantic_edges "
+        "(kind_rank, kind, id, seq, source, target, transformation, dependency_type) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        rows
+    )
+
+    set_state(store, "model_fingerprint", fingerprint)
+
+
+# --------------------------------------------------
+# READS
+# --------------------------------------------------
+
+def load_semantic_lineage(path=None):
+
+    store = open_snapshot(path or semantic_snapshot_path(), SEMANTIC_DDL)
+
+    try:
+        rows = store.execute(
+            "SELECT source, target, transformation, dependency_type "
+            "FROM semantic_edges ORDER BY kind_rank, id, seq"
+        ).fetchall()
+    finally:
+        store.close()
+
+    return pd.DataFrame(rows, columns=LINEAGE_COLUMNS)
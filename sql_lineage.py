@@ -0,0 +1,472 @@
+import re
+
+from sqlglot import exp
+
+from statement_splitter import parse_statements
+
+
+# Columns shown by the Procedures & Views engine
+LINEAGE_COLUMNS = [
+    "object_name",
+    "object_type",
+    "target_table",
+    "target_column",
+    "source_columns",
+    "transformation",
+]
+
+
+# ==========================================================
+# CLEAN SQL
+# ==========================================================
+def clean_sql(sql):
+    sql = re.sub(r'--.*', '', sql)
+    sql = re.sub(r'/\*.*?\*/', '', sql, flags=re.S)
+    return sql.strip()
+
+
+def _lineage_row(object_name, object_type, target_table, target_column, source_columns, transformation):
+
+    sources = sorted(set(source_columns))
+
+    return {
+        "object_name": object_name,
+        "object_type": object_type,
+        "target_table": target_table,
+        "target_column": target_column,
+        "source_columns": ", ".join(sources),
+        "transformation": transformation,
+        "source_list": sources,
+    }
+
+
+# ==========================================================
+# SINGLE-PASS STATEMENT VISITOR
+# ==========================================================
+class _SelectScope:
+    """
+    Tables and per-projection column references of one SELECT, filled in
+    while the statement is walked.
+    """
+
+    def __init__(self, select, depth):
+        self.select = select
+        self.depth = depth
+        self.alias_map = {}
+        self.alias_depth = {}
+        self.projection_columns = [[] for _ in select.expressions]
+
+    def add_table(self, table, depth):
+
+        # The nearest scope defining an alias wins over nested subqueries
+        alias = table.alias or table.name
+        if depth > self.alias_depth.get(alias, depth):
+            return
+
+        schema = table.args.get("db")
+        self.alias_map[alias] = f"{schema}.{table.name}" if schema else table.name
+        self.alias_depth[alias] = depth
+
+    def source(self, col):
+        return f"{self.alias_map.get(col.table, col.table)}.{col.name}"
+
+
+def _branch_selects(query):
+    """
+    SELECTs whose projections a query returns: the query itself, or every
+    branch of a UNION / EXCEPT / INTERSECT.
+    """
+
+    if isinstance(query, exp.Subquery):
+        return _branch_selects(query.this)
+
+    if isinstance(query, exp.Union):
+        return _branch_selects(query.this) + _branch_selects(query.expression)
+
+    return [query] if isinstance(query, exp.Select) else []
+
+
+def _derived_queries(select):
+    """
+    Upper-cased name -> query of the CTEs visible from a SELECT (the
+    nearest WITH wins) and of the derived tables in its FROM / JOINs.
+    """
+
+    derived = {}
+
+    node = select
+    while node is not None:
+        with_ = node.args.get("with")
+        if isinstance(with_, exp.With):
+            for cte in with_.expressions:
+                derived.setdefault(cte.alias.upper(), cte.this)
+        node = node.parent
+
+    for source in [select.args.get("from")] + (select.args.get("joins") or []):
+        if source is not None and isinstance(source.this, exp.Subquery) and source.this.alias:
+            derived[source.this.alias.upper()] = source.this.this
+
+    return derived
+
+
+def _single_source(select):
+    """
+    Alias of the only table / derived table a SELECT reads, else ''.
+    """
+
+    source = select.args.get("from")
+
+    if source is None or select.args.get("joins") or not isinstance(source.this, (exp.Table, exp.Subquery)):
+        return ""
+
+    return source.this.alias_or_name
+
+
+def _projection_columns(scope, name):
+    """
+    Columns read by the projection of `scope` that returns column `name`:
+    the named projection, else a column through a single-source `*` or an
+    `alias.*`. None when no projection returns it.
+    """
+
+    stars = []
+
+    for projection, columns in zip(scope.select.expressions, scope.projection_columns):
+
+        if projection.alias_or_name.upper() == name.upper():
+            return columns
+
+        if isinstance(projection, exp.Star):
+            stars.append(_single_source(scope.select))
+        elif isinstance(projection, exp.Column) and isinstance(projection.this, exp.Star):
+            stars.append(projection.table)
+
+    if len(stars) == 1 and stars[0]:
+        return [exp.column(name, table=stars[0])]
+
+    return None
+
+
+class _MergeScope:
+
+    def __init__(self, node):
+        self.node = node
+        self.updates = []   # (assignment, [columns])
+        self.inserts = []   # (target column, value expression, [columns])
+
+
+class StatementVisitor:
+    """
+    Walks a parsed statement once, dispatching on node type, and collects
+    SELECT scopes, INSERT ... SELECT targets, MERGE clauses and the column
+    references under every projection or assignment. Lineage rows are then
+    built from what was collected, without re-scanning any subtree.
+    """
+
+    def __init__(self, object_type):
+        self.object_type = object_type
+        self.visits = 0
+        self.scopes = {}
+        self.emitters = []
+        self._dispatch = {
+            exp.Select: self._visit_select,
+            exp.Table: self._visit_table,
+            exp.Column: self._visit_column,
+            exp.Insert: self._visit_insert,
+            exp.Merge: self._visit_merge,
+            exp.Update: self._visit_update,
+        }
+
+    # -------------------- traversal --------------------
+
+    def visit(self, statement):
+
+        # (node, enclosing select scopes, column sinks, innermost merge)
+        stack = [(statement, (), (), None)]
+
+        while stack:
+
+            node, selects, sinks, merge = stack.pop()
+            self.visits += 1
+
+            handler = self._dispatch.get(type(node))
+            children = (
+                handler(node, selects, sinks, merge) if handler
+                else [(child, selects, sinks, merge) for child in node.iter_expressions()]
+            )
+
+            stack.extend(reversed(children))
+
+        return self
+
+    def _visit_select(self, node, selects, sinks, merge):
+
+        scope = self.scopes[id(node)] = _SelectScope(node, len(selects))
+
+        if self.object_type == "VIEW" and not selects:
+            self.emitters.append(("select", node, None))
+
+        inner = selects + (scope,)
+        children = []
+
+        for key, value in node.args.items():
+            if key == "expressions":
+                children.extend(
+                    (projection, inner, sinks + (columns,), merge)
+                    for projection, columns in zip(value, scope.projection_columns)
+                )
+            elif isinstance(value, list):
+                children.extend((v, inner, sinks, merge) for v in value if isinstance(v, exp.Expression))
+            elif isinstance(value, exp.Expression):
+                children.append((value, inner, sinks, merge))
+
+        return children
+
+    def _visit_table(self, node, selects, sinks, merge):
+        for scope in selects:
+            scope.add_table(node, len(selects))
+        return []
+
+    def _visit_column(self, node, selects, sinks, merge):
+        for columns in sinks:
+            columns.append(node)
+        return []
+
+    def _visit_insert(self, node, selects, sinks, merge):
+
+        select_stmt = node.args.get("expression")
+
+        if isinstance(select_stmt, exp.Select):
+            self.emitters.append(("select", select_stmt, node.this.sql()))
+
+        columns = node.args.get("columns")
+
+        if merge is None or not (columns and isinstance(select_stmt, exp.Tuple)):
+            return [(child, selects, sinks, merge) for child in node.iter_expressions()]
+
+        children = [(child, selects, sinks, merge) for child in node.iter_expressions() if child is not select_stmt]
+
+        for target_col, value_expr in zip(columns, select_stmt.expressions):
+            value_columns = []
+            merge.inserts.append((target_col, value_expr, value_columns))
+            children.append((value_expr, selects, sinks + (value_columns,), merge))
+
+        return children
+
+    def _visit_merge(self, node, selects, sinks, merge):
+
+        scope = _MergeScope(node)
+        self.emitters.append(("merge", node, scope))
+
+        return [(child, selects, sinks, scope) for child in node.iter_expressions()]
+
+    def _visit_update(self, node, selects, sinks, merge):
+
+        if merge is None:
+            return [(child, selects, sinks, merge) for child in node.iter_expressions()]
+
+        assignments = {id(assignment) for assignment in node.expressions}
+        children = [(child, selects, sinks, merge) for child in node.iter_expressions()
+                    if id(child) not in assignments]
+
+        for assignment in node.expressions:
+            rhs_columns = []
+            merge.updates.append((assignment, rhs_columns))
+            self.visits += 1
+            children.append((assignment.this, selects, sinks, merge))
+            children.append((assignment.expression, selects, sinks + (rhs_columns,), merge))
+
+        return children
+
+    # -------------------- rows --------------------
+
+    def rows(self, full_name):
+
+        lineage = []
+
+        for kind, node, payload in self.emitters:
+            if kind == "select":
+                lineage.extend(self._select_rows(node, payload or full_name, full_name))
+            else:
+                lineage.extend(self._merge_rows(node, payload, full_name))
+
+        return lineage
+
+    def _sources(self, select, columns, seen=()):
+        """
+        SCHEMA.TABLE.COLUMN sources of columns read by a SELECT. Columns of
+        a CTE or derived table are followed into the projection that
+        computes them, down to the tables it reads; columns that cannot be
+        matched to a projection (SELECT *) keep their own name.
+        """
+
+        scope = self.scopes[id(select)]
+        derived = _derived_queries(select)
+        single = _single_source(select)
+
+        sources = []
+
+        for col in columns:
+
+            # Unqualified columns of a SELECT reading one table belong to it
+            qualifier = col.table or single
+            query = derived.get(qualifier.upper()) or derived.get(scope.alias_map.get(qualifier, "").upper())
+
+            inner = []
+            for branch in _branch_selects(query) if query is not None else ():
+                if id(branch) not in seen and id(branch) in self.scopes:
+                    inner.append((branch, _projection_columns(self.scopes[id(branch)], col.name)))
+
+            if not any(found is not None for _, found in inner):
+                sources.append(scope.source(col if col.table or not qualifier else exp.column(col.name, table=qualifier)))
+                continue
+
+            for branch, found in inner:
+                sources.extend(self._sources(branch, found or [], seen + (id(branch),)))
+
+        return sources
+
+    def _select_rows(self, select_stmt, target_table, object_name):
+
+        scope = self.scopes[id(select_stmt)]
+
+        return [
+            _lineage_row(
+                object_name,
+                self.object_type,
+                target_table,
+                projection.alias_or_name,
+                self._sources(select_stmt, columns),
+                projection.sql(dialect="tsql")
+            )
+            for projection, columns in zip(select_stmt.expressions, scope.projection_columns)
+        ]
+
+    def _merge_rows(self, node, merge, object_name):
+
+        results = []
+
+        target_table = node.this.sql()
+        using = node.args.get("using")
+
+        subquery_map = {}
+        using_alias = None
+
+        if using:
+            using_alias = using.alias
+
+            if isinstance(using.this, exp.Select):
+                using_scope = self.scopes[id(using.this)]
+                for proj, columns in zip(using.this.expressions, using_scope.projection_columns):
+                    subquery_map[proj.alias_or_name] = (proj, columns)
+
+        # -------- UPDATE --------
+        for assignment, columns in merge.updates:
+
+            transformation = assignment.expression.sql()
+            source_columns = _merge_source_columns(columns, using_alias, subquery_map)
+
+            if not source_columns:
+                source_columns.append(transformation)
+
+            results.append(_lineage_row(
+                object_name,
+                self.object_type,
+                target_table,
+                assignment.this.sql(),
+                source_columns,
+                transformation
+            ))
+
+        # -------- INSERT (MERGE) --------
+        for target_col, value_expr, columns in merge.inserts:
+
+            transformation = value_expr.sql()
+            source_columns = _merge_source_columns(columns, using_alias, subquery_map)
+
+            if not source_columns:
+                source_columns.append(transformation)
+
+            results.append(_lineage_row(
+                object_name,
+                self.object_type,
+                target_table,
+                target_col.sql(),
+                source_columns,
+                transformation
+            ))
+
+        return results
+
+
+# ==========================================================
+# MERGE SOURCE RESOLUTION
+# ==========================================================
+def _merge_source_columns(columns, using_alias, subquery_map):
+
+    source_columns = []
+
+    for col in columns:
+
+        if col.table == using_alias:
+
+            resolved = subquery_map.get(col.name)
+
+            if resolved:
+
+                resolved_expr, inner_columns = resolved
+
+                if inner_columns:
+                    for inner_col in inner_columns:
+                        source_columns.append(
+                            f"{inner_col.table}.{inner_col.name}"
+                        )
+                else:
+                    source_columns.append(
+                        resolved_expr.sql(dialect="tsql")
+                    )
+            else:
+                source_columns.append(col.sql())
+        else:
+            source_columns.append(f"{col.table}.{col.name}")
+
+    return source_columns
+
+
+# ==========================================================
+# MODULE EXTRACTION (VIEWS + PROCEDURES)
+# ==========================================================
+def extract_statement_lineage(statement, schema_name, object_name, object_type):
+
+    full_name = f"{schema_name}.{object_name}"
+
+    return StatementVisitor(object_type).visit(statement).rows(full_name)
+
+
+def extract_module_report(schema_name, object_name, object_type, definition):
+    """
+    Lineage rows for one view or procedure plus a diagnostic per statement.
+    Each statement is parsed on its own budget, so a failure or timeout in
+    one of them only loses that statement's lineage.
+    """
+
+    lineage = []
+    diagnostics = []
+
+    for statement in parse_statements(clean_sql(definition or "")):
+
+        for expression in statement.pop("expressions"):
+            lineage.extend(extract_statement_lineage(expression, schema_name, object_name, object_type))
+
+        diagnostics.append(statement)
+
+    return {"lineage": lineage, "statements": diagnostics}
+
+
+def extract_module_lineage(schema_name, object_name, object_type, definition):
+    """
+    Column-level lineage rows for one view or procedure definition.
+    Unparseable statements yield no rows.
+    """
+
+    return extract_module_report(schema_name, object_name, object_type, definition)["lineage"]
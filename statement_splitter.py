@@ -0,0 +1,322 @@
+from sqlglot import exp
+from sqlglot.dialects.tsql import TSQL
+from sqlglot.errors import TokenError
+from sqlglot.tokens import TokenType
+
+from config import STATEMENT_TIMEOUT_SECONDS, STATEMENT_MAX_CHARS
+from parallel_extract import run_with_timeout
+from parse_cache import parse_cached
+
+
+# --------------------------------------------------
+# KEYWORDS
+# --------------------------------------------------
+
+# Statements that can carry column lineage and are worth parsing
+QUERY_KEYWORDS = {"SELECT", "INSERT", "UPDATE", "DELETE", "MERGE", "WITH", "CREATE", "ALTER"}
+
+DML_KEYWORDS = {"INSERT", "UPDATE", "DELETE", "MERGE"}
+
+# Always start a new statement at nesting depth 0
+STATEMENT_KEYWORDS = {
+    "DECLARE", "SET", "PRINT", "EXEC", "EXECUTE", "RETURN", "TRUNCATE", "DROP",
+    "CREATE", "ALTER", "THROW", "RAISERROR", "COMMIT", "ROLLBACK", "GOTO",
+    "BREAK", "CONTINUE", "USE", "OPEN", "CLOSE", "FETCH", "DEALLOCATE", "WAITFOR",
+}
+
+CONDITION_KEYWORDS = {"IF", "WHILE"}
+
+# Single keyword control statements, optionally followed by a modifier
+BLOCK_KEYWORDS = {"BEGIN", "END", "ELSE"}
+BLOCK_MODIFIERS = {"TRY", "CATCH", "TRAN", "TRANSACTION", "DISTRIBUTED"}
+
+SET_OPERATORS = {"UNION", "ALL", "EXCEPT", "INTERSECT"}
+
+HEADER_OBJECTS = {"PROC", "PROCEDURE", "FUNCTION", "TRIGGER"}
+
+# Never valid inside parentheses or CASE: seeing one means the nesting
+# counters were thrown off by a malformed statement, so resynchronise
+RESYNC_KEYWORDS = {
+    "BEGIN", "DECLARE", "PRINT", "TRUNCATE", "THROW", "RAISERROR",
+    "IF", "WHILE", "GOTO", "WAITFOR", "INSERT", "MERGE",
+}
+
+_LITERAL_TYPES = {
+    TokenType.STRING,
+    TokenType.NATIONAL_STRING,
+    TokenType.IDENTIFIER,
+    TokenType.NUMBER,
+    TokenType.HEX_STRING,
+    TokenType.BIT_STRING,
+}
+
+
+def _keyword(token):
+    if token.token_type in _LITERAL_TYPES:
+        return None
+    return token.text.upper()
+
+
+def _is_go(sql, token):
+    """
+    GO is a batch separator only when it stands alone on its line.
+    """
+
+    line_start = sql.rfind("\n", 0, token.start) + 1
+    line_end = sql.find("\n", token.end + 1)
+    line_end = len(sql) if line_end == -1 else line_end
+
+    return sql[line_start:token.start].strip() == "" and sql[token.end + 1:line_end].strip() in ("", ";")
+
+
+# --------------------------------------------------
+# SPLITTER
+# --------------------------------------------------
+
+class _Statement:
+
+    def __init__(self, token, keyword):
+        self.start = token.start
+        self.end = token.end
+        self.keyword = keyword
+        self.kind = "statement"
+        self.seen_as = False
+        # After WITH / INSERT until the query or VALUES that completes it
+        self.awaiting_query = False
+        self.verbs = set()
+        self.tokens = 0
+
+    def as_dict(self, sql):
+        return {
+            "keyword": self.keyword,
+            "kind": self.kind,
+            "start": self.start,
+            "end": self.end,
+            "text": sql[self.start:self.end + 1],
+        }
+
+
+def _continues(statement, keyword, prev_keyword, next_keyword):
+    """
+    Whether a depth-0 keyword belongs to the statement being collected.
+    """
+
+    if statement is None:
+        return False
+
+    if statement.kind == "control" and statement.keyword in BLOCK_KEYWORDS:
+        return keyword in BLOCK_MODIFIERS and statement.tokens == 1
+
+    if keyword == "SELECT":
+        return prev_keyword in SET_OPERATORS or prev_keyword == "AS" or statement.awaiting_query
+
+    if keyword in DML_KEYWORDS:
+        return prev_keyword == "THEN" or (statement.keyword == "WITH" and statement.awaiting_query)
+
+    if keyword == "WITH":
+        return (
+            next_keyword == "("
+            or prev_keyword == "AS"
+            or (statement.keyword in ("CREATE", "ALTER") and not statement.seen_as)
+        )
+
+    if keyword == "SET":
+        return "UPDATE" in statement.verbs
+
+    if keyword in ("EXEC", "EXECUTE"):
+        return "INSERT" in statement.verbs and statement.awaiting_query
+
+    # OFFSET n ROWS FETCH NEXT m ROWS ONLY pages a query; only a cursor
+    # FETCH [NEXT] FROM starts a statement
+    if keyword == "FETCH":
+        return prev_keyword in ("ROWS", "ROW")
+
+    if keyword in STATEMENT_KEYWORDS or keyword in CONDITION_KEYWORDS or keyword in BLOCK_KEYWORDS:
+        return False
+
+    return True
+
+
+def split_statements(sql):
+    """
+    Split a T-SQL module into statements without relying on semicolons.
+
+    Returns dicts with keyword, kind ("statement", "header" for
+    CREATE PROCEDURE ... AS, "control" for BEGIN/END/IF/ELSE/GO), offsets
+    and text. Falls back to a single statement if the text cannot be
+    tokenized.
+    """
+
+    try:
+        tokens = TSQL().tokenize(sql)
+    except TokenError:
+        return [{"keyword": None, "kind": "statement", "start": 0, "end": len(sql) - 1, "text": sql}]
+
+    statements = []
+    current = None
+    depth = 0
+    case_depth = 0
+    prev_keyword = None
+
+    def close():
+        nonlocal current
+        if current is not None:
+            statements.append(current.as_dict(sql))
+        current = None
+
+    for position, token in enumerate(tokens):
+
+        keyword = _keyword(token)
+        next_keyword = _keyword(tokens[position + 1]) if position + 1 < len(tokens) else None
+
+        if token.token_type == TokenType.SEMICOLON and depth == 0:
+            close()
+            prev_keyword = None
+            continue
+
+        if keyword == "GO" and depth == 0 and _is_go(sql, token):
+            close()
+            prev_keyword = None
+            continue
+
+        if (depth or case_depth) and (
+            keyword in RESYNC_KEYWORDS or (keyword == "END" and depth and not case_depth)
+        ):
+            depth = case_depth = 0
+
+        # CASE ... ELSE ... END never splits a statement
+        if keyword == "CASE":
+            case_depth += 1
+        elif keyword == "END" and case_depth > 0:
+            case_depth -= 1
+            keyword = "END CASE"
+
+        at_boundary = depth == 0 and case_depth == 0 and keyword
+
+        if at_boundary and not _continues(current, keyword, prev_keyword, next_keyword):
+
+            starts_new = (
+                current is None
+                or keyword in STATEMENT_KEYWORDS
+                or keyword in CONDITION_KEYWORDS
+                or keyword in BLOCK_KEYWORDS
+                or keyword in QUERY_KEYWORDS
+                or (current.kind == "control" and current.keyword in BLOCK_KEYWORDS)
+            )
+
+            if starts_new:
+                close()
+                current = _Statement(token, keyword)
+                if keyword in CONDITION_KEYWORDS or keyword in BLOCK_KEYWORDS:
+                    current.kind = "control"
+
+        if current is None:
+            current = _Statement(token, keyword)
+
+        current.end = token.end
+        current.tokens += 1
+
+        if token.token_type == TokenType.L_PAREN:
+            depth += 1
+        elif token.token_type == TokenType.R_PAREN:
+            depth = max(depth - 1, 0)
+
+        if at_boundary:
+
+            if keyword in DML_KEYWORDS:
+                current.verbs.add(keyword)
+
+            if keyword == "INSERT" or (keyword == "WITH" and next_keyword != "("):
+                current.awaiting_query = True
+            elif keyword in ("SELECT", "VALUES", "EXEC", "EXECUTE", "UPDATE", "DELETE", "MERGE"):
+                current.awaiting_query = False
+
+            if keyword == "AS":
+                current.seen_as = True
+
+                # CREATE PROCEDURE ... AS: the header ends here
+                if (
+                    current.keyword in ("CREATE", "ALTER")
+                    and current.kind == "statement"
+                    and _is_routine_header(sql[current.start:current.end + 1])
+                ):
+                    current.kind = "header"
+                    close()
+
+        prev_keyword = keyword if token.token_type != TokenType.R_PAREN else ")"
+
+    close()
+
+    return statements
+
+
+def _is_routine_header(text):
+    # CREATE [OR ALTER] PROC[EDURE] | FUNCTION | TRIGGER
+    return any(word.upper() in HEADER_OBJECTS for word in text.split()[1:4])
+
+
+# --------------------------------------------------
+# PER-STATEMENT PARSING WITH BUDGETS
+# --------------------------------------------------
+
+def _snippet(text, length=120):
+    text = " ".join(text.split())
+    return text if len(text) <= length else text[:length - 3] + "..."
+
+
+def parse_statements(sql, dialect="tsql", timeout=STATEMENT_TIMEOUT_SECONDS, max_chars=STATEMENT_MAX_CHARS):
+    """
+    Split and parse each statement on its own time and size budget, so
+    one bad statement never hides the lineage of the others.
+
+    Returns one dict per statement: index, keyword, status (ok, failed,
+    timeout, too_large, unsupported, skipped), elapsed, chars, error,
+    snippet and the parsed `expressions` (empty unless status is ok).
+    """
+
+    results = []
+
+    for index, statement in enumerate(split_statements(sql)):
+
+        text = statement["text"]
+        result = {
+            "index": index,
+            "keyword": statement["keyword"],
+            "status": "skipped",
+            "elapsed": 0.0,
+            "chars": len(text),
+            "error": None,
+            "snippet": _snippet(text),
+            "expressions": [],
+        }
+        results.append(result)
+
+        if statement["kind"] != "statement" or (
+            statement["keyword"] is not None and statement["keyword"] not in QUERY_KEYWORDS
+        ):
+            continue
+
+        if len(text) > max_chars:
+            result["status"] = "too_large"
+            result["error"] = f"{len(text)} chars exceeds budget of {max_chars}"
+            continue
+
+        outcome = run_with_timeout(parse_cached, (text, dialect), timeout)
+
+        result["elapsed"] = outcome["elapsed"]
+
+        if outcome["status"] == "timeout":
+            result["status"] = "timeout"
+            result["error"] = outcome["error"]
+        elif outcome["status"] == "error":
+            result["status"] = "failed"
+            result["error"] = outcome["error"]
+        else:
+            expressions = [e for e in outcome["result"] if e is not None]
+            if expressions and all(isinstance(e, exp.Command) for e in expressions):
+                result["status"] = "unsupported"
+            else:
+                result["status"] = "ok"
+                result["expressions"] = expressions
+
+    return results
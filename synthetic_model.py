@@ -0,0 +1,129 @@
+import argparse
+import random
+
+import pandas as pd
+
+
+# --------------------------------------------------
+# SYNTHETIC TMSCHEMA ROWSETS
+# --------------------------------------------------
+
+# Table names contain spaces, so every table reference is quoted
+MEASURE_TEMPLATES = [
+    "SUM('{table}'[{column}])",
+    "CALCULATE(SUM('{table}'[{column}]), '{other}'[{other_column}] > 0)",
+    "DIVIDE([{measure}], COUNTROWS('{table}'))",
+    "[{measure}] * 1.1",
+    "AVERAGEX('{table}', '{table}'[{column}] * [{measure}])",
+]
+
+CALCULATED_TEMPLATES = [
+    "RELATED('{other}'[{other_column}]) * '{table}'[{column}]",
+    "'{table}'[{column}] + 1",
+    "IF([{measure}] > 0, '{table}'[{column}], BLANK())",
+]
+
+
+def synthetic_model(tables=50, columns_per_table=20, measures_per_table=20,
+                    calculated_per_table=5, complexity=1, seed=0):
+    """
+    TMSCHEMA frames (tables, columns, measures, partitions, relationships)
+    shaped like a star-schema model, for benchmarks and offline runs.
+    Measures reference columns of their own and related tables and earlier
+    measures; every table has one Sql.Database partition. Each expression
+    adds up `complexity` template terms.
+    """
+
+    rng = random.Random(seed)
+    modified = pd.Timestamp("2026-01-01")
+
+    table_names = [f"Table {t:04d}" for t in range(tables)]
+
+    rows = {kind: [] for kind in ("tables", "columns", "measures", "partitions", "relationships")}
+    next_id = 1
+
+    def new_id():
+        nonlocal next_id
+        next_id += 1
+        return next_id
+
+    measure_names = []
+
+    for t, table in enumerate(table_names):
+
+        table_id = t + 1
+        rows["tables"].append({"ID": table_id, "Name": table, "ModifiedTime": modified})
+
+        columns = [f"Column {c:03d}" for c in range(columns_per_table)]
+        for column in columns:
+            rows["columns"].append({
+                "ID": new_id(), "TableID": table_id, "ExplicitName": column,
+                "Expression": None, "ModifiedTime": modified,
+            })
+
+        other = table_names[rng.randrange(tables)]
+
+        def fill(templates):
+            return " + ".join(
+                rng.choice(templates).format(
+                    table=table,
+                    column=rng.choice(columns),
+                    other=other,
+                    other_column=f"Column {rng.randrange(columns_per_table):03d}",
+                    measure=rng.choice(measure_names) if measure_names else "Base",
+                )
+                for _ in range(max(complexity, 1))
+            )
+
+        for c in range(calculated_per_table):
+            rows["columns"].append({
+                "ID": new_id(), "TableID": table_id, "ExplicitName": f"Calc {c:03d}",
+                "Expression": fill(CALCULATED_TEMPLATES), "ModifiedTime": modified,
+            })
+
+        for m in range(measures_per_table):
+            name = f"{table} Measure {m:03d}"
+            rows["measures"].append({
+                "ID": new_id(), "TableID": table_id, "Name": name,
+                "Expression": fill(MEASURE_TEMPLATES), "ModifiedTime": modified,
+            })
+            measure_names.append(name)
+
+        rows["partitions"].append({
+            "ID": new_id(), "TableID": table_id, "ModifiedTime": modified,
+            "Expression": (
+                'let Source = Sql.Database("server", "warehouse"), '
+                f'Data = Source{{[Schema="TFM",Item="FACT_{t:04d}"]}}[Data] in Data'
+            ),
+        })
+
+        if t:
+            rows["relationships"].append({
+                "ID": new_id(), "FromTableID": table_id, "ToTableID": rng.randrange(t) + 1,
+                "ModifiedTime": modified,
+            })
+
+    return {kind: pd.DataFrame(kind_rows) for kind, kind_rows in rows.items()}
+
+
+if __name__ == "__main__":
+
+    from dmv_source import write_model_files
+
+    parser = argparse.ArgumentParser(description="Write a synthetic TMSCHEMA model as a FileSource directory.")
+    parser.add_argument("directory")
+    parser.add_argument("--tables", type=int, default=50)
+    parser.add_argument("--columns-per-table", type=int, default=20)
+    parser.add_argument("--measures-per-table", type=int, default=20)
+    parser.add_argument("--calculated-per-table", type=int, default=5)
+    parser.add_argument("--complexity", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", choices=["json", "parquet"], default="json")
+    args = parser.parse_args()
+
+    frames = synthetic_model(
+        args.tables, args.columns_per_table, args.measures_per_table,
+        args.calculated_per_table, args.complexity, args.seed
+    )
+
+    print(write_model_files(frames, args.directory, args.format))